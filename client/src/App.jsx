@@ -13,6 +13,10 @@ axios.interceptors.request.use((config) => {
   return config;
 });
 
+// Trainees are fetched a page at a time; the next page starts after `next_after`
+const TRAINEES_PAGE_SIZE = 50;
+const EMPTY_TRAINEE_FILTERS = { module_id: '', completed: '', min_score: '', max_score: '' };
+
 // Layout Component
 const Layout = ({ children, user, onLogout }) => (
   <div className="min-h-screen bg-gray-100 flex flex-col">
@@ -251,18 +255,22 @@ const AdminDashboard = () => {
   });
   const [activeTab, setActiveTab] = useState('create');
   const [trainees, setTrainees] = useState([]);
+  const [traineesNextAfter, setTraineesNextAfter] = useState(null);
+  const [traineesLoading, setTraineesLoading] = useState(false);
+  const [traineeFilters, setTraineeFilters] = useState(EMPTY_TRAINEE_FILTERS);
+  const [appliedTraineeFilters, setAppliedTraineeFilters] = useState(null);
   const [leaderboard, setLeaderboard] = useState([]);
 
   useEffect(() => {
     const fetchData = async () => {
       try {
         setLoading(true);
-        const modulesResponse = await axios.get('/api/modules');
-        const traineesResponse = await axios.get('/api/trainees');
-        const leaderboardResponse = await axios.get('/api/leaderboard');
+        const [modulesResponse, leaderboardResponse] = await Promise.all([
+          axios.get('/api/modules'),
+          axios.get('/api/leaderboard')
+        ]);
         
         setModules(modulesResponse.data.modules);
-        setTrainees(traineesResponse.data.trainees);
         setLeaderboard(leaderboardResponse.data.leaderboard);
         setLoading(false);
       } catch (error) {
@@ -273,6 +281,38 @@ const AdminDashboard = () => {
     fetchData();
   }, []);
 
+  // Loads one page of trainees; without `after` it starts over with new filters
+  const fetchTrainees = async (filters, after = null) => {
+    setTraineesLoading(true);
+    try {
+      const params = { limit: TRAINEES_PAGE_SIZE };
+      Object.entries(filters).forEach(([key, value]) => {
+        if (value !== '') params[key] = value;
+      });
+      if (after) params.after = after;
+      const response = await axios.get('/api/trainees', { params });
+
+      setTrainees(prev => (after ? [...prev, ...response.data.trainees] : response.data.trainees));
+      setTraineesNextAfter(response.data.next_after);
+      setAppliedTraineeFilters(filters);
+    } catch (error) {
+      toast.error(error.response?.data?.message || 'Failed to fetch trainees');
+    } finally {
+      setTraineesLoading(false);
+    }
+  };
+
+  const openTraineesTab = () => {
+    setActiveTab('trainees');
+    if (appliedTraineeFilters === null) {
+      fetchTrainees(traineeFilters);
+    }
+  };
+
+  const handleTraineeFilterChange = (field, value) => {
+    setTraineeFilters(prev => ({ ...prev, [field]: value }));
+  };
+
   const generateContent = async () => {
     if (!newModule.title) {
       return toast.error('Please enter a module title');
@@ -354,7 +394,7 @@ const AdminDashboard = () => {
           Create Module
         </button>
         <button
-          onClick={() => setActiveTab('trainees')}
+          onClick={openTraineesTab}
           className={`px-4 py-2 ${activeTab === 'trainees' ? 'border-b-2 border-red-600 text-red-600' : 'text-gray-600'}`}
         >
           Trainees Progress
@@ -494,7 +534,69 @@ const AdminDashboard = () => {
       {activeTab === 'trainees' && (
         <div className="bg-white p-6 rounded-lg shadow-md">
           <h2 className="text-xl mb-4 font-semibold">Trainees Progress</h2>
-          {loading ? (
+          <form
+            onSubmit={(e) => {
+              e.preventDefault();
+              fetchTrainees(traineeFilters);
+            }}
+            className="flex flex-wrap items-end gap-4 mb-4"
+          >
+            <div>
+              <label className="block mb-1 text-sm">Module</label>
+              <select
+                value={traineeFilters.module_id}
+                onChange={(e) => handleTraineeFilterChange('module_id', e.target.value)}
+                className="p-2 border rounded focus:outline-none focus:ring-2 focus:ring-red-500"
+              >
+                <option value="">All modules</option>
+                {modules.map((module) => (
+                  <option key={module._id} value={module._id}>{module.title}</option>
+                ))}
+              </select>
+            </div>
+            <div>
+              <label className="block mb-1 text-sm">Completed</label>
+              <select
+                value={traineeFilters.completed}
+                onChange={(e) => handleTraineeFilterChange('completed', e.target.value)}
+                className="p-2 border rounded focus:outline-none focus:ring-2 focus:ring-red-500"
+              >
+                <option value="">Any</option>
+                <option value="true">Yes</option>
+                <option value="false">No</option>
+              </select>
+            </div>
+            <div>
+              <label className="block mb-1 text-sm">Min Score</label>
+              <input
+                type="number"
+                min="0"
+                max="100"
+                value={traineeFilters.min_score}
+                onChange={(e) => handleTraineeFilterChange('min_score', e.target.value)}
+                className="w-24 p-2 border rounded focus:outline-none focus:ring-2 focus:ring-red-500"
+              />
+            </div>
+            <div>
+              <label className="block mb-1 text-sm">Max Score</label>
+              <input
+                type="number"
+                min="0"
+                max="100"
+                value={traineeFilters.max_score}
+                onChange={(e) => handleTraineeFilterChange('max_score', e.target.value)}
+                className="w-24 p-2 border rounded focus:outline-none focus:ring-2 focus:ring-red-500"
+              />
+            </div>
+            <button
+              type="submit"
+              disabled={traineesLoading}
+              className="bg-red-600 text-white px-4 py-2 rounded hover:bg-red-700 transition disabled:opacity-50"
+            >
+              Apply Filters
+            </button>
+          </form>
+          {traineesLoading && trainees.length === 0 ? (
             <div>Loading...</div>
           ) : (
             <div className="overflow-x-auto">
@@ -514,10 +616,10 @@ const AdminDashboard = () => {
                       <tr key={`${trainee._id}-${module.module_id}`} className={idx % 2 === 0 ? 'bg-gray-50' : ''}>
                         <td className="py-2 px-4 border-b">{trainee.name}</td>
                         <td className="py-2 px-4 border-b">{module.module_title}</td>
-                        <td className="py-2 px-4 border-b">{module.attempts.length}</td>
+                        <td className="py-2 px-4 border-b">{module.attempt_count}</td>
                         <td className="py-2 px-4 border-b">
-                          {module.attempts.length > 0 ? 
-                            `${Math.max(...module.attempts.map(a => a.score))}%` : 
+                          {module.best_score != null ? 
+                            `${module.best_score}%` : 
                             'N/A'}
                         </td>
                         <td className="py-2 px-4 border-b">
@@ -528,6 +630,18 @@ const AdminDashboard = () => {
                   ))}
                 </tbody>
               </table>
+              {trainees.length === 0 && (
+                <div className="py-4 text-gray-600">No trainees match these filters.</div>
+              )}
+              {traineesNextAfter && (
+                <button
+                  onClick={() => fetchTrainees(appliedTraineeFilters, traineesNextAfter)}
+                  disabled={traineesLoading}
+                  className="mt-4 bg-white border border-red-600 text-red-600 px-4 py-2 rounded hover:bg-gray-100 transition disabled:opacity-50"
+                >
+                  {traineesLoading ? 'Loading...' : 'Load More'}
+                </button>
+              )}
             </div>
           )}
         </div>
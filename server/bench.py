@@ -0,0 +1,822 @@
+"""Load-test and benchmark harness for the FireSafe API.
+
+Boots the app in-process against mongomock (or a local MongoDB with
+--mongo-uri) with a deterministic stand-in for the Gemini model, seeds a
+synthetic dataset and drives a login burst followed by a mixed workload.
+Per-endpoint latency percentiles, throughput and Mongo ops per request are
+printed and written as JSON so runs can be compared:
+
+    pip install mongomock
+    python bench.py --trainees 2000 --modules 30 --requests 5000 --output after.json
+    python bench.py --compare before.json after.json
+
+With --base-url the requests go to a running server instead. Seed the same
+database it uses (--mongo-uri), share its JWT_SECRET_KEY, and start it with
+SERVER_TIMING=1 to get Mongo op counts.
+
+With --serve the app runs under gunicorn (gunicorn.conf.py) once per serving
+mode, and uncached chat requests are fired at it with --concurrency clients.
+This compares how many slow Gemini calls each mode keeps in flight:
+
+    python bench.py --serve sync async --requests 400 --concurrency 200 --llm-latency 0.5
+
+--chat-session-turns holds one chat session for that many messages and prints
+prompt size and latency as it grows. --llm-latency-per-1k-tokens makes the
+stub model slower for longer prompts, like Gemini:
+
+    python bench.py --requests 0 --chat-session-turns 200 --llm-latency-per-1k-tokens 0.05
+
+--overlap-logins times GET /api/modules on its own, then again while that
+many logins run concurrently, to check that password hashing does not slow
+the rest of the API:
+
+    python bench.py --overlap-logins 200 --login-burst 0 --requests 2000
+
+--scale-trainees reseeds at each trainee count and drives only the
+per-trainee progress endpoints, so latency and Mongo ops per request can be
+checked to stay flat as the dataset grows. mongomock scans its collections,
+so its latency grows with size regardless of indexes; read the ops column
+there and latency against a real MongoDB (--mongo-uri ... --reset):
+
+    python bench.py --scale-trainees 100 1000 10000 --requests 1000
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import random
+import re
+import shlex
+import socket
+import subprocess
+import tempfile
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+
+BENCH_DATABASE = 'firesafe_bench'
+BENCH_PASSWORD = 'benchmark-password'
+QUIZ_LENGTH = 10
+
+# Relative weights of the mixed workload
+DEFAULT_MIX = {
+    'login': 5,
+    'list_modules': 25,
+    'module_detail': 20,
+    'module_progress': 10,
+    'complete_section': 15,
+    'submit_assignment': 10,
+    'trainees': 5,
+    'leaderboard': 8,
+    'analytics': 3,
+    'chat': 2
+}
+
+MONGOMOCK_METHODS = (
+    'find', 'find_one', 'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+    'delete_one', 'delete_many', 'find_one_and_update', 'aggregate', 'count_documents', 'distinct'
+)
+
+# Endpoints whose cost should not depend on how many trainees exist (--scale-trainees)
+SCALE_MIX = {
+    'list_modules': 1,
+    'module_progress': 1,
+    'complete_section': 1,
+    'submit_assignment': 1
+}
+
+# Dataset options forwarded to the server process started by --serve
+SERVE_ARGS = ('trainees', 'admins', 'modules', 'progress_ratio', 'max_attempts', 'reading_kb',
+              'llm_latency', 'llm_latency_per_1k_tokens', 'bcrypt_rounds', 'seed', 'mongo_uri')
+
+SERVER_TIMING_PATTERN = re.compile(r'(\w+);dur=([\d.]+)(?:;desc="(\d+) ops")?')
+
+
+class StubUsage:
+    def __init__(self, prompt_tokens, completion_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = completion_tokens
+
+
+class StubResponse:
+    def __init__(self, text, prompt=''):
+        self.text = text
+        self.usage_metadata = StubUsage(len(prompt.split()), len(text.split()))
+
+
+class StubModel:
+    """Deterministic stand-in for genai.GenerativeModel.
+
+    Each call sleeps `latency` seconds plus `latency_per_1k_tokens` for every
+    thousand prompt tokens, so longer prompts are slower as they are with
+    Gemini. Prompt lengths are reported through usage_metadata.
+    """
+
+    def __init__(self, latency=0.05, latency_per_1k_tokens=0.0):
+        self.latency = latency
+        self.latency_per_1k_tokens = latency_per_1k_tokens
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        time.sleep(self.latency + self.latency_per_1k_tokens * len(prompt) / 4 / 1000)
+        if 'quiz' in prompt.lower():
+            text = json.dumps({'quiz': build_quiz(QUIZ_LENGTH)})
+        else:
+            text = ' '.join(['Fire safety guidance.'] * 40)
+        if stream:
+            return [StubResponse(word + ' ') for word in text.split()]
+        return StubResponse(text, prompt)
+
+
+def build_quiz(length):
+    return [{
+        'question': f'Question {index + 1}?',
+        'options': ['A', 'B', 'C', 'D'],
+        'answer': 'ABCD'[index % 4]
+    } for index in range(length)]
+
+
+def count_mongomock_ops(metrics):
+    # mongomock never emits command events, so count collection calls instead.
+    # Nested calls (find_one -> find) only count once.
+    from mongomock.collection import Collection
+    depth = threading.local()
+
+    def counted(original):
+        @functools.wraps(original)
+        def wrapper(self, *args, **kwargs):
+            outer = not getattr(depth, 'value', 0)
+            depth.value = getattr(depth, 'value', 0) + 1
+            started = time.perf_counter()
+            try:
+                return original(self, *args, **kwargs)
+            finally:
+                depth.value -= 1
+                if outer:
+                    metrics.record('db', time.perf_counter() - started)
+                    metrics.record('db_ops', 1)
+        return wrapper
+
+    for name in MONGOMOCK_METHODS:
+        setattr(Collection, name, counted(getattr(Collection, name)))
+
+
+def boot(args):
+    os.environ['MONGO_URI'] = args.mongo_uri or f'mongodb://localhost:27017/{BENCH_DATABASE}'
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-only-jwt-secret-key-0123456789')
+    os.environ.setdefault('GEMINI_API_KEY', 'bench')
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', str(args.bcrypt_rounds))
+    os.environ['SERVER_TIMING'] = '1'
+
+    import main
+    import metrics
+
+    if not args.mongo_uri:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit('mongomock is required without --mongo-uri (pip install mongomock)')
+        main.mongo.cx = mongomock.MongoClient()
+        main.mongo.db = main.mongo.cx[BENCH_DATABASE]
+        count_mongomock_ops(metrics)
+    main.model = StubModel(args.llm_latency, args.llm_latency_per_1k_tokens)
+    return main
+
+
+def seed(main, args):
+    db = main.mongo.db
+    if db.users.count_documents({}, limit=1):
+        if not args.reset:
+            sys.exit(f'{db.name} already has data; pass --reset to drop its collections first')
+        for name in ('users', 'modules', 'progress', 'leaderboard', 'attempt_buckets', 'module_analytics',
+                     'generated_content', 'jobs'):
+            db.drop_collection(name)
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    password = main.password_hasher.hash(BENCH_PASSWORD)
+
+    users = [{
+        'name': f'{role} {index}',
+        'email': f'{role.lower()}{index}@bench.local',
+        'mobile': f'555{index:07d}',
+        'password': password,
+        'role': role
+    } for role, count in (('Trainee', args.trainees), ('Admin', args.admins)) for index in range(count)]
+    insert_batches(db.users, users)
+
+    quiz = build_quiz(QUIZ_LENGTH)
+    reading = ' '.join(['Keep exits clear and know your evacuation route.'] * max(1, args.reading_kb * 20))
+    modules = [{
+        'title': f'Fire Safety Module {index + 1}',
+        'reading_document': reading,
+        'videos': [f'https://videos.bench.local/{index}/{part}' for part in range(3)],
+        'mcq_assignment': json.dumps({'quiz': quiz}),
+        'answer_key': [question['answer'] for question in quiz],
+        'reading_time': 5,
+        'videos_time': 5,
+        'assignment_time': 10,
+        'version': 1,
+        'created_at': now,
+        'updated_at': now
+    } for index in range(args.modules)]
+    insert_batches(db.modules, modules)
+
+    trainee_ids = [str(user['_id']) for user in users if user['role'] == 'Trainee']
+    module_ids = [str(module['_id']) for module in modules]
+    progress, buckets, totals = [], {}, {}
+    for user_id in trainee_ids:
+        for module_id in module_ids:
+            if rng.random() >= args.progress_ratio:
+                continue
+            attempts = []
+            for _ in range(rng.randint(0, args.max_attempts)):
+                missed = sorted(rng.sample(range(QUIZ_LENGTH), rng.randint(0, QUIZ_LENGTH)))
+                score = (QUIZ_LENGTH - len(missed)) / QUIZ_LENGTH * 100
+                attempts.append({
+                    'timestamp': now - timedelta(minutes=rng.randint(1, 60 * 24 * 90)),
+                    'score': score,
+                    'passed': score >= main.PASS_PERCENTAGE,
+                    'missed': missed
+                })
+            attempts.sort(key=lambda attempt: attempt['timestamp'])
+            for attempt in attempts:
+                bucket = buckets.setdefault((user_id, module_id, main.attempt_period(attempt['timestamp'])), [])
+                bucket.append(attempt)
+            entry = {
+                'module_id': module_id,
+                'user_id': user_id,
+                'reading_completed': True,
+                'videos_completed': rng.random() < 0.8,
+                'assignment_completed': bool(attempts),
+                'attempts': [
+                    {key: attempt[key] for key in ('timestamp', 'score', 'passed')}
+                    for attempt in attempts[-main.RECENT_ATTEMPTS:]
+                ],
+                'attempt_count': len(attempts)
+            }
+            first_pass = next((number for number, attempt in enumerate(attempts, start=1) if attempt['passed']), None)
+            if first_pass:
+                entry['first_pass_attempt'] = first_pass
+            if attempts:
+                entry['best_score'] = max(attempt['score'] for attempt in attempts)
+                entry['last_score'] = attempts[-1]['score']
+                entry['passed'] = attempts[-1]['passed']
+                if entry['passed']:
+                    total = totals.setdefault(user_id, [0, 0])
+                    total[0] += entry['last_score']
+                    total[1] += 1
+            progress.append(entry)
+    main.progress_store()
+    insert_batches(db.progress, progress)
+    main.attempt_store()
+    insert_batches(db.attempt_buckets, [{
+        'user_id': user_id,
+        'module_id': module_id,
+        'period': period,
+        'count': len(attempts),
+        'attempts': attempts,
+        'first_at': attempts[0]['timestamp'],
+        'last_at': attempts[-1]['timestamp']
+    } for (user_id, module_id, period), attempts in buckets.items()])
+    insert_batches(db.module_analytics, main.compute_module_analytics())
+
+    names = {str(user['_id']): user['name'] for user in users}
+    main.leaderboard_store()
+    insert_batches(db.leaderboard, [{
+        '_id': user_id,
+        'name': names[user_id],
+        'total_score': total,
+        'modules_completed': count,
+        'score': total / count,
+        'updated_at': now
+    } for user_id, (total, count) in totals.items()])
+
+    counts = {
+        'users': len(users),
+        'modules': len(modules),
+        'progress': len(progress),
+        'attempts': sum(entry['attempt_count'] for entry in progress)
+    }
+    print(f'Seeded {counts} in {time.perf_counter() - started:.1f}s')
+    return users, modules, counts
+
+
+def insert_batches(collection, documents, batch_size=1000):
+    for start in range(0, len(documents), batch_size):
+        collection.insert_many(documents[start:start + batch_size])
+
+
+class AppTarget:
+    """Sends requests through the Flask test client, one client per worker thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = client.open(path, method=method, json=body, headers=headers)
+        response.get_data()
+        return response.status_code, response.headers.get('Server-Timing')
+
+    def request_json(self, method, path, body=None, token=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = self.app.test_client().open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json(silent=True) or {}
+
+
+class HttpTarget:
+    """Sends requests to a running server over HTTP."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                response.read()
+                return response.status, response.headers.get('Server-Timing')
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers.get('Server-Timing')
+
+    def request_json(self, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                return response.status, json.loads(response.read() or b'{}')
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read() or b'{}')
+
+
+class Workload:
+    """Picks a weighted scenario and turns it into a concrete request."""
+
+    def __init__(self, main, users, modules, mix):
+        with main.app.app_context():
+            tokens = [(user, main.create_user_token(str(user['_id']), user['role'])) for user in users]
+        self.trainees = [(user, token) for user, token in tokens if user['role'] == 'Trainee']
+        self.admins = [(user, token) for user, token in tokens if user['role'] == 'Admin']
+        self.module_ids = [str(module['_id']) for module in modules]
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+
+    def pick(self, rng):
+        return rng.choices(self.names, self.weights)[0]
+
+    def build(self, scenario, rng):
+        user, token = rng.choice(self.admins if scenario in ('trainees', 'leaderboard', 'analytics') else self.trainees)
+        module_id = rng.choice(self.module_ids)
+        if scenario == 'login':
+            return 'POST', '/api/login', {'email': user['email'], 'password': BENCH_PASSWORD}, None
+        if scenario == 'list_modules':
+            return 'GET', '/api/modules', None, token
+        if scenario == 'module_detail':
+            return 'GET', f'/api/modules/{module_id}', None, token
+        if scenario == 'module_progress':
+            return 'GET', f'/api/modules/{module_id}/progress', None, token
+        if scenario == 'complete_section':
+            body = {'section': rng.choice(['reading', 'videos'])}
+            return 'POST', f'/api/modules/{module_id}/complete-section', body, token
+        if scenario == 'submit_assignment':
+            body = {'answers': [rng.choice('ABCD') for _ in range(QUIZ_LENGTH)]}
+            return 'POST', f'/api/modules/{module_id}/submit-assignment', body, token
+        if scenario == 'trainees':
+            return 'GET', '/api/trainees?limit=50', None, token
+        if scenario == 'leaderboard':
+            return 'GET', '/api/leaderboard?limit=20', None, token
+        if scenario == 'analytics':
+            return 'GET', '/api/analytics/modules', None, token
+        if scenario == 'chat':
+            body = {'message': f'How often should extinguisher type {rng.randint(1, 50)} be inspected?'}
+            return 'POST', '/api/chat', body, token
+        if scenario == 'chat_uncached':
+            # Unique questions so every request reaches the model
+            body = {'message': f'How often should extinguisher type {rng.randrange(10 ** 9)} be inspected?'}
+            return 'POST', '/api/chat', body, token
+        raise ValueError(f'Unknown scenario: {scenario}')
+
+
+def run_phase(target, workload, pick, total_requests, concurrency, seed, until=None):
+    """Fire `total_requests` requests, or with `until` (an Event) keep going until it is set."""
+    samples = []
+    samples_lock = threading.Lock()
+    remaining = iter(range(total_requests)) if until is None else None
+    remaining_lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        local = []
+        while True:
+            if until is not None:
+                if until.is_set():
+                    break
+            else:
+                with remaining_lock:
+                    if next(remaining, None) is None:
+                        break
+            scenario = pick(rng)
+            method, path, body, token = workload.build(scenario, rng)
+            started = time.perf_counter()
+            try:
+                status, timing = target.request(method, path, body, token)
+            except Exception:
+                status, timing = 0, None
+            local.append((scenario, time.perf_counter() - started, status, timing))
+        with samples_lock:
+            samples.extend(local)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, time.perf_counter() - started)
+
+
+def run_overlap(target, workload, args):
+    """Time /api/modules alone, then while a login burst hashes passwords alongside it."""
+    phases = {'modules_alone': run_phase(target, workload, lambda rng: 'list_modules',
+                                         args.requests, args.concurrency, args.seed + 3)}
+    burst_done = threading.Event()
+    burst = {}
+
+    def login_burst():
+        try:
+            burst['phase'] = run_phase(target, workload, lambda rng: 'login', args.overlap_logins,
+                                       args.concurrency, args.seed + 4)
+        finally:
+            burst_done.set()
+
+    thread = threading.Thread(target=login_burst)
+    thread.start()
+    phases['modules_during_logins'] = run_phase(target, workload, lambda rng: 'list_modules', 0,
+                                                args.concurrency, args.seed + 5, until=burst_done)
+    thread.join()
+    phases['overlapped_logins'] = burst['phase']
+
+    for name, phase in phases.items():
+        print_phase(name, phase)
+    alone = phases['modules_alone']['endpoints'].get('list_modules')
+    during = phases['modules_during_logins']['endpoints'].get('list_modules')
+    logins = phases['overlapped_logins']['endpoints'].get('login', {}).get('status_counts', {})
+    if alone and during:
+        print(f'\n/api/modules p95 {alone["p95_ms"]}ms alone, {during["p95_ms"]}ms during '
+              f'{args.overlap_logins} logins ({during["p95_ms"] / alone["p95_ms"]:.1f}x); '
+              f'{logins.get("503", 0)} logins shed with 503')
+    return phases
+
+
+def run_chat_session(target, workload, turns, seed):
+    """Hold one conversation for `turns` messages, recording latency and prompt size per turn."""
+    rng = random.Random(seed)
+    _, token = workload.trainees[0]
+    status, body = target.request_json('POST', '/api/chat/sessions', None, token)
+    if status != 201:
+        sys.exit(f'Could not create a chat session ({status}): {body}')
+    session_id = body['session_id']
+    samples = []
+    for turn in range(1, turns + 1):
+        message = f'Follow-up {turn}: what should I check on extinguisher type {rng.randint(1, 50)} next?'
+        started = time.perf_counter()
+        status, body = target.request_json('POST', '/api/chat', {'message': message, 'session_id': session_id}, token)
+        samples.append({
+            'turn': turn,
+            'status': status,
+            'ms': round((time.perf_counter() - started) * 1000, 3),
+            'prompt_tokens': body.get('prompt_tokens'),
+            'history_tokens': body.get('history_tokens')
+        })
+    return samples
+
+
+def run_scale(main, args):
+    """Reseed at each of --scale-trainees and drive SCALE_MIX; returns one phase per count."""
+    phases = {}
+    for count in args.scale_trainees:
+        scaled = argparse.Namespace(**dict(vars(args), trainees=count, reset=True))
+        users, modules, _ = seed(main, scaled)
+        for cache in (main.user_cache, main.answer_key_cache):
+            cache.clear()
+        workload = Workload(main, users, modules, SCALE_MIX)
+        phases[f'scale_{count}'] = run_phase(AppTarget(main.app), workload, workload.pick,
+                                             args.requests, args.concurrency, args.seed)
+        print_phase(f'scale_{count} ({count} trainees)', phases[f'scale_{count}'])
+
+    print(f'\n{"endpoint":<20}' + ''.join(f'{count:>16}' for count in args.scale_trainees) + '   (p95 ms / ops per request)')
+    for scenario in SCALE_MIX:
+        cells = []
+        for count in args.scale_trainees:
+            stats = phases[f'scale_{count}']['endpoints'].get(scenario)
+            cells.append(f'{stats["p95_ms"]:>9} / {str(stats["mongo_ops_per_request"]):<4}' if stats else f'{"-":>16}')
+        print(f'{scenario:<20}' + ''.join(f'{cell:>16}' for cell in cells))
+    return phases
+
+
+def print_chat_session(samples):
+    print(f'\nchat session: {len(samples)} turns')
+    print(f'{"turn":>6}{"status":>8}{"ms":>10}{"prompt tok":>12}{"history tok":>13}')
+    checkpoints = {1, 2, 5} | {turn for turn in range(10, len(samples) + 1, max(10, len(samples) // 10))} | {len(samples)}
+    for sample in samples:
+        if sample['turn'] in checkpoints:
+            print(f'{sample["turn"]:>6}{sample["status"]:>8}{sample["ms"]:>10}'
+                  f'{str(sample["prompt_tokens"]):>12}{str(sample["history_tokens"]):>13}')
+    prompts = [sample['prompt_tokens'] or 0 for sample in samples]
+    latencies = sorted(sample['ms'] for sample in samples)
+    print(f'max prompt tokens {max(prompts)}, p50 {percentile(latencies, 0.5)}ms, p99 {percentile(latencies, 0.99)}ms')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def parse_server_timing(header):
+    parsed = {}
+    for name, duration, ops in SERVER_TIMING_PATTERN.findall(header or ''):
+        parsed[name] = float(duration)
+        if ops:
+            parsed[f'{name}_ops'] = int(ops)
+    return parsed
+
+
+def summarize(samples, elapsed):
+    by_scenario = {}
+    for scenario, seconds, status, timing in samples:
+        by_scenario.setdefault(scenario, []).append((seconds, status, parse_server_timing(timing)))
+
+    endpoints = {}
+    for scenario, entries in sorted(by_scenario.items()):
+        latencies = sorted(seconds * 1000 for seconds, _, _ in entries)
+        statuses = {}
+        for _, status, _ in entries:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        timed = [timing for _, _, timing in entries if 'db_ops' in timing]
+        endpoints[scenario] = {
+            'requests': len(entries),
+            'errors': sum(1 for _, status, _ in entries if status == 0 or status >= 500),
+            'status_counts': statuses,
+            'throughput_rps': round(len(entries) / elapsed, 2),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'max_ms': round(latencies[-1], 3),
+            'mongo_ops_per_request': round(sum(t['db_ops'] for t in timed) / len(timed), 2) if timed else None,
+            'db_ms_mean': round(sum(t['db'] for t in timed) / len(timed), 3) if timed else None,
+            'serialization_ms_mean': round(sum(t.get('serialization', 0) for t in timed) / len(timed), 3) if timed else None
+        }
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'endpoints': endpoints
+    }
+
+
+def print_phase(name, phase):
+    print(f'\n{name}: {phase["requests"]} requests in {phase["elapsed_s"]}s ({phase["throughput_rps"]} req/s)')
+    print(f'{"endpoint":<20}{"n":>7}{"err":>6}{"rps":>9}{"p50":>10}{"p95":>10}{"p99":>10}{"ops/req":>9}')
+    for scenario, stats in phase['endpoints'].items():
+        ops = stats['mongo_ops_per_request']
+        print(f'{scenario:<20}{stats["requests"]:>7}{stats["errors"]:>6}{stats["throughput_rps"]:>9}'
+              f'{stats["p50_ms"]:>10}{stats["p95_ms"]:>10}{stats["p99_ms"]:>10}{"-" if ops is None else ops:>9}')
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_path, current_path, threshold):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    regressions = []
+    for phase_name, phase in current['phases'].items():
+        before_phase = baseline['phases'].get(phase_name, {}).get('endpoints', {})
+        print(f'\n{phase_name}')
+        print(f'{"endpoint":<20}{"p95 before":>12}{"p95 after":>12}{"change":>9}{"ops before":>12}{"ops after":>11}')
+        for scenario, stats in phase['endpoints'].items():
+            before = before_phase.get(scenario)
+            if not before:
+                continue
+            change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            flag = ' !' if change > threshold else ''
+            print(f'{scenario:<20}{before["p95_ms"]:>12}{stats["p95_ms"]:>12}{change:>8.1f}%'
+                  f'{str(before["mongo_ops_per_request"]):>12}{str(stats["mongo_ops_per_request"]):>11}{flag}')
+            if change > threshold:
+                regressions.append(f'{phase_name}/{scenario}')
+
+    if regressions:
+        print(f'\np95 regressed by more than {threshold}%: {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+def serve_app():
+    """Gunicorn app factory for --serve: the benchmark app and dataset behind a real server."""
+    args = build_parser().parse_args(shlex.split(os.getenv('BENCH_SERVE_ARGS', '')))
+    main = boot(args)
+    # A shared MongoDB was already seeded by the parent; mongomock lives in this process
+    if not args.mongo_uri:
+        seed(main, args)
+    return main.app
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(base_url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            urllib.request.urlopen(base_url + '/metrics', timeout=1).read()
+            return True
+        except urllib.error.HTTPError:
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_served(mode, args, workload):
+    """Start gunicorn in `mode` (async or sync), drive uncached chat at it and stop it."""
+    base_url = f'http://127.0.0.1:{free_port()}'
+    forwarded = [f'--{name.replace("_", "-")}={getattr(args, name)}' for name in SERVE_ARGS if getattr(args, name) is not None]
+    env = dict(
+        os.environ,
+        SERVER_MODE=mode,
+        BIND=base_url[len('http://'):],
+        WEB_CONCURRENCY=str(args.serve_workers),
+        BENCH_SERVE_ARGS=shlex.join(forwarded)
+    )
+    with tempfile.TemporaryFile() as log:
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'bench:serve_app()'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env, stdout=log, stderr=log
+        )
+        try:
+            if not wait_for_server(base_url, process):
+                log.seek(0)
+                sys.exit(f'{mode} server did not start:\n{log.read().decode(errors="replace")[-2000:]}')
+            return run_phase(HttpTarget(base_url), workload, lambda rng: 'chat_uncached',
+                             args.requests, args.concurrency, args.seed)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+def parse_mix(value):
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, (value or '').split(',')):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f'unknown scenario {name!r}')
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help='Compare two result files and exit.')
+    parser.add_argument('--threshold', type=float, default=20.0, help='p95 regression threshold in percent for --compare.')
+    parser.add_argument('--mongo-uri', help='Seed and serve from this MongoDB database instead of mongomock.')
+    parser.add_argument('--reset', action='store_true', help='Drop existing benchmark collections before seeding.')
+    parser.add_argument('--base-url', help='Benchmark a running server instead of the in-process app.')
+    parser.add_argument('--serve', nargs='+', choices=('async', 'sync'),
+                        help='Compare uncached chat under gunicorn in these serving modes.')
+    parser.add_argument('--serve-workers', type=int, default=1, help='Gunicorn worker processes for --serve.')
+    parser.add_argument('--scale-trainees', type=int, nargs='+', metavar='COUNT',
+                        help='Reseed at each trainee count and benchmark the progress endpoints.')
+    parser.add_argument('--trainees', type=int, default=500)
+    parser.add_argument('--admins', type=int, default=5)
+    parser.add_argument('--modules', type=int, default=20)
+    parser.add_argument('--progress-ratio', type=float, default=0.5, help='Share of (trainee, module) pairs with progress.')
+    parser.add_argument('--max-attempts', type=int, default=3, help='Upper bound of seeded attempts per progress entry.')
+    parser.add_argument('--reading-kb', type=int, default=8, help='Approximate size of each reading document.')
+    parser.add_argument('--login-burst', type=int, default=100, help='Logins fired concurrently before the mixed phase.')
+    parser.add_argument('--overlap-logins', type=int, default=0,
+                        help='Fire this many logins while timing /api/modules, against a baseline without them.')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests in the mixed phase.')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(''), help='Scenario weights, e.g. "chat=0,trainees=10".')
+    parser.add_argument('--llm-latency', type=float, default=0.05, help='Seconds the stub model sleeps per call.')
+    parser.add_argument('--llm-latency-per-1k-tokens', type=float, default=0.0,
+                        help='Extra stub model seconds per thousand prompt tokens.')
+    parser.add_argument('--chat-session-turns', type=int, default=0,
+                        help='After the mixed phase, hold one chat session for this many turns.')
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write results as JSON to this path.')
+    return parser
+
+
+def main_cli(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.compare:
+        return compare(args.compare[0], args.compare[1], args.threshold)
+
+    main = boot(args)
+    if args.scale_trainees:
+        phases = run_scale(main, args)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({
+                    'meta': {
+                        'timestamp': datetime.utcnow().isoformat() + 'Z',
+                        'revision': git_revision(),
+                        'python': platform.python_version(),
+                        'backend': 'mongodb' if args.mongo_uri else 'mongomock',
+                        'target': 'in-process',
+                        'args': {key: value for key, value in vars(args).items() if key not in ('compare', 'output')}
+                    },
+                    'phases': phases
+                }, f, indent=2)
+            print(f'\nWrote {args.output}')
+        return 0
+
+    users, modules, counts = seed(main, args)
+    target = HttpTarget(args.base_url) if args.base_url else AppTarget(main.app)
+    workload = Workload(main, users, modules, args.mix)
+
+    phases = {}
+    if args.serve:
+        # Chat only checks the token, so tokens for this process's users are accepted by the server's copy
+        for mode in args.serve:
+            phases[f'serve_{mode}'] = run_served(mode, args, workload)
+            print_phase(f'serve_{mode} ({args.concurrency} concurrent, {args.llm_latency}s model latency)',
+                        phases[f'serve_{mode}'])
+        if 'serve_sync' in phases and 'serve_async' in phases and phases['serve_sync']['throughput_rps']:
+            ratio = phases['serve_async']['throughput_rps'] / phases['serve_sync']['throughput_rps']
+            print(f'\nasync/sync chat throughput: {ratio:.1f}x')
+    else:
+        if args.overlap_logins:
+            phases.update(run_overlap(target, workload, args))
+        if args.login_burst:
+            phases['login_burst'] = run_phase(target, workload, lambda rng: 'login', args.login_burst, args.concurrency, args.seed)
+            print_phase('login_burst', phases['login_burst'])
+        phases['mixed'] = run_phase(target, workload, workload.pick, args.requests, args.concurrency, args.seed + 1)
+        print_phase('mixed', phases['mixed'])
+
+    chat_session = None
+    if args.chat_session_turns:
+        chat_session = run_chat_session(target, workload, args.chat_session_turns, args.seed + 2)
+        print_chat_session(chat_session)
+
+    if args.output:
+        results = {
+            'meta': {
+                'timestamp': datetime.utcnow().isoformat() + 'Z',
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'backend': 'mongodb' if args.mongo_uri else 'mongomock',
+                'target': args.base_url or ('gunicorn' if args.serve else 'in-process'),
+                'dataset': counts,
+                'args': {key: value for key, value in vars(args).items() if key not in ('compare', 'output')}
+            },
+            'phases': phases,
+            'chat_session': chat_session
+        }
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nWrote {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheStats:
+    """Thread-safe named counters for cache instrumentation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + amount
+
+    def get(self, name):
+        with self._lock:
+            return self._counts.get(name, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+class TTLCache:
+    """Bounded in-process LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=256, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats.incr('misses')
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.stats.incr('misses')
+                self.stats.incr('expired')
+                return default
+            self._data.move_to_end(key)
+            self.stats.incr('hits')
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats.incr('evictions')
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def info(self):
+        counts = self.stats.snapshot()
+        lookups = counts.get('hits', 0) + counts.get('misses', 0)
+        return {
+            'size': len(self),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': counts.get('hits', 0),
+            'misses': counts.get('misses', 0),
+            'evictions': counts.get('evictions', 0),
+            'expired': counts.get('expired', 0),
+            'hit_rate': round(counts.get('hits', 0) / lookups, 4) if lookups else 0.0
+        }
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into a single execution."""
+
+    def __init__(self):
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.stats.incr('executed')
+            else:
+                self.stats.incr('coalesced')
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def info(self):
+        counts = self.stats.snapshot()
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            'in_flight': in_flight,
+            'executed': counts.get('executed', 0),
+            'coalesced': counts.get('coalesced', 0)
+        }
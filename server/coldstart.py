@@ -0,0 +1,118 @@
+"""Measure the cold-start cost of the API and check it against a budget.
+
+Each run starts a fresh interpreter that imports main and serves one request
+through the test client, the same work a new serverless instance does before
+answering. Reports the median import and first-request times, the slowest
+top-level imports, and fails when the import median exceeds the budget or a
+module that should load lazily (the Gemini SDK, NumPy) was imported at startup:
+
+    python coldstart.py --runs 5 --budget-ms 800
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+LAZY_MODULES = ('google.generativeai', 'numpy')
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+response = main.app.test_client().get(sys.argv[1])
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (served - imported) * 1000,
+    'status': response.status_code,
+    'loaded': [name for name in sys.argv[2:] if name in sys.modules]
+}))
+"""
+
+
+def probe_env():
+    env = dict(os.environ)
+    # Placeholders only so main imports; the client never connects during the probe
+    env.setdefault('MONGO_URI', 'mongodb://localhost:27017/firesafe_coldstart')
+    env.setdefault('JWT_SECRET_KEY', 'coldstart-only-jwt-secret-key-012345')
+    return env
+
+
+def run_probe(path):
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE, path, *LAZY_MODULES],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=probe_env(), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit):
+    # -X importtime writes "import time: self | cumulative | name" lines to stderr
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=probe_env(), capture_output=True, text=True, check=True
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nesting is shown as two spaces per level; keep only what main imports directly
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            entries.append((int(cumulative) / 1000, name.strip()))
+    return sorted(entries, reverse=True)[:limit]
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/metrics', help='Route served as the first request.')
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('COLDSTART_BUDGET_MS', 800)),
+                        help='Maximum median import time.')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest imports to list.')
+    parser.add_argument('--output', help='Write results as JSON to this path.')
+    args = parser.parse_args(argv)
+
+    runs = [run_probe(args.path) for _ in range(args.runs)]
+    import_ms = statistics.median(run['import_ms'] for run in runs)
+    first_request_ms = statistics.median(run['first_request_ms'] for run in runs)
+    eager = sorted({name for run in runs for name in run['loaded']})
+    imports = slowest_imports(args.top)
+
+    print(f'import main:    {import_ms:.0f}ms median over {args.runs} runs (budget {args.budget_ms:.0f}ms)')
+    print(f'first request:  {first_request_ms:.0f}ms median ({args.path} -> {runs[0]["status"]})')
+    print('slowest imports:')
+    for cumulative_ms, name in imports:
+        print(f'  {cumulative_ms:8.1f}ms  {name}')
+
+    failures = []
+    if import_ms > args.budget_ms:
+        failures.append(f'import time {import_ms:.0f}ms exceeds the {args.budget_ms:.0f}ms budget')
+    if eager:
+        failures.append(f'loaded at startup but should be lazy: {", ".join(eager)}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'import_ms': import_ms,
+                'first_request_ms': first_request_ms,
+                'budget_ms': args.budget_ms,
+                'eager_modules': eager,
+                'slowest_imports': [{'name': name, 'cumulative_ms': ms} for ms, name in imports],
+                'runs': runs
+            }, f, indent=2)
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
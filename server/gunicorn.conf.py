@@ -0,0 +1,54 @@
+"""Gunicorn settings for serving the API from a long-running host (Vercel does not use this file).
+
+    gunicorn -c gunicorn.conf.py main:app
+
+SERVER_MODE=async (the default) runs gevent workers. gevent monkey-patches
+sockets, locks and sleeps before the app is imported. pymongo, the Gemini
+REST transport and the app's own thread pools then yield while they wait,
+so one process keeps hundreds of chat and generation requests in flight.
+SERVER_MODE=sync runs threaded workers, where each in-flight request holds
+one of GUNICORN_THREADS threads. Compare the two with:
+
+    python bench.py --serve sync async --requests 400 --concurrency 200 --llm-latency 0.5
+"""
+import os
+
+
+SERVER_MODE = os.getenv('SERVER_MODE', 'async')
+
+bind = os.getenv('BIND', f'0.0.0.0:{os.getenv("PORT", 5000)}')
+# One process per core; the waiting on Mongo and Gemini happens inside each worker
+workers = int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1))
+
+if SERVER_MODE == 'async':
+    worker_class = 'gevent'
+    worker_connections = int(os.getenv('WORKER_CONNECTIONS', 1000))
+    # Caps sized for OS threads are raised for greenlets. Workers import the app
+    # after this file runs, so these become its defaults unless already set.
+    os.environ.setdefault('LLM_MAX_IN_FLIGHT', '256')
+    os.environ.setdefault('LLM_MAX_WORKERS', '64')
+    os.environ.setdefault('MONGO_MAX_POOL_SIZE', '50')
+    os.environ.setdefault('GEMINI_TRANSPORT', 'rest')
+elif SERVER_MODE == 'sync':
+    worker_class = 'gthread'
+    threads = int(os.getenv('GUNICORN_THREADS', 8))
+else:
+    raise RuntimeError(f'SERVER_MODE must be async or sync, not {SERVER_MODE!r}')
+
+# Above LLM_TIMEOUT so a slow Gemini call fails inside the app instead of killing the worker
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then; the jitter keeps them from restarting together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+# Not preloaded: the app's thread and process pools must be created in each worker
+preload_app = False
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    # Start the job workers in every server process, including ones that replace a recycled worker
+    import main
+    main.job_runner.start()
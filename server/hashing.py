@@ -0,0 +1,122 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt
+
+
+# bcrypt only reads the first 72 bytes, and bcrypt>=5 raises ValueError beyond that
+MAX_PASSWORD_BYTES = 72
+
+
+class HashingOverloaded(Exception):
+    """Raised when the hashing pool is saturated or too slow to answer."""
+
+
+def _hash_password(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _hash_passwords(passwords, rounds):
+    return [bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds)) for password in passwords]
+
+
+def _check_password(hashed, password):
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded process pool so request threads never burn CPU on it.
+
+    At most `max_pending` hashes may be queued or running at once; beyond that
+    calls fail fast with HashingOverloaded instead of piling up behind the pool.
+    With `workers=0` hashing runs inline, which suits tests and single-process
+    serverless deployments.
+    """
+
+    def __init__(self, rounds=12, workers=2, max_pending=8, timeout=10):
+        self.rounds = rounds
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created lazily so each forked server worker gets its own pool
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingOverloaded('Password hashing queue is full')
+
+        if not self.workers:
+            try:
+                return fn(*args)
+            finally:
+                self._slots.release()
+
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise HashingOverloaded('Password hashing timed out')
+
+    def hash(self, password):
+        if not password:
+            raise ValueError('Password must be non-empty.')
+        return self._run(_hash_password, password.encode('utf-8'), self.rounds).decode('utf-8')
+
+    def hash_many(self, passwords, chunk_size=4):
+        """Hash a batch of passwords across the pool for bulk imports, at the usual cost.
+
+        Chunks are kept small and at most `workers - 1` of them are in the pool
+        at a time, so one process is always free for interactive logins and a
+        login queued behind a chunk waits for a few hashes at most.
+        """
+        if not all(passwords):
+            raise ValueError('Password must be non-empty.')
+        encoded = [password.encode('utf-8') for password in passwords]
+        chunks = [encoded[start:start + chunk_size] for start in range(0, len(encoded), chunk_size)]
+
+        if not self.workers:
+            return [hashed.decode('utf-8') for chunk in chunks for hashed in self._run(_hash_passwords, chunk, self.rounds)]
+
+        window = threading.BoundedSemaphore(max(self.workers - 1, 1))
+        futures = []
+        for chunk in chunks:
+            window.acquire()
+            if not self._slots.acquire(timeout=self.timeout):
+                window.release()
+                raise HashingOverloaded('Password hashing queue is full')
+            try:
+                future = self._get_executor().submit(_hash_passwords, chunk, self.rounds)
+            except BaseException:
+                self._slots.release()
+                window.release()
+                raise
+            future.add_done_callback(lambda _: (self._slots.release(), window.release()))
+            futures.append(future)
+        return [hashed.decode('utf-8') for future in futures for hashed in future.result()]
+
+    def check(self, hashed, password):
+        password = password.encode('utf-8')
+        if len(password) > MAX_PASSWORD_BYTES:
+            # Such a password could never have been hashed, so it cannot match
+            return False
+        return self._run(_check_password, hashed.encode('utf-8'), password)
+
+    def needs_rehash(self, hashed):
+        # bcrypt hashes look like $2b$<cost>$<salt+digest>
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
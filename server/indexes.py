@@ -0,0 +1,41 @@
+from pymongo.errors import OperationFailure
+
+
+def ensure_indexes(db, registry, collections=None):
+    """Create the registry's indexes, returning {collection: (created_names, error)}.
+
+    `registry` maps collection names to lists of IndexModel. create_indexes is
+    a no-op for indexes that already exist with the same keys and options, so
+    this is safe to run on every deploy. A conflicting index (e.g. a unique
+    index over duplicate values) is reported rather than raised.
+    """
+    report = {}
+    for name in collections or registry:
+        models = registry.get(name, [])
+        if not models:
+            continue
+        try:
+            report[name] = (db[name].create_indexes(models), None)
+        except OperationFailure as e:
+            report[name] = ([], str(e))
+    return report
+
+
+def plan_stages(plan):
+    # Flattens the nested winning plan (inputStage/inputStages/queryPlan) into stage names
+    stages = [plan.get('stage')]
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            stages.extend(plan_stages(plan[key]))
+    for child in plan.get('inputStages', []):
+        stages.extend(plan_stages(child))
+    return [stage for stage in stages if stage]
+
+
+def explain_query(collection, query, sort=None):
+    """Return the winning plan's stages for find(query).sort(sort) without running it to completion."""
+    cursor = collection.find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    planner = cursor.explain().get('queryPlanner', {})
+    return plan_stages(planner.get('winningPlan', {}))
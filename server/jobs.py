@@ -0,0 +1,183 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+
+logger = logging.getLogger(__name__)
+
+
+class JobRunner:
+    """Runs jobs stored in a Mongo collection on a bounded pool of local worker threads.
+
+    Jobs move through queued -> running -> succeeded/failed. A failed attempt is
+    re-queued with exponential backoff until `max_attempts` is reached, and a
+    running job whose lease expires (e.g. its process died) is picked up again.
+    Handlers are registered per job kind and return the result to persist; a
+    long handler calls `heartbeat()` now and then to keep its lease. Payloads of
+    `private` kinds (e.g. holding passwords) are dropped once the job finishes.
+    """
+
+    claim_sort = [('run_after', 1)]
+
+    def __init__(self, get_collection, workers=2, max_attempts=3, backoff=2.0,
+                 max_backoff=60.0, lease=600.0, poll_interval=1.0):
+        self.get_collection = get_collection
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.handlers = {}
+        self.private_kinds = set()
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def handler(self, kind, private=False):
+        def register(fn):
+            self.handlers[kind] = fn
+            if private:
+                self.private_kinds.add(kind)
+            return fn
+        return register
+
+    def new_job(self, kind, payload):
+        now = datetime.utcnow()
+        return {
+            'kind': kind,
+            'payload': payload,
+            'state': 'queued',
+            'attempts': 0,
+            'max_attempts': self.max_attempts,
+            'run_after': now,
+            'created_at': now,
+            'updated_at': now
+        }
+
+    def enqueue(self, kind, payload):
+        return self.enqueue_many(kind, [payload])[0]
+
+    def enqueue_many(self, kind, payloads):
+        if kind not in self.handlers:
+            raise ValueError(f'Unknown job kind: {kind}')
+        result = self.get_collection().insert_many([self.new_job(kind, payload) for payload in payloads])
+        self.start()
+        self._wakeup.set()
+        return [str(job_id) for job_id in result.inserted_ids]
+
+    def start(self):
+        # Threads are started lazily so forked server workers each get their own
+        if not self.workers or self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def due_query(self, now):
+        # Queued jobs past their backoff, and running jobs whose lease has expired
+        return {'$or': [
+            {'state': 'queued', 'run_after': {'$lte': now}},
+            {'state': 'running', 'lease_expires': {'$lte': now}}
+        ]}
+
+    def claim(self):
+        now = datetime.utcnow()
+        return self.get_collection().find_one_and_update(
+            self.due_query(now),
+            {
+                '$set': {
+                    'state': 'running',
+                    'started_at': now,
+                    'lease_expires': now + timedelta(seconds=self.lease),
+                    'updated_at': now
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=self.claim_sort,
+            return_document=ReturnDocument.AFTER
+        )
+
+    def heartbeat(self):
+        # Renew the lease of the job running on this thread
+        job = getattr(self._local, 'job', None)
+        if job is None:
+            return
+        now = datetime.utcnow()
+        self.get_collection().update_one(
+            {'_id': job['_id'], 'state': 'running'},
+            {'$set': {'lease_expires': now + timedelta(seconds=self.lease), 'updated_at': now}}
+        )
+
+    def process(self, job):
+        collection = self.get_collection()
+        now = datetime.utcnow()
+        self._local.job = job
+        try:
+            result = self.handlers[job['kind']](job['payload'])
+        except Exception as e:
+            if job['attempts'] < job.get('max_attempts', self.max_attempts):
+                delay = min(self.backoff * 2 ** (job['attempts'] - 1), self.max_backoff)
+                update = {
+                    'state': 'queued',
+                    'run_after': now + timedelta(seconds=delay),
+                    'error': str(e),
+                    'updated_at': now
+                }
+            else:
+                update = {'state': 'failed', 'error': str(e), 'finished_at': now, 'updated_at': now}
+        else:
+            update = {'state': 'succeeded', 'result': result, 'error': None, 'finished_at': now, 'updated_at': now}
+        finally:
+            self._local.job = None
+        unset = {'lease_expires': ''}
+        if job['kind'] in self.private_kinds and update['state'] != 'queued':
+            unset['payload'] = ''
+        collection.update_one({'_id': job['_id']}, {'$set': update, '$unset': unset})
+
+    def run_pending(self):
+        # Drain every job that is due right now on the calling thread
+        processed = 0
+        while True:
+            job = self.claim()
+            if job is None:
+                return processed
+            self.process(job)
+            processed += 1
+
+    def serve(self, workers=None):
+        # Blocking local worker process, e.g. `flask run-jobs`
+        if workers is not None:
+            self.workers = workers
+        self.start()
+        while not self._stopped.wait(1):
+            pass
+
+    def _work(self):
+        while not self._stopped.is_set():
+            try:
+                job = self.claim()
+            except Exception:
+                logger.exception('Could not claim a job')
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            try:
+                self.process(job)
+            except Exception:
+                # The job keeps its lease and is picked up again once it expires
+                logger.exception('Could not record the outcome of job %s', job['_id'])
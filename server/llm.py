@@ -0,0 +1,252 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from cache import CacheStats
+
+
+class LLMUnavailable(Exception):
+    """Raised when an LLM call is rejected, times out or fails upstream."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and lets one probe through after `reset_timeout`."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probing = False
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half_open' or self._failures >= self.failure_threshold:
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def retry_after(self):
+        with self._lock:
+            if self.state != 'open':
+                return 1
+            return max(1, int(self.reset_timeout - (time.monotonic() - self._opened_at)) + 1)
+
+
+class LLMClient:
+    """Guards every call to the Gemini model with a deadline, an in-flight cap and a circuit breaker.
+
+    `get_model` is called on each request so the underlying model can be swapped
+    or created lazily. Chat calls may opt into hedging: if the first attempt has
+    not answered after `hedge_delay` seconds a second one is raced against it.
+    `observer(kind, seconds, outcome, usage)` is told about every finished call,
+    with `usage` being the response's usage metadata when the SDK reports it.
+    """
+
+    def __init__(self, get_model, timeout=30.0, max_in_flight=8, queue_timeout=2.0,
+                 failure_threshold=5, reset_timeout=30.0, hedge_delay=None, observer=None):
+        self.get_model = get_model
+        self.observer = observer
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.hedge_delay = hedge_delay
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = CacheStats()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        # One thread per slot; calls past their deadline keep their slot until they return
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='llm')
+
+    def _request_options(self):
+        return {'timeout': self.timeout} if self.timeout else {}
+
+    def _admit(self, wait_for_slot=True):
+        if not self.breaker.allow():
+            self.stats.incr('rejected_open')
+            raise LLMUnavailable('AI service is temporarily unavailable', self.breaker.retry_after())
+        acquired = self._slots.acquire(timeout=self.queue_timeout) if wait_for_slot else self._slots.acquire(blocking=False)
+        if not acquired:
+            # Give a half-open probe back so the breaker is not stuck waiting for it
+            if self.breaker.state == 'half_open':
+                self.breaker.record_failure()
+            self.stats.incr('rejected_busy')
+            raise LLMUnavailable('AI service is busy, please retry shortly')
+
+    def _observe(self, kind, started, outcome, response=None):
+        if self.observer is not None:
+            try:
+                self.observer(kind, time.perf_counter() - started, outcome,
+                              getattr(response, 'usage_metadata', None))
+            except Exception:
+                pass
+
+    def _call(self, prompt):
+        started = time.perf_counter()
+        try:
+            response = self.get_model().generate_content(prompt, request_options=self._request_options())
+            text = response.text
+        except Exception:
+            self.breaker.record_failure()
+            self.stats.incr('failures')
+            self._observe('generate', started, 'failure')
+            raise
+        finally:
+            self._slots.release()
+        self.breaker.record_success()
+        self._observe('generate', started, 'success', response)
+        return text
+
+    def _submit(self, prompt, wait_for_slot=True):
+        self._admit(wait_for_slot)
+        self.stats.incr('calls')
+        try:
+            return self._executor.submit(self._call, prompt)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def generate(self, prompt, hedge=False):
+        deadline = time.monotonic() + self.timeout
+        futures = [self._submit(prompt)]
+
+        if hedge and self.hedge_delay:
+            done, _ = wait(futures, timeout=self.hedge_delay)
+            if not done:
+                try:
+                    futures.append(self._submit(prompt, wait_for_slot=False))
+                    self.stats.incr('hedges')
+                except LLMUnavailable:
+                    pass
+
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        self.stats.incr('hedge_wins')
+                    return future.result()
+                error = future.exception()
+
+        if error is not None and not pending:
+            raise LLMUnavailable(f'AI service error: {error}')
+        self.stats.incr('timeouts')
+        raise LLMUnavailable('AI service timed out')
+
+    def stream(self, prompt):
+        """Start a streaming generation and return an iterator of text chunks.
+
+        Admission happens immediately so callers can fail fast before they start
+        responding. Closing the iterator before it is exhausted (client
+        disconnect) cancels the upstream call without counting as a failure.
+        """
+        self._admit()
+        self.stats.incr('calls')
+        started = time.perf_counter()
+        try:
+            response = self.get_model().generate_content(
+                prompt, stream=True, request_options=self._request_options()
+            )
+        except Exception as e:
+            self._slots.release()
+            self.breaker.record_failure()
+            self.stats.incr('failures')
+            self._observe('stream', started, 'failure')
+            raise LLMUnavailable(f'AI service error: {e}')
+        return LLMStream(self, response, started)
+
+    def info(self):
+        counts = self.stats.snapshot()
+        counts['circuit'] = self.breaker.state
+        return counts
+
+
+class LLMStream:
+    """Iterator over streamed text chunks that holds an in-flight slot until exhausted or closed."""
+
+    def __init__(self, client, response, started):
+        self._client = client
+        self._response = response
+        self._started = started
+        self._chunks = iter(response)
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        try:
+            while True:
+                chunk = next(self._chunks)
+                if chunk.text:
+                    return chunk.text
+        except StopIteration:
+            self._finish(succeeded=True)
+            raise
+        except Exception:
+            self._finish(succeeded=False)
+            raise
+
+    def close(self):
+        if not self._closed:
+            cancel_stream(self._response)
+            self._finish(succeeded=None)
+
+    def _finish(self, succeeded):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._client._slots.release()
+        if succeeded is True:
+            self._client.breaker.record_success()
+            self._client._observe('stream', self._started, 'success', self._response)
+        elif succeeded is False:
+            self._client.breaker.record_failure()
+            self._client.stats.incr('failures')
+            self._client._observe('stream', self._started, 'failure')
+        else:
+            self._client._observe('stream', self._started, 'cancelled')
+
+
+def cancel_stream(response):
+    # Abort the upstream generation (gRPC calls expose cancel(), REST iterators close())
+    iterator = getattr(response, '_iterator', None)
+    for method in ('cancel', 'close'):
+        stop = getattr(iterator, method, None)
+        if callable(stop):
+            try:
+                stop()
+            except Exception:
+                pass
+            return
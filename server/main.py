@@ -1,15 +1,29 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_pymongo import PyMongo
-from flask_bcrypt import Bcrypt
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-import google.generativeai as genai
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
 import os
 from flask_cors import CORS ,cross_origin
 from datetime import datetime, timedelta
-from pymongo import MongoClient
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pymongo import MongoClient, UpdateOne, ReplaceOne, ReturnDocument, IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 from bson.objectid import ObjectId
 import json
+import base64
+import hashlib
+import click
+import re
 from dotenv import load_dotenv
+from cache import TTLCache, CacheStats, SingleFlight
+from hashing import PasswordHasher, HashingOverloaded, MAX_PASSWORD_BYTES
+from serialization import MongoJSONProvider, compress_response, encode_csv_row
+from jobs import JobRunner
+from uploads import detect_format, iter_rows
+from indexes import ensure_indexes, explain_query
+from llm import LLMClient, LLMUnavailable
+import metrics
+import threading
+import time
 
 load_dotenv()
 app = Flask(__name__)
@@ -22,32 +36,355 @@ app.config['MONGO_URI'] = os.getenv('MONGO_URI')
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
 
-# Initialize extensions
-mongo = PyMongo(app)
-bcrypt = Bcrypt(app)
+# Responses above this many bytes are gzip/brotli compressed when the client accepts it
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+
+# Per-route latency, Mongo command and Gemini call metrics, scraped from /metrics.
+# METRICS_TOKEN, when set, must be sent as a bearer token to read them.
+# Requests slower than SLOW_REQUEST_MS are logged with a db/llm/serialization breakdown,
+# and SERVER_TIMING=1 returns the same breakdown in a Server-Timing header (see bench.py).
+# METRICS_MONGO_SIZES=1 also counts reply bytes, at the cost of re-encoding every reply.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 0))
+SERVER_TIMING = os.getenv('SERVER_TIMING') == '1'
+metrics_registry = metrics.MetricsRegistry()
+metrics.describe_defaults(metrics_registry)
+
+# Initialize extensions. The client connects on first use; the pool is kept small
+# because each serverless instance serves few concurrent requests and many instances
+# share the cluster's connection limit.
+mongo = PyMongo(
+    app,
+    maxPoolSize=int(os.getenv('MONGO_MAX_POOL_SIZE', 10)),
+    minPoolSize=int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+    maxIdleTimeMS=int(os.getenv('MONGO_MAX_IDLE_MS', 60000)),
+    serverSelectionTimeoutMS=int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+    connectTimeoutMS=int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+    event_listeners=[
+        metrics.MongoCommandListener(metrics_registry, measure_sizes=os.getenv('METRICS_MONGO_SIZES') == '1')
+    ]
+)
+# Set after PyMongo, which installs its own extended-JSON provider
+app.json = MongoJSONProvider(app)
 jwt = JWTManager(app)
 
-# Configure Gemini API
+# bcrypt runs in a bounded process pool; overload is rejected with 503 + Retry-After
+password_hasher = PasswordHasher(
+    rounds=int(os.getenv('BCRYPT_LOG_ROUNDS', 12)),
+    workers=int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2)),
+    max_pending=int(os.getenv('PASSWORD_HASH_MAX_PENDING', 16)),
+    timeout=float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+)
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', 2))
+PASSWORD_TOO_LONG = f'Password must be at most {MAX_PASSWORD_BYTES} bytes'
+
+# Bulk CSV/NDJSON imports. Passwords are hashed at BCRYPT_LOG_ROUNDS in small chunks
+# that leave one hashing process free for interactive logins. At that cost a large
+# user upload takes minutes, so past BULK_USERS_ASYNC_ROWS rows it runs as a job.
+USER_ROLES = ('Trainee', 'Admin')
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', 500))
+BULK_MAX_ROWS = int(os.getenv('BULK_MAX_ROWS', 10000))
+BULK_USERS_ASYNC_ROWS = int(os.getenv('BULK_USERS_ASYNC_ROWS', 50))
+
+# Gemini API. The SDK takes most of the import time, so it is loaded and configured
+# on the first LLM call instead of on every cold start (see coldstart.py).
+# GEMINI_TRANSPORT=rest makes calls over plain HTTP, which gevent workers can
+# multiplex; the default gRPC transport blocks a gevent worker (see gunicorn.conf.py).
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-2.0-flash')
+GEMINI_TRANSPORT = os.getenv('GEMINI_TRANSPORT') or None
+MODEL_NAME = 'gemini-2.0-flash'
+model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=GEMINI_API_KEY, transport=GEMINI_TRANSPORT)
+                model = genai.GenerativeModel(MODEL_NAME)
+    return model
+
+# Bounded pool for running independent Gemini calls concurrently
+llm_executor = ThreadPoolExecutor(max_workers=int(os.getenv('LLM_MAX_WORKERS', 8)))
+
+# Every Gemini call goes through this guard: per-call deadline, global in-flight cap,
+# circuit breaker, and optional hedged retries for chat (LLM_HEDGE_DELAY seconds)
+llm = LLMClient(
+    get_model,
+    timeout=float(os.getenv('LLM_TIMEOUT', 30)),
+    max_in_flight=int(os.getenv('LLM_MAX_IN_FLIGHT', 16)),
+    queue_timeout=float(os.getenv('LLM_QUEUE_TIMEOUT', 2)),
+    failure_threshold=int(os.getenv('LLM_FAILURE_THRESHOLD', 5)),
+    reset_timeout=float(os.getenv('LLM_RESET_TIMEOUT', 30)),
+    hedge_delay=float(os.getenv('LLM_HEDGE_DELAY', 0)) or None,
+    observer=lambda kind, seconds, outcome, usage: observe_llm_call(kind, seconds, outcome, usage)
+)
+
+# Generated module content cache: in-process LRU in front of a Mongo TTL collection.
+# Bump PROMPT_VERSION whenever the module prompts change so stale entries are bypassed.
+PROMPT_VERSION = 1
+CONTENT_CACHE_TTL = int(os.getenv('CONTENT_CACHE_TTL', 7 * 24 * 3600))
+content_cache = TTLCache(
+    maxsize=int(os.getenv('CONTENT_CACHE_SIZE', 128)),
+    ttl=int(os.getenv('CONTENT_CACHE_MEMORY_TTL', 3600))
+)
+content_cache_stats = CacheStats()
+
+# Chat answers keyed on the normalized question; identical in-flight questions share one call
+chat_cache = TTLCache(
+    maxsize=int(os.getenv('CHAT_CACHE_SIZE', 512)),
+    ttl=int(os.getenv('CHAT_CACHE_TTL', 3600))
+)
+chat_flight = SingleFlight()
+
+# Chat is grounded in modules.reading_document through a local BM25 index (retrieval.py).
+# It is built on the first chat, updated on module writes, and picks up modules changed by
+# other instances every RETRIEVAL_REFRESH_SECONDS. The top CHAT_CONTEXT_SECTIONS sections
+# go into the prompt; when the best one reaches CHAT_DIRECT_ANSWER_CONFIDENCE (0-1) for a
+# question of at least CHAT_DIRECT_ANSWER_MIN_TERMS keywords it is returned without calling
+# Gemini. Set CHAT_DIRECT_ANSWER_CONFIDENCE above 1 to always call Gemini.
+CHAT_CONTEXT_SECTIONS = int(os.getenv('CHAT_CONTEXT_SECTIONS', 3))
+CHAT_CONTEXT_MIN_CONFIDENCE = float(os.getenv('CHAT_CONTEXT_MIN_CONFIDENCE', 0.2))
+CHAT_DIRECT_ANSWER_CONFIDENCE = float(os.getenv('CHAT_DIRECT_ANSWER_CONFIDENCE', 0.8))
+CHAT_DIRECT_ANSWER_MIN_TERMS = int(os.getenv('CHAT_DIRECT_ANSWER_MIN_TERMS', 2))
+RETRIEVAL_REFRESH_SECONDS = float(os.getenv('RETRIEVAL_REFRESH_SECONDS', 60))
+module_index = None
+_module_index_lock = threading.Lock()
+
+# Server-side chat sessions. A session's prompt carries a running summary plus its most
+# recent turns, together kept under CHAT_SESSION_TOKEN_BUDGET (estimated at ~4 characters
+# per token). When the history outgrows the budget the oldest turns are folded into the
+# summary, leaving about half the budget of recent turns. CHAT_SESSION_SUMMARIZE=0 truncates
+# instead of asking Gemini for the summary. Stored turns are clipped to CHAT_SESSION_TURN_TOKENS
+# and sessions idle for CHAT_SESSION_TTL seconds are removed by Mongo.
+CHAT_SESSION_TOKEN_BUDGET = int(os.getenv('CHAT_SESSION_TOKEN_BUDGET', 1500))
+CHAT_SESSION_SUMMARY_TOKENS = int(os.getenv('CHAT_SESSION_SUMMARY_TOKENS', 300))
+CHAT_SESSION_TURN_TOKENS = int(os.getenv('CHAT_SESSION_TURN_TOKENS', 400))
+CHAT_SESSION_SUMMARIZE = os.getenv('CHAT_SESSION_SUMMARIZE', '1') == '1'
+CHAT_SESSION_TTL = int(os.getenv('CHAT_SESSION_TTL', 7 * 24 * 3600))
+CHAT_SESSION_LIST_LIMIT = 20
+_module_index_state = {'refreshed': None, 'watermark': None, 'indexed': {}}
+
+# Background module generation and large imports. Each server process starts
+# JOB_WORKERS worker threads when it boots (see gunicorn.conf.py), so jobs left
+# queued or with an expired lease by a recycled process are picked up without
+# waiting for a new enqueue. JOB_WORKERS=0 disables in-process workers (e.g. on
+# serverless) and leaves the queue to `flask run-jobs`.
+MAX_BATCH_TITLES = int(os.getenv('MAX_BATCH_TITLES', 100))
+
+# Materialized leaderboard, one document per trainee, kept current by submit_assignment
+LEADERBOARD_MAX_LIMIT = 100
+
+# Attempt history: every attempt is appended to a per-(user, module, month) bucket
+# in attempt_buckets, progress keeps only the RECENT_ATTEMPTS newest, and
+# module_analytics holds per-module rollups updated on each submission.
+RECENT_ATTEMPTS = int(os.getenv('RECENT_ATTEMPTS', 5))
+ATTEMPT_BUCKET_SIZE = int(os.getenv('ATTEMPT_BUCKET_SIZE', 100))
+SCORE_HISTOGRAM_BINS = tuple(range(0, 101, 10))
+
+# Every index the app relies on, keyed by collection. Applied by `flask ensure-indexes`
+# at deploy time and, unless AUTO_INDEXES=0, once per process when a collection is
+# first used. Index names are left to the server so existing indexes are matched.
+INDEXES = {
+    'users': [
+        # Login and the duplicate-email check; also makes registration race-free
+        IndexModel([('email', ASCENDING)], unique=True),
+        # Keyset scan of trainees in /api/trainees
+        IndexModel([('role', ASCENDING), ('_id', ASCENDING)])
+    ],
+    'modules': [
+        IndexModel([('title', ASCENDING)]),
+        # Incremental refresh of the chat retrieval index
+        IndexModel([('updated_at', ASCENDING)])
+    ],
+    # Trainee progress lives in its own collection, one record per (module_id, user_id)
+    'progress': [
+        IndexModel([('module_id', ASCENDING), ('user_id', ASCENDING)], unique=True),
+        IndexModel([('user_id', ASCENDING)]),
+        IndexModel([('module_id', ASCENDING), ('passed', ASCENDING), ('last_score', DESCENDING)])
+    ],
+    'attempt_buckets': [
+        IndexModel([('user_id', ASCENDING), ('module_id', ASCENDING), ('period', ASCENDING), ('count', ASCENDING)]),
+        IndexModel([('module_id', ASCENDING), ('period', ASCENDING)])
+    ],
+    'leaderboard': [
+        IndexModel([('score', DESCENDING), ('modules_completed', DESCENDING)])
+    ],
+    'jobs': [
+        IndexModel([('state', ASCENDING), ('run_after', ASCENDING)])
+    ],
+    # A user's recent sessions; idle sessions expire CHAT_SESSION_TTL after updated_at
+    'chat_sessions': [
+        IndexModel([('user_id', ASCENDING), ('updated_at', DESCENDING)]),
+        IndexModel([('updated_at', ASCENDING)], expireAfterSeconds=CHAT_SESSION_TTL)
+    ],
+    # Mongo removes cached module content once created_at is older than the TTL
+    'generated_content': [
+        IndexModel([('created_at', ASCENDING)], expireAfterSeconds=CONTENT_CACHE_TTL)
+    ]
+}
+AUTO_INDEXES = os.getenv('AUTO_INDEXES', '1') == '1'
+_indexed_collections = set()
+
+# Compiled quiz answer keys per (module id, version); an edit bumps the version
+answer_key_cache = TTLCache(
+    maxsize=int(os.getenv('ANSWER_KEY_CACHE_SIZE', 1024)),
+    ttl=int(os.getenv('ANSWER_KEY_CACHE_TTL', 600))
+)
+PASS_PERCENTAGE = 70
+
+# Field projections so listings never pull reading documents, quizzes or videos
+MODULE_SUMMARY_FIELDS = {'title': 1, 'reading_time': 1, 'videos_time': 1, 'assignment_time': 1}
+MODULE_DETAIL_FIELDS = dict(MODULE_SUMMARY_FIELDS, reading_document=1, videos=1, mcq_assignment=1, version=1)
+
+# Exports stream rows straight off a Mongo cursor, joining users one batch at a time
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 500))
+EXPORT_COLUMNS = {
+    'progress': ('cursor', 'user_id', 'name', 'email', 'module_id', 'module_title', 'reading_completed',
+                 'videos_completed', 'assignment_completed', 'attempt_count', 'last_score', 'best_score',
+                 'passed', 'first_pass_attempt', 'last_attempt_at'),
+    'attempts': ('cursor', 'user_id', 'name', 'email', 'module_id', 'module_title', 'timestamp', 'score',
+                 'passed', 'missed_questions')
+}
+
+TRAINEES_PAGE_SIZE = int(os.getenv('TRAINEES_PAGE_SIZE', 100))
+TRAINEES_MAX_PAGE_SIZE = int(os.getenv('TRAINEES_MAX_PAGE_SIZE', 500))
+
+# User profiles cached per process. ROLE_CHECK_MODE decides where roles come from:
+#   token - trust the role claim embedded in the JWT
+#   cache - read the cached profile, re-checking the database once the entry goes stale
+#   db    - always read the database
+ROLE_CHECK_MODE = os.getenv('ROLE_CHECK_MODE', 'cache')
+user_cache = TTLCache(
+    maxsize=int(os.getenv('USER_CACHE_SIZE', 4096)),
+    ttl=int(os.getenv('USER_CACHE_TTL', 60))
+)
+
+def hashing_overloaded_response():
+    response = jsonify({'status': 'error', 'message': 'Server is busy, please retry shortly'})
+    response.headers['Retry-After'] = str(PASSWORD_HASH_RETRY_AFTER)
+    return response, 503
+
+def create_user_token(user_id, role):
+    return create_access_token(identity=user_id, additional_claims={'role': role})
+
+def format_user(user):
+    return {
+        '_id': user['_id'],
+        'name': user['name'],
+        'email': user['email'],
+        'mobile': user['mobile'],
+        'role': user['role']
+    }
+
+def get_user_profile(user_id, use_cache=True):
+    profile = user_cache.get(user_id) if use_cache else None
+    if profile is None:
+        user = users_store().find_one(
+            {'_id': ObjectId(user_id)},
+            {'name': 1, 'email': 1, 'mobile': 1, 'role': 1}
+        )
+        if not user:
+            return None
+        profile = format_user(user)
+        user_cache.set(user_id, profile)
+    return profile
+
+def invalidate_user(user_id):
+    user_cache.delete(user_id)
+
+def current_user_role():
+    if ROLE_CHECK_MODE == 'token':
+        role = get_jwt().get('role')
+        if role:
+            return role
+    # Tokens issued before the role claim existed fall back to the profile lookup
+    profile = get_user_profile(get_jwt_identity(), use_cache=ROLE_CHECK_MODE != 'db')
+    return profile['role'] if profile else None
+
+def observe_llm_call(kind, seconds, outcome, usage):
+    metrics_registry.inc('llm_calls_total', {'kind': kind, 'outcome': outcome})
+    metrics_registry.observe('llm_call_duration_seconds', seconds, {'kind': kind})
+    if usage is not None:
+        for direction, field in (('prompt', 'prompt_token_count'), ('completion', 'candidates_token_count')):
+            tokens = getattr(usage, field, None)
+            if tokens:
+                metrics_registry.inc('llm_tokens_total', {'kind': kind, 'direction': direction}, tokens)
+
+def collect_runtime_gauges():
+    llm_info = llm.info()
+    samples = [('llm_circuit_open', {}, int(llm_info.pop('circuit') != 'closed'))]
+    samples.extend(('llm_guard_events', {'event': event}, count) for event, count in llm_info.items())
+    for name, stats in (('module_content', content_cache_stats), ('chat', chat_cache.stats),
+                        ('answer_keys', answer_key_cache.stats), ('users', user_cache.stats)):
+        for event, count in stats.snapshot().items():
+            samples.append(('cache_events', {'cache': name, 'event': event}, count))
+    return samples
+
+metrics_registry.describe('llm_circuit_open', 'gauge', '1 while the Gemini circuit breaker is open or half-open.')
+metrics_registry.describe('llm_guard_events', 'gauge', 'Gemini guard counters: calls, rejections, timeouts, hedges.')
+metrics_registry.describe('cache_events', 'gauge', 'In-process cache counters since start.')
+metrics_registry.add_collector(collect_runtime_gauges)
+
+@app.before_request
+def start_request_timer():
+    request.environ['metrics.started'] = time.perf_counter()
+    metrics.begin_request()
+
+@app.after_request
+def record_request_metrics(response):
+    started = request.environ.get('metrics.started')
+    breakdown = metrics.end_request()
+    if started is None:
+        return response
+    # Streamed responses are timed to the first byte; the body is produced after this hook
+    seconds = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics_registry.inc('http_requests_total', {
+        'method': request.method, 'route': route, 'status': str(response.status_code)
+    })
+    metrics_registry.observe('http_request_duration_seconds', seconds, {'method': request.method, 'route': route})
+    for component in ('db', 'llm', 'serialization'):
+        if breakdown[component]:
+            metrics_registry.inc('http_request_component_seconds_total',
+                                 {'route': route, 'component': component}, breakdown[component])
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = (
+            f'db;dur={breakdown["db"] * 1000:.2f};desc="{breakdown["db_ops"]} ops", '
+            f'llm;dur={breakdown["llm"] * 1000:.2f}, '
+            f'serialization;dur={breakdown["serialization"] * 1000:.2f}, '
+            f'total;dur={seconds * 1000:.2f}'
+        )
+    if SLOW_REQUEST_MS and seconds * 1000 >= SLOW_REQUEST_MS:
+        app.logger.warning(
+            'Slow request %s %s -> %s in %.0fms (db %.0fms over %d ops, llm %.0fms, serialization %.0fms)',
+            request.method, request.path, response.status_code, seconds * 1000,
+            breakdown['db'] * 1000, breakdown['db_ops'], breakdown['llm'] * 1000, breakdown['serialization'] * 1000
+        )
+    return response
+
+@app.after_request
+def compress(response):
+    return compress_response(response, request.accept_encodings, COMPRESS_MIN_SIZE, COMPRESS_LEVEL)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/verify-token', methods=['GET'])
 @jwt_required()
 def verify_token():
     try:
         current_user = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user)})
-        if not user:
+        user_data = get_user_profile(current_user, use_cache=ROLE_CHECK_MODE != 'db')
+        if not user_data:
             return jsonify({'status': 'error', 'message': 'User not found'}), 404
         
-        user_data = {
-            '_id': str(user['_id']),
-            'name': user['name'],
-            'email': user['email'],
-            'mobile': user['mobile'],
-            'role': user['role']
-        }
         return jsonify({'status': 'success', 'user': user_data}), 200
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -65,12 +402,14 @@ def register():
 
         if not name or not email or not mobile or not password:
             return jsonify({'status': 'error', 'message': 'All fields are required'}), 400
+        if len(password.encode('utf-8')) > MAX_PASSWORD_BYTES:
+            return jsonify({'status': 'error', 'message': PASSWORD_TOO_LONG}), 400
 
-        existing_user = mongo.db.users.find_one({'email': email})
+        existing_user = users_store().find_one({'email': email})
         if existing_user:
             return jsonify({'status': 'error', 'message': 'Email already registered'}), 400
 
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed_password = password_hasher.hash(password)
         new_user = {
             'name': name,
             'email': email,
@@ -80,15 +419,18 @@ def register():
             'created_at': datetime.utcnow()
         }
 
-        result = mongo.db.users.insert_one(new_user)
+        try:
+            result = users_store().insert_one(new_user)
+        except DuplicateKeyError:
+            return jsonify({'status': 'error', 'message': 'Email already registered'}), 400
         user = {
-            '_id': str(result.inserted_id),
+            '_id': result.inserted_id,
             'name': name,
             'email': email,
             'mobile': mobile,
             'role': role
         }
-        access_token = create_access_token(identity=str(result.inserted_id))
+        access_token = create_user_token(str(result.inserted_id), role)
 
         return jsonify({
             'status': 'success',
@@ -96,6 +438,8 @@ def register():
             'user': user,
             'access_token': access_token
         }), 201
+    except HashingOverloaded:
+        return hashing_overloaded_response()
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -112,39 +456,38 @@ def login():
         if not email or not password:
             return jsonify({'status': 'error', 'message': 'Email and password are required'}), 400
 
-        user = mongo.db.users.find_one({'email': email})
-        if not user or not bcrypt.check_password_hash(user['password'], password):
+        user = users_store().find_one({'email': email})
+        if not user or not password_hasher.check(user['password'], password):
             return jsonify({'status': 'error', 'message': 'Invalid email or password'}), 401
 
-        access_token = create_access_token(identity=str(user['_id']))
-        user_data = {
-            '_id': str(user['_id']),
-            'name': user['name'],
-            'email': user['email'],
-            'mobile': user['mobile'],
-            'role': user['role']
-        }
+        # Upgrade the stored hash when BCRYPT_LOG_ROUNDS has changed
+        if password_hasher.needs_rehash(user['password']):
+            try:
+                users_store().update_one(
+                    {'_id': user['_id'], 'password': user['password']},
+                    {'$set': {'password': password_hasher.hash(password)}}
+                )
+            except HashingOverloaded:
+                pass
+
+        access_token = create_user_token(str(user['_id']), user['role'])
+        user_data = format_user(user)
         return jsonify({
             'status': 'success',
             'message': 'Logged in successfully',
             'user': user_data,
             'access_token': access_token
         }), 200
+    except HashingOverloaded:
+        return hashing_overloaded_response()
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': f'Login failed: {str(e)}'
         }), 500
 
-@app.route('/api/generate-module-content', methods=['POST'])
-@jwt_required()
-def generate_module_content():
-    try:
-        data = request.get_json()
-        module_title = data.get('moduleTitle')
-        
-        # Generate reading document
-        reading_prompt = f"""Create a comprehensive educational document about {module_title} for fire safety training. 
+def build_reading_prompt(module_title):
+    return f"""Create a comprehensive educational document about {module_title} for fire safety training. 
         Include the following sections:
         1. Introduction
         2. Key Learning Objectives
@@ -155,11 +498,9 @@ def generate_module_content():
         
         Format the content with clear headings and bullet points where appropriate.
         Write in a professional training style suitable for fire safety professionals."""
-        
-        reading_response = model.generate_content(reading_prompt)
-        
-        # Generate MCQ Assignment
-        mcq_prompt = f"""Create a multiple-choice quiz with 10 challenging questions about {module_title} for fire safety training. 
+
+def build_mcq_prompt(module_title):
+    return f"""Create a multiple-choice quiz with 10 challenging questions about {module_title} for fire safety training. 
         Each question should have 4 options with only one correct answer. 
         Ensure the questions cover different aspects of the topic and vary in difficulty.
         
@@ -174,39 +515,718 @@ def generate_module_content():
             // more questions...
           ]
         }}"""
-        
-        mcq_response = model.generate_content(mcq_prompt)
-        
-        # try:
-        #     # Try to parse the MCQ response to validate it's proper JSON
-        #     # mcq_json = json.loads(mcq_response.text)
-        #     # print(mcq_json)
-        #     # mcq_str = json.dumps(mcq_json) 
-        #     #  # Convert back to string for storage
-        # except json.JSONDecodeError:
-        #     # If parsing fails, return a basic structure
-        #     mcq_str = json.dumps({
-        #         "quiz": [
-        #             {
-        #                 "question": "Example question?",
-        #                 "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
-        #                 "answer": "Option 1"
-        #             }
-        #         ]
-        #     })
+
+def generate_text(prompt, hedge=False):
+    with metrics.timed('llm'):
+        return llm.generate(prompt, hedge=hedge)
+
+def llm_unavailable_response(error):
+    response = jsonify({'status': 'error', 'message': str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+def content_cache_key(module_title):
+    normalized_title = ' '.join(module_title.lower().split())
+    raw_key = f'{normalized_title}|{PROMPT_VERSION}|{MODEL_NAME}'
+    return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+
+def indexed_collection(name):
+    if AUTO_INDEXES and name not in _indexed_collections:
+        for collection, (_, error) in ensure_indexes(mongo.db, INDEXES, [name]).items():
+            if error:
+                app.logger.warning('Could not create indexes on %s: %s', collection, error)
+        _indexed_collections.add(name)
+    return mongo.db[name]
+
+def content_store():
+    return indexed_collection('generated_content')
+
+def get_cached_module_content(cache_key):
+    sections = content_cache.get(cache_key)
+    if sections is not None:
+        content_cache_stats.incr('memory_hits')
+        return sections
+
+    stored = content_store().find_one(
+        {'_id': cache_key},
+        {'reading_document': 1, 'mcq_assignment': 1}
+    )
+    if stored:
+        sections = {
+            'reading_document': stored['reading_document'],
+            'mcq_assignment': stored['mcq_assignment']
+        }
+        content_cache.set(cache_key, sections)
+        content_cache_stats.incr('store_hits')
+        return sections
+
+    content_cache_stats.incr('misses')
+    return None
+
+def store_module_content(cache_key, module_title, sections):
+    content_cache.set(cache_key, sections)
+    content_store().replace_one(
+        {'_id': cache_key},
+        {
+            'title': module_title,
+            'model': MODEL_NAME,
+            'prompt_version': PROMPT_VERSION,
+            'reading_document': sections['reading_document'],
+            'mcq_assignment': sections['mcq_assignment'],
+            'created_at': datetime.utcnow()
+        },
+        upsert=True
+    )
+
+def submit_module_generation(module_title):
+    # Both sections are independent, so run them side by side on the shared pool
+    return {
+        llm_executor.submit(generate_text, build_reading_prompt(module_title)): 'reading_document',
+        llm_executor.submit(generate_text, build_mcq_prompt(module_title)): 'mcq_assignment'
+    }
+
+def stream_module_sections(futures, cache_key, module_title):
+    # Emit one NDJSON line per section in completion order
+    sections = {}
+    for future in as_completed(futures):
+        section = futures[future]
+        try:
+            sections[section] = future.result()
+            line = {'status': 'success', 'section': section, 'content': sections[section]}
+        except Exception as e:
+            line = {'status': 'error', 'section': section, 'message': f'Content generation failed: {str(e)}'}
+        yield json.dumps(line) + '\n'
+
+    if len(sections) == len(futures):
+        store_module_content(cache_key, module_title, sections)
+    yield json.dumps({'status': 'done', 'cached': False}) + '\n'
+
+def stream_cached_sections(sections):
+    for section, content in sections.items():
+        yield json.dumps({'status': 'success', 'section': section, 'content': content}) + '\n'
+    yield json.dumps({'status': 'done', 'cached': True}) + '\n'
+
+def users_store():
+    return indexed_collection('users')
+
+def modules_store():
+    return indexed_collection('modules')
+
+def read_upload_rows():
+    # Accepts a multipart `file` field or a raw CSV/NDJSON request body
+    upload = request.files.get('file')
+    if upload is not None:
+        fmt = detect_format(upload.mimetype, upload.filename, request.args.get('format'))
+        return iter_rows(upload.stream, fmt)
+    fmt = detect_format(request.mimetype, requested=request.args.get('format'))
+    return iter_rows(request.stream, fmt)
+
+def prepare_bulk_rows(rows, prepare):
+    """Validate rows with `prepare`, which returns the row's fields or raises ValueError.
+
+    Returns ([(row_number, fields)], report entries for invalid rows, truncated).
+    """
+    prepared, invalid, truncated = [], [], False
+    for row_number, row, error in rows:
+        if row_number > BULK_MAX_ROWS:
+            truncated = True
+            break
+        if error is None:
+            try:
+                prepared.append((row_number, prepare(row)))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            invalid.append({'row': row_number, 'status': 'invalid', 'message': error})
+    return prepared, invalid, truncated
+
+def bulk_import_report(results, truncated):
+    results.sort(key=lambda result: result['row'])
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return {'summary': summary, 'truncated': truncated, 'results': results}
+
+def run_bulk_import(rows, prepare, insert_batch):
+    """Validate rows with `prepare`, insert them in batches and build a per-row report.
+
+    `prepare(row)` returns the row's fields or raises ValueError; `insert_batch`
+    receives [(row_number, fields)] and returns one result dict per row.
+    """
+    results, batch, truncated = [], [], False
+    for row_number, row, error in rows:
+        if row_number > BULK_MAX_ROWS:
+            truncated = True
+            break
+        if error is None:
+            try:
+                batch.append((row_number, prepare(row)))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            results.append({'row': row_number, 'status': 'invalid', 'message': error})
+        if len(batch) >= BULK_BATCH_SIZE:
+            results.extend(insert_batch(batch))
+            batch = []
+    if batch:
+        results.extend(insert_batch(batch))
+
+    return jsonify({'status': 'success', **bulk_import_report(results, truncated)}), 200
+
+def insert_documents(collection, batch, documents, key):
+    # ordered=False keeps going past duplicates; each row gets its own outcome
+    failures = {}
+    if documents:
+        try:
+            collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            failures = {error['index']: error for error in e.details.get('writeErrors', [])}
+
+    results = []
+    for index, ((row_number, fields), document) in enumerate(zip(batch, documents)):
+        error = failures.get(index)
+        if error is None:
+            results.append({'row': row_number, key: fields[key], 'status': 'created', 'id': document['_id']})
+        elif error.get('code') == 11000:
+            results.append({'row': row_number, key: fields[key], 'status': 'duplicate'})
+        else:
+            results.append({'row': row_number, key: fields[key], 'status': 'error', 'message': error.get('errmsg')})
+    return results
+
+def prepare_user_row(row):
+    fields = {field: str(row.get(field) or '').strip() for field in ('name', 'email', 'mobile', 'password', 'role')}
+    fields['role'] = fields['role'] or 'Trainee'
+    missing = [field for field in ('name', 'email', 'mobile', 'password') if not fields[field]]
+    if missing:
+        raise ValueError(f'Missing {", ".join(missing)}')
+    if '@' not in fields['email']:
+        raise ValueError('Invalid email')
+    if fields['role'] not in USER_ROLES:
+        raise ValueError(f'Role must be one of {", ".join(USER_ROLES)}')
+    if len(fields['password'].encode('utf-8')) > MAX_PASSWORD_BYTES:
+        raise ValueError(PASSWORD_TOO_LONG)
+    return fields
+
+def insert_user_batch(batch):
+    # Skip known emails before paying for bcrypt; the unique index catches races
+    existing = {user['email'] for user in users_store().find(
+        {'email': {'$in': [fields['email'] for _, fields in batch]}}, {'email': 1}
+    )}
+    results = [
+        {'row': row_number, 'email': fields['email'], 'status': 'duplicate'}
+        for row_number, fields in batch if fields['email'] in existing
+    ]
+    fresh = [(row_number, fields) for row_number, fields in batch if fields['email'] not in existing]
+    hashes = password_hasher.hash_many([fields['password'] for _, fields in fresh])
+    now = datetime.utcnow()
+    documents = [{
+        'name': fields['name'],
+        'email': fields['email'],
+        'mobile': fields['mobile'],
+        'password': hashed,
+        'role': fields['role'],
+        'created_at': now
+    } for (_, fields), hashed in zip(fresh, hashes)]
+    return results + insert_documents(users_store(), fresh, documents, 'email')
+
+@app.route('/api/users/bulk', methods=['POST'])
+@jwt_required()
+def bulk_import_users():
+    try:
+        if current_user_role() != 'Admin':
+            return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+
+        rows = read_upload_rows()
+        seen_emails = set()
+
+        def prepare(row):
+            fields = prepare_user_row(row)
+            if fields['email'] in seen_emails:
+                raise ValueError('Duplicate email within upload')
+            seen_emails.add(fields['email'])
+            return fields
+
+        prepared, results, truncated = prepare_bulk_rows(rows, prepare)
+
+        if len(prepared) > BULK_USERS_ASYNC_ROWS:
+            # Too slow to hash within one request; the report is the job's result
+            job_id = job_runner.enqueue('import_users', {
+                'rows': prepared,
+                'invalid': results,
+                'truncated': truncated
+            })
+            return jsonify({'status': 'success', 'job_id': job_id, 'rows': len(prepared)}), 202
+
+        for start in range(0, len(prepared), BULK_BATCH_SIZE):
+            results.extend(insert_user_batch(prepared[start:start + BULK_BATCH_SIZE]))
+        return jsonify({'status': 'success', **bulk_import_report(results, truncated)}), 200
+
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except HashingOverloaded:
+        # Rows created before the overload stay; re-uploading skips them as duplicates
+        return hashing_overloaded_response()
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Bulk user import failed: {str(e)}'
+        }), 500
+
+@app.route('/api/users/<user_id>', methods=['PATCH'])
+@jwt_required()
+def update_user(user_id):
+    try:
+        # Verify user is admin
+        if current_user_role() != 'Admin':
+            return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+
+        data = request.get_json()
+        updates = {field: data[field] for field in ('name', 'mobile', 'role') if field in data}
+        if not updates:
+            return jsonify({'status': 'error', 'message': 'No fields to update'}), 400
+
+        result = users_store().update_one({'_id': ObjectId(user_id)}, {'$set': updates})
+        if result.matched_count == 0:
+            return jsonify({'status': 'error', 'message': 'User not found'}), 404
+
+        invalidate_user(user_id)
+        if 'name' in updates:
+            leaderboard_store().update_one({'_id': user_id}, {'$set': {'name': updates['name']}})
+
+        return jsonify({
+            'status': 'success',
+            'message': 'User updated successfully',
+            'user': get_user_profile(user_id)
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'User update failed: {str(e)}'
+        }), 500
+
+def jobs_store():
+    return indexed_collection('jobs')
+
+job_runner = JobRunner(
+    jobs_store,
+    workers=int(os.getenv('JOB_WORKERS', 2)),
+    max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', 3)),
+    backoff=float(os.getenv('JOB_BACKOFF', 2))
+)
+
+@job_runner.handler('generate_module_content')
+def run_module_generation_job(payload):
+    with app.app_context():
+        module_title = payload['moduleTitle']
+        cache_key = content_cache_key(module_title)
+        sections = None if payload.get('force_refresh') else get_cached_module_content(cache_key)
+        if sections is None:
+            futures = submit_module_generation(module_title)
+            sections = {section: future.result() for future, section in futures.items()}
+            store_module_content(cache_key, module_title, sections)
+        return sections
+
+# The rows carry plaintext passwords, so the payload is dropped once the job finishes.
+# A retry after a partial import reports the rows created earlier as duplicates.
+@job_runner.handler('import_users', private=True)
+def run_user_import_job(payload):
+    with app.app_context():
+        results, rows = payload['invalid'], payload['rows']
+        for start in range(0, len(rows), BULK_BATCH_SIZE):
+            results.extend(insert_user_batch(rows[start:start + BULK_BATCH_SIZE]))
+            job_runner.heartbeat()
+        return bulk_import_report(results, payload['truncated'])
+
+def format_job(job):
+    formatted = {
+        'id': job['_id'],
+        'kind': job['kind'],
+        'state': job['state'],
+        'attempts': job['attempts'],
+        'error': job.get('error'),
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at']
+    }
+    if job['kind'] not in job_runner.private_kinds:
+        formatted['payload'] = job['payload']
+    if job['state'] == 'succeeded':
+        formatted['result'] = job.get('result')
+    return formatted
+
+@app.route('/api/generate-module-content', methods=['POST'])
+@jwt_required()
+def generate_module_content():
+    try:
+        data = request.get_json()
+        module_title = data.get('moduleTitle')
+        stream = data.get('stream', False) or request.args.get('stream') in ('1', 'true')
+        force_refresh = data.get('force_refresh', False)
+
+        if not module_title:
+            return jsonify({'status': 'error', 'message': 'Module title is required'}), 400
+
+        if data.get('async', False):
+            # Queued jobs run unattended against the Gemini quota, so only admins may queue them
+            if current_user_role() != 'Admin':
+                return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+            job_id = job_runner.enqueue('generate_module_content', {
+                'moduleTitle': module_title,
+                'force_refresh': force_refresh
+            })
+            return jsonify({'status': 'success', 'job_id': job_id}), 202
+
+        cache_key = content_cache_key(module_title)
+        sections = None if force_refresh else get_cached_module_content(cache_key)
+
+        if sections is not None:
+            if stream:
+                return Response(stream_cached_sections(sections), mimetype='application/x-ndjson')
+            return jsonify({
+                'status': 'success',
+                'reading_document': sections['reading_document'],
+                'mcq_assignment': sections['mcq_assignment'],
+                'cached': True
+            }), 200
+
+        futures = submit_module_generation(module_title)
+
+        if stream:
+            return Response(
+                stream_with_context(stream_module_sections(futures, cache_key, module_title)),
+                mimetype='application/x-ndjson'
+            )
+
+        with metrics.timed('llm'):
+            sections = {section: future.result() for future, section in futures.items()}
+        store_module_content(cache_key, module_title, sections)
         
         return jsonify({
             'status': 'success',
-            'reading_document': reading_response.text,
-            'mcq_assignment': mcq_response.text
+            'reading_document': sections['reading_document'],
+            'mcq_assignment': sections['mcq_assignment'],
+            'cached': False
         }), 200
 
+    except LLMUnavailable as e:
+        return llm_unavailable_response(e)
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': f'Content generation failed: {str(e)}'
         }), 500
 
+@app.route('/api/generate-module-content/batch', methods=['POST'])
+@jwt_required()
+def generate_module_content_batch():
+    try:
+        if current_user_role() != 'Admin':
+            return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+
+        data = request.get_json()
+        titles = [title.strip() for title in data.get('titles', []) if isinstance(title, str) and title.strip()]
+
+        if not titles:
+            return jsonify({'status': 'error', 'message': 'At least one module title is required'}), 400
+        if len(titles) > MAX_BATCH_TITLES:
+            return jsonify({'status': 'error', 'message': f'At most {MAX_BATCH_TITLES} titles per batch'}), 400
+
+        job_ids = job_runner.enqueue_many('generate_module_content', [
+            {'moduleTitle': title, 'force_refresh': data.get('force_refresh', False)}
+            for title in titles
+        ])
+
+        return jsonify({
+            'status': 'success',
+            'jobs': [{'moduleTitle': title, 'job_id': job_id} for title, job_id in zip(titles, job_ids)]
+        }), 202
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Batch submission failed: {str(e)}'
+        }), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    try:
+        # Jobs are queued by admins and carry their payloads and generated content
+        if current_user_role() != 'Admin':
+            return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+
+        job = jobs_store().find_one({'_id': ObjectId(job_id)})
+        if not job:
+            return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+
+        return jsonify({'status': 'success', 'job': format_job(job)}), 200
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Job retrieval failed: {str(e)}'
+        }), 500
+
+@app.route('/api/cache/stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    try:
+        # Verify user is admin
+        if current_user_role() != 'Admin':
+            return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+
+        module_content = content_cache_stats.snapshot()
+        module_content['memory'] = content_cache.info()
+
+        chat_answers = chat_cache.info()
+        chat_answers['single_flight'] = chat_flight.info()
+
+        return jsonify({
+            'status': 'success',
+            'cache': {
+                'module_content': module_content,
+                'chat': chat_answers,
+                'answer_keys': answer_key_cache.info(),
+                'users': user_cache.info()
+            },
+            'retrieval': module_index.info() if module_index is not None else None
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Cache stats retrieval failed: {str(e)}'
+        }), 500
+
+def get_module_index():
+    """Return the chat retrieval index, building it on first use and then topping it
+    up with modules whose updated_at moved since the last refresh."""
+    global module_index
+    state = _module_index_state
+    if module_index is not None and time.monotonic() - state['refreshed'] < RETRIEVAL_REFRESH_SECONDS:
+        return module_index
+
+    with _module_index_lock:
+        if module_index is None:
+            # NumPy is only needed once someone chats, so it stays out of the cold start
+            from retrieval import ModuleIndex
+            index = ModuleIndex()
+        else:
+            index = module_index
+        if state['refreshed'] is None or time.monotonic() - state['refreshed'] >= RETRIEVAL_REFRESH_SECONDS:
+            # $gte so a module written in the watermark's millisecond is not missed
+            query = {'updated_at': {'$gte': state['watermark']}} if state['watermark'] else {}
+            for module in modules_store().find(query, {'title': 1, 'reading_document': 1, 'updated_at': 1}):
+                index_module(index, module)
+                if module.get('updated_at') and (state['watermark'] is None or module['updated_at'] > state['watermark']):
+                    state['watermark'] = module['updated_at']
+            state['refreshed'] = time.monotonic()
+        module_index = index
+    return module_index
+
+def index_module(index, module):
+    # Skips modules already indexed at this updated_at so refreshes leave the index version alone
+    module_id = str(module['_id'])
+    updated_at = module.get('updated_at')
+    if updated_at is not None and _module_index_state['indexed'].get(module_id) == updated_at:
+        return
+    index.add_module(module_id, module.get('title'), module.get('reading_document'))
+    _module_index_state['indexed'][module_id] = updated_at
+
+def reindex_modules(modules):
+    # Module writes update a built index in place; an unbuilt one reads them when first used
+    if module_index is not None:
+        for module in modules:
+            index_module(module_index, module)
+
+def retrieve_sections(user_message):
+    hits = get_module_index().search(user_message, k=CHAT_CONTEXT_SECTIONS)
+    return [hit for hit in hits if hit['confidence'] >= CHAT_CONTEXT_MIN_CONFIDENCE]
+
+def direct_answer(sections):
+    # A close match on a specific question is answered from the training material itself
+    if not sections:
+        return None
+    best = sections[0]
+    if best['confidence'] < CHAT_DIRECT_ANSWER_CONFIDENCE or best['terms'] < CHAT_DIRECT_ANSWER_MIN_TERMS:
+        return None
+    source = best['module_title'] + (f' - {best["heading"]}' if best['heading'] else '')
+    return f'{best["text"]}\n\n(From the training module: {source})'
+
+def build_chat_prompt(user_message, sections=(), session=None):
+    context = ''
+    if sections:
+        excerpts = '\n\n'.join(
+            f'[{section["module_title"]}' + (f' - {section["heading"]}]' if section['heading'] else ']') + f'\n{section["text"]}'
+            for section in sections
+        )
+        context = f"""
+        Base your answer on these excerpts from our training modules where they are relevant:
+{excerpts}
+"""
+    if session and (session.get('summary') or session.get('turns')):
+        lines = [f'Summary of the earlier conversation: {session["summary"]}'] if session.get('summary') else []
+        lines.extend(f'{turn["role"].title()}: {turn["text"]}' for turn in session.get('turns', []))
+        history = '\n'.join(lines)
+        context += f"""
+        Conversation so far, for context on follow-up questions:
+{history}
+"""
+    return f"""You are a fire safety training assistant. Provide clear, concise, and accurate answers to questions about fire safety.{context}
+        The user asks: {user_message}
+        
+        Respond in a professional and helpful manner, focusing on fire safety best practices, regulations, and training information.
+        If the question is not related to fire safety, politely inform the user that you specialize in fire safety topics."""
+
+def chat_cache_key(user_message):
+    # The index version is part of the key so answers follow edits to the material
+    normalized = ' '.join(re.sub(r'[^\w\s]', ' ', user_message.lower()).split())
+    return hashlib.sha256(f'{get_module_index().version}:{normalized}'.encode('utf-8')).hexdigest()
+
+def get_chat_answer(user_message):
+    cache_key = chat_cache_key(user_message)
+    answer = chat_cache.get(cache_key)
+    if answer is not None:
+        metrics_registry.inc('chat_answers_total', {'source': 'cache'})
+        return answer
+
+    def generate():
+        sections = retrieve_sections(user_message)
+        answer = direct_answer(sections)
+        if answer is None:
+            answer = generate_text(build_chat_prompt(user_message, sections), hedge=True)
+            metrics_registry.inc('chat_answers_total', {'source': 'llm'})
+        else:
+            metrics_registry.inc('chat_answers_total', {'source': 'modules'})
+        chat_cache.set(cache_key, answer)
+        return answer
+
+    return chat_flight.do(cache_key, generate)
+
+def estimate_tokens(text):
+    # Gemini averages about four characters per token in English; close enough for budgeting
+    return (len(text) + 3) // 4
+
+def clip_to_tokens(text, tokens):
+    return text if estimate_tokens(text) <= tokens else text[:tokens * 4].rstrip() + '...'
+
+def chat_sessions_store():
+    return indexed_collection('chat_sessions')
+
+def find_chat_session(session_id, user_id):
+    if not ObjectId.is_valid(session_id):
+        return None
+    return chat_sessions_store().find_one({'_id': ObjectId(session_id), 'user_id': user_id})
+
+def history_tokens(session):
+    return session.get('summary_tokens', 0) + sum(turn['tokens'] for turn in session.get('turns', []))
+
+def session_prompt(session, user_message):
+    """Return (direct_answer, None) or (None, prompt) for a message in a session."""
+    sections = retrieve_sections(user_message)
+    answer = direct_answer(sections)
+    if answer is not None:
+        metrics_registry.inc('chat_answers_total', {'source': 'modules'})
+        return answer, None
+    metrics_registry.inc('chat_answers_total', {'source': 'llm'})
+    return None, build_chat_prompt(user_message, sections, session)
+
+def record_session_turn(session, user_message, answer, prompt_tokens):
+    """Append a question and answer to the session, then compact it if it is over budget."""
+    now = datetime.utcnow()
+    turns = [
+        {'role': role, 'text': text, 'tokens': estimate_tokens(text), 'at': now}
+        for role, text in (('user', clip_to_tokens(user_message, CHAT_SESSION_TURN_TOKENS)),
+                           ('assistant', clip_to_tokens(answer, CHAT_SESSION_TURN_TOKENS)))
+    ]
+    session = chat_sessions_store().find_one_and_update(
+        {'_id': session['_id']},
+        {
+            '$push': {'turns': {'$each': turns}},
+            '$inc': {'turn_count': len(turns), 'messages': 1, 'prompt_tokens_total': prompt_tokens},
+            '$max': {'prompt_tokens_max': prompt_tokens},
+            '$set': {'prompt_tokens_last': prompt_tokens, 'updated_at': now}
+        },
+        return_document=ReturnDocument.AFTER
+    )
+    metrics_registry.inc('chat_session_prompt_tokens_total', amount=prompt_tokens)
+    if session and history_tokens(session) > CHAT_SESSION_TOKEN_BUDGET:
+        session = compact_chat_session(session)
+    return session
+
+def summarize_turns(summary, turns):
+    transcript = '\n'.join(f'{turn["role"].title()}: {turn["text"]}' for turn in turns)
+    if CHAT_SESSION_SUMMARIZE:
+        try:
+            text = generate_text(f"""Summarize this fire safety training conversation in at most {CHAT_SESSION_SUMMARY_TOKENS * 3 // 4} words.
+        Keep what the trainee told you about their situation, the questions they asked and the advice given.
+        Earlier summary: {summary or 'none'}
+{transcript}""")
+            metrics_registry.inc('chat_session_compactions_total', {'method': 'summary'})
+            return clip_to_tokens(' '.join(text.split()), CHAT_SESSION_SUMMARY_TOKENS)
+        except LLMUnavailable:
+            pass
+
+    # Without Gemini keep the latest questions verbatim, as many as fit
+    metrics_registry.inc('chat_session_compactions_total', {'method': 'truncate'})
+    lines = (summary.split('\n') if summary else []) + [
+        f'User asked: {turn["text"]}' for turn in turns if turn['role'] == 'user'
+    ]
+    kept, tokens = [], 0
+    for line in reversed(lines):
+        tokens += estimate_tokens(line) + 1
+        if tokens > CHAT_SESSION_SUMMARY_TOKENS:
+            break
+        kept.append(line)
+    return '\n'.join(reversed(kept))
+
+def compact_chat_session(session):
+    # Keep the newest turns that fit in half the budget and fold the rest into the summary
+    turns = session['turns']
+    keep, kept_tokens = len(turns), 0
+    while keep > 0 and kept_tokens + turns[keep - 1]['tokens'] <= CHAT_SESSION_TOKEN_BUDGET // 2:
+        keep -= 1
+        kept_tokens += turns[keep]['tokens']
+    if keep == 0:
+        return session
+    summary = summarize_turns(session.get('summary', ''), turns[:keep])
+    # Matching turn_count skips the write if another message landed meanwhile; it compacts next time
+    compacted = chat_sessions_store().find_one_and_update(
+        {'_id': session['_id'], 'turn_count': session['turn_count']},
+        {
+            '$set': {'summary': summary, 'summary_tokens': estimate_tokens(summary), 'turns': turns[keep:]},
+            '$inc': {'compactions': 1, 'folded_turns': keep}
+        },
+        return_document=ReturnDocument.AFTER
+    )
+    return compacted or session
+
+def format_chat_session(session, include_turns=True):
+    formatted = {
+        'id': session['_id'],
+        'created_at': session['created_at'],
+        'updated_at': session['updated_at'],
+        'messages': session.get('messages', 0),
+        'history_tokens': history_tokens(session),
+        'token_budget': CHAT_SESSION_TOKEN_BUDGET,
+        'prompt_tokens': {
+            'last': session.get('prompt_tokens_last', 0),
+            'max': session.get('prompt_tokens_max', 0),
+            'total': session.get('prompt_tokens_total', 0)
+        },
+        'compactions': session.get('compactions', 0)
+    }
+    if include_turns:
+        formatted['summary'] = session.get('summary', '')
+        formatted['turns'] = [
+            {'role': turn['role'], 'text': turn['text'], 'at': turn['at']} for turn in session.get('turns', [])
+        ]
+    return formatted
+
+def sse_event(data, event=None):
+    message = f'event: {event}\n' if event else ''
+    return message + f'data: {json.dumps(data)}\n\n'
+
 @app.route('/api/chat', methods=['POST'])
 @jwt_required()
 def chat():
@@ -216,49 +1236,684 @@ def chat():
         
         if not user_message:
             return jsonify({'status': 'error', 'message': 'Message is required'}), 400
+
+        # With a session the history shapes the answer, so the shared answer cache is bypassed
+        if data.get('session_id'):
+            session = find_chat_session(data['session_id'], get_jwt_identity())
+            if not session:
+                return jsonify({'status': 'error', 'message': 'Chat session not found'}), 404
+            answer, prompt = session_prompt(session, user_message)
+            prompt_tokens = 0
+            if answer is None:
+                prompt_tokens = estimate_tokens(prompt)
+                answer = generate_text(prompt, hedge=True)
+            session = record_session_turn(session, user_message, answer, prompt_tokens)
+            return jsonify({
+                'status': 'success',
+                'response': answer,
+                'session_id': data['session_id'],
+                'prompt_tokens': prompt_tokens,
+                'history_tokens': history_tokens(session) if session else 0
+            }), 200
         
-        prompt = f"""You are a fire safety training assistant. Provide clear, concise, and accurate answers to questions about fire safety.
-        The user asks: {user_message}
-        
-        Respond in a professional and helpful manner, focusing on fire safety best practices, regulations, and training information.
-        If the question is not related to fire safety, politely inform the user that you specialize in fire safety topics."""
-        
-        response = model.generate_content(prompt)
+        answer = get_chat_answer(user_message)
         
         return jsonify({
             'status': 'success',
-            'response': response.text
+            'response': answer
         }), 200
         
+    except LLMUnavailable as e:
+        return llm_unavailable_response(e)
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': f'Chat failed: {str(e)}'
         }), 500
 
+@app.route('/api/chat/stream', methods=['GET', 'POST'])
+@jwt_required()
+def chat_stream():
+    try:
+        data = request.get_json(silent=True) or {}
+        user_message = data.get('message') or request.args.get('message')
+
+        if not user_message:
+            return jsonify({'status': 'error', 'message': 'Message is required'}), 400
+
+        session, prompt = None, None
+        if data.get('session_id'):
+            session = find_chat_session(data['session_id'], get_jwt_identity())
+            if not session:
+                return jsonify({'status': 'error', 'message': 'Chat session not found'}), 404
+            cached_answer, prompt = session_prompt(session, user_message)
+            if cached_answer is None:
+                chunks = llm.stream(prompt)
+            else:
+                record_session_turn(session, user_message, cached_answer, 0)
+        else:
+            cache_key = chat_cache_key(user_message)
+            cached_answer = chat_cache.get(cache_key)
+            if cached_answer is None:
+                sections = retrieve_sections(user_message)
+                cached_answer = direct_answer(sections)
+                if cached_answer is None:
+                    chunks = llm.stream(build_chat_prompt(user_message, sections))
+                    metrics_registry.inc('chat_answers_total', {'source': 'llm'})
+                else:
+                    chat_cache.set(cache_key, cached_answer)
+                    metrics_registry.inc('chat_answers_total', {'source': 'modules'})
+            else:
+                metrics_registry.inc('chat_answers_total', {'source': 'cache'})
+
+    except LLMUnavailable as e:
+        return llm_unavailable_response(e)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Chat failed: {str(e)}'
+        }), 500
+
+    def generate_cached():
+        yield sse_event({'text': cached_answer}, 'chunk')
+        yield sse_event({'status': 'done', 'cached': True}, 'done')
+
+    def generate():
+        parts = []
+        try:
+            for text in chunks:
+                parts.append(text)
+                yield sse_event({'text': text}, 'chunk')
+            if session is not None:
+                prompt_tokens = estimate_tokens(prompt)
+                record_session_turn(session, user_message, ''.join(parts), prompt_tokens)
+                yield sse_event({'status': 'done', 'cached': False, 'prompt_tokens': prompt_tokens}, 'done')
+                return
+            chat_cache.set(cache_key, ''.join(parts))
+            yield sse_event({'status': 'done', 'cached': False}, 'done')
+        except Exception as e:
+            yield sse_event({'status': 'error', 'message': f'Chat failed: {str(e)}'}, 'error')
+
+    if cached_answer is not None:
+        return Response(
+            generate_cached(),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # The WSGI server closes the response when the client disconnects, even before
+    # the first chunk; that cancels the upstream generation and frees its slot
+    response.call_on_close(chunks.close)
+    return response
+
+@app.route('/api/chat/sessions', methods=['POST'])
+@jwt_required()
+def create_chat_session():
+    try:
+        now = datetime.utcnow()
+        session = {
+            'user_id': get_jwt_identity(),
+            'summary': '',
+            'summary_tokens': 0,
+            'turns': [],
+            'turn_count': 0,
+            'messages': 0,
+            'prompt_tokens_last': 0,
+            'prompt_tokens_max': 0,
+            'prompt_tokens_total': 0,
+            'compactions': 0,
+            'created_at': now,
+            'updated_at': now
+        }
+        result = chat_sessions_store().insert_one(session)
+
+        return jsonify({
+            'status': 'success',
+            'session_id': result.inserted_id
+        }), 201
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Chat session creation failed: {str(e)}'
+        }), 500
+
+@app.route('/api/chat/sessions', methods=['GET'])
+@jwt_required()
+def list_chat_sessions():
+    try:
+        sessions = chat_sessions_store().find(
+            {'user_id': get_jwt_identity()}, {'turns.text': 0}
+        ).sort('updated_at', DESCENDING).limit(CHAT_SESSION_LIST_LIMIT)
+
+        return jsonify({
+            'status': 'success',
+            'sessions': [format_chat_session(session, include_turns=False) for session in sessions]
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Chat sessions retrieval failed: {str(e)}'
+        }), 500
+
+@app.route('/api/chat/sessions/<session_id>', methods=['GET'])
+@jwt_required()
+def get_chat_session(session_id):
+    try:
+        session = find_chat_session(session_id, get_jwt_identity())
+        if not session:
+            return jsonify({'status': 'error', 'message': 'Chat session not found'}), 404
+
+        return jsonify({
+            'status': 'success',
+            'session': format_chat_session(session)
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Chat session retrieval failed: {str(e)}'
+        }), 500
+
+@app.route('/api/chat/sessions/<session_id>', methods=['DELETE'])
+@jwt_required()
+def delete_chat_session(session_id):
+    try:
+        if not ObjectId.is_valid(session_id):
+            return jsonify({'status': 'error', 'message': 'Chat session not found'}), 404
+        result = chat_sessions_store().delete_one({'_id': ObjectId(session_id), 'user_id': get_jwt_identity()})
+        if result.deleted_count == 0:
+            return jsonify({'status': 'error', 'message': 'Chat session not found'}), 404
+
+        return jsonify({
+            'status': 'success',
+            'message': 'Chat session deleted'
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Chat session deletion failed: {str(e)}'
+        }), 500
+
+def progress_store():
+    return indexed_collection('progress')
+
+def leaderboard_store():
+    return indexed_collection('leaderboard')
+
+def leaderboard_contribution(progress):
+    # Only passed modules count towards a trainee's leaderboard score
+    if progress and progress.get('passed'):
+        return progress.get('last_score', 0), 1
+    return 0, 0
+
+def update_leaderboard(user_id, previous_progress, current_progress):
+    old_score, old_count = leaderboard_contribution(previous_progress)
+    new_score, new_count = leaderboard_contribution(current_progress)
+    if (old_score, old_count) == (new_score, new_count):
+        return
+
+    user = get_user_profile(user_id)
+    leaderboard_store().update_one(
+        {'_id': user_id},
+        [
+            {'$set': {
+                'name': user['name'] if user else '',
+                'total_score': {'$add': [{'$ifNull': ['$total_score', 0]}, new_score - old_score]},
+                'modules_completed': {'$add': [{'$ifNull': ['$modules_completed', 0]}, new_count - old_count]},
+                'updated_at': datetime.utcnow()
+            }},
+            {'$set': {
+                'score': {'$cond': [
+                    {'$gt': ['$modules_completed', 0]},
+                    {'$divide': ['$total_score', '$modules_completed']},
+                    0
+                ]}
+            }}
+        ],
+        upsert=True
+    )
+
+def compute_leaderboard():
+    pipeline = [
+        {'$match': {'passed': True}},
+        {'$group': {
+            '_id': '$user_id',
+            'total_score': {'$sum': '$last_score'},
+            'modules_completed': {'$sum': 1}
+        }}
+    ]
+    return {row['_id']: row for row in progress_store().aggregate(pipeline)}
+
+def user_names(user_ids):
+    users = users_store().find(
+        {'_id': {'$in': [ObjectId(user_id) for user_id in user_ids]}},
+        {'name': 1}
+    )
+    return {str(user['_id']): user['name'] for user in users}
+
+def find_progress(module_id, user_id):
+    return progress_store().find_one({'module_id': module_id, 'user_id': user_id})
+
+PROGRESS_SECTION_FIELDS = ('reading_completed', 'videos_completed', 'assignment_completed')
+
+def upsert_progress(module_id, user_id, update, return_document=ReturnDocument.AFTER):
+    # One atomic round-trip on the unique (module_id, user_id) index. Two racing
+    # upserts can both miss and insert; the loser retries as a plain update.
+    defaults = {field: False for field in PROGRESS_SECTION_FIELDS if field not in update.get('$set', {})}
+    if '$push' not in update or 'attempts' not in update['$push']:
+        defaults['attempts'] = []
+    update = dict(update, **{'$setOnInsert': defaults})
+
+    for attempt in range(2):
+        try:
+            return progress_store().find_one_and_update(
+                {'module_id': module_id, 'user_id': user_id},
+                update,
+                upsert=True,
+                return_document=return_document
+            )
+        except DuplicateKeyError:
+            if attempt:
+                raise
+
+def attempt_store():
+    return indexed_collection('attempt_buckets')
+
+def analytics_store():
+    return mongo.db.module_analytics
+
+def attempt_period(timestamp):
+    return timestamp.strftime('%Y-%m')
+
+def legacy_bucket_operations(prog, attempts):
+    """Bucket writes for a progress record's pre-bucketing attempt array, oldest first.
+
+    Bucket ids derive from the record, period and chunk, so rebuild-analytics
+    and a first-touch submission write the same buckets and re-runs are safe.
+    """
+    operations = []
+    by_period = {}
+    for attempt in attempts:
+        by_period.setdefault(attempt_period(attempt['timestamp']), []).append(attempt)
+    for period, period_attempts in by_period.items():
+        for start in range(0, len(period_attempts), ATTEMPT_BUCKET_SIZE):
+            chunk = period_attempts[start:start + ATTEMPT_BUCKET_SIZE]
+            # Deterministic ObjectIds keep re-runs idempotent and _id ordering uniform for exports
+            bucket_key = f'{prog["_id"]}:{period}:{start // ATTEMPT_BUCKET_SIZE}'
+            operations.append(ReplaceOne(
+                {'_id': ObjectId(hashlib.sha256(bucket_key.encode('utf-8')).hexdigest()[:24])},
+                {
+                    'user_id': prog['user_id'],
+                    'module_id': prog['module_id'],
+                    'period': period,
+                    # Full so new attempts always open a fresh bucket
+                    'count': ATTEMPT_BUCKET_SIZE,
+                    'attempts': [dict(attempt, missed=[]) for attempt in chunk],
+                    'first_at': chunk[0]['timestamp'],
+                    'last_at': chunk[-1]['timestamp']
+                },
+                upsert=True
+            ))
+    return operations
+
+def legacy_first_pass(attempts):
+    return next((number for number, attempt in enumerate(attempts, start=1) if attempt.get('passed')), None)
+
+def bucket_legacy_progress(prog):
+    """Bucket the attempts of a record that predates attempt_count; returns how many there were.
+
+    Called with the pre-update document of the first submission on such a
+    record: that update kept only the newest attempts and counted one, so the
+    full history goes to buckets and the counters are corrected here.
+    """
+    attempts = sorted(prog.get('attempts', []), key=lambda attempt: attempt['timestamp'])
+    operations = legacy_bucket_operations(prog, attempts)
+    if operations:
+        attempt_store().bulk_write(operations, ordered=False)
+    update = {'$inc': {'attempt_count': len(attempts)}}
+    if attempts:
+        update['$max'] = {'best_score': max(attempt['score'] for attempt in attempts)}
+    first_pass = legacy_first_pass(attempts)
+    if first_pass:
+        # $min in case a concurrent passing submission already claimed a later number
+        update['$min'] = {'first_pass_attempt': first_pass}
+    progress_store().update_one({'_id': prog['_id']}, update)
+    return len(attempts)
+
+def record_attempt(module_id, user_id, attempt):
+    # Appends to this month's open bucket; once it holds ATTEMPT_BUCKET_SIZE
+    # attempts the filter stops matching and the upsert starts a new one
+    attempt_store().update_one(
+        {
+            'user_id': user_id,
+            'module_id': module_id,
+            'period': attempt_period(attempt['timestamp']),
+            'count': {'$lt': ATTEMPT_BUCKET_SIZE}
+        },
+        {
+            '$push': {'attempts': attempt},
+            '$inc': {'count': 1},
+            '$min': {'first_at': attempt['timestamp']},
+            '$max': {'last_at': attempt['timestamp']}
+        },
+        upsert=True
+    )
+
+def score_bin(score):
+    return str(min(int(score // 10) * 10, 100))
+
+def update_module_analytics(module_id, attempt, attempt_number, first_pass, question_count):
+    increments = {
+        'attempts': 1,
+        'score_total': attempt['score'],
+        f'score_histogram.{score_bin(attempt["score"])}': 1
+    }
+    if attempt['passed']:
+        increments['passes'] = 1
+    if attempt_number == 1:
+        increments['trainees'] = 1
+    if first_pass:
+        increments['first_passes'] = 1
+        increments['attempts_to_pass_total'] = attempt_number
+    for index in attempt['missed']:
+        increments[f'question_misses.{index}'] = 1
+    analytics_store().update_one(
+        {'_id': module_id},
+        {'$inc': increments, '$set': {'questions': question_count, 'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+def merge_analytics(rollups):
+    merged = {'_id': None}
+    for rollup in rollups:
+        for field in ('attempts', 'passes', 'trainees', 'first_passes', 'attempts_to_pass_total', 'score_total'):
+            merged[field] = merged.get(field, 0) + rollup.get(field, 0)
+        histogram = merged.setdefault('score_histogram', {})
+        for score, count in rollup.get('score_histogram', {}).items():
+            histogram[score] = histogram.get(score, 0) + count
+    return merged
+
+def format_module_analytics(rollup, title=None):
+    attempts = rollup.get('attempts', 0)
+    first_passes = rollup.get('first_passes', 0)
+    misses = rollup.get('question_misses', {})
+    formatted = {
+        'module_id': rollup['_id'],
+        'module_title': title,
+        'trainees': rollup.get('trainees', 0),
+        'attempts': attempts,
+        'passes': rollup.get('passes', 0),
+        'pass_rate': round(rollup.get('passes', 0) / attempts, 4) if attempts else None,
+        'mean_score': round(rollup.get('score_total', 0) / attempts, 2) if attempts else None,
+        'mean_attempts_to_pass': round(rollup.get('attempts_to_pass_total', 0) / first_passes, 2) if first_passes else None,
+        'score_histogram': {str(score): rollup.get('score_histogram', {}).get(str(score), 0) for score in SCORE_HISTOGRAM_BINS}
+    }
+    if 'questions' in rollup:
+        formatted['question_miss_rates'] = [
+            round(misses.get(str(index), 0) / attempts, 4) if attempts else None
+            for index in range(rollup['questions'])
+        ]
+    return formatted
+
+def compute_module_analytics():
+    # Full recomputation from the attempt buckets and progress records, used to
+    # backfill and repair the incrementally maintained rollups
+    rollups = {}
+
+    def rollup(module_id):
+        return rollups.setdefault(module_id, {'_id': module_id, 'score_histogram': {}, 'question_misses': {}})
+
+    for row in attempt_store().aggregate([
+        {'$unwind': '$attempts'},
+        {'$group': {
+            '_id': {
+                'module_id': '$module_id',
+                'bin': {'$min': [{'$multiply': [{'$floor': {'$divide': ['$attempts.score', 10]}}, 10]}, 100]}
+            },
+            'attempts': {'$sum': 1},
+            'passes': {'$sum': {'$cond': ['$attempts.passed', 1, 0]}},
+            'score_total': {'$sum': '$attempts.score'}
+        }}
+    ]):
+        entry = rollup(row['_id']['module_id'])
+        for field in ('attempts', 'passes', 'score_total'):
+            entry[field] = entry.get(field, 0) + row[field]
+        entry['score_histogram'][str(int(row['_id']['bin']))] = row['attempts']
+
+    for row in attempt_store().aggregate([
+        {'$unwind': '$attempts'},
+        {'$unwind': '$attempts.missed'},
+        {'$group': {'_id': {'module_id': '$module_id', 'index': '$attempts.missed'}, 'misses': {'$sum': 1}}}
+    ]):
+        rollup(row['_id']['module_id'])['question_misses'][str(row['_id']['index'])] = row['misses']
+
+    for row in progress_store().aggregate([
+        {'$match': {'attempt_count': {'$gt': 0}}},
+        {'$group': {
+            '_id': '$module_id',
+            'trainees': {'$sum': 1},
+            'first_passes': {'$sum': {'$cond': [{'$gt': ['$first_pass_attempt', 0]}, 1, 0]}},
+            'attempts_to_pass_total': {'$sum': {'$ifNull': ['$first_pass_attempt', 0]}}
+        }}
+    ]):
+        entry = rollup(row['_id'])
+        for field in ('trainees', 'first_passes', 'attempts_to_pass_total'):
+            entry[field] = row[field]
+
+    modules = modules_store().find(
+        {'_id': {'$in': [ObjectId(module_id) for module_id in rollups if ObjectId.is_valid(module_id)]}},
+        {'answer_key': 1}
+    )
+    for module in modules:
+        rollups[str(module['_id'])]['questions'] = len(module.get('answer_key') or [])
+
+    now = datetime.utcnow()
+    for entry in rollups.values():
+        entry['updated_at'] = now
+    return list(rollups.values())
+
+def module_etag(module_id, version):
+    return f'{module_id}-v{version}'
+
+def conditional_json(payload, etag=None):
+    # Strong ETag plus If-None-Match handling; matching requests get an empty 304
+    response = jsonify(payload)
+    if etag:
+        response.set_etag(etag)
+    else:
+        response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+def parse_quiz(raw_quiz):
+    # Gemini often wraps JSON in markdown fences or adds prose around it
+    text = (raw_quiz or '').strip()
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end < start:
+        raise ValueError('no JSON object found')
+    try:
+        parsed = json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise ValueError(f'invalid JSON ({e.msg})')
+
+    quiz = parsed.get('quiz') if isinstance(parsed, dict) else None
+    if not isinstance(quiz, list) or not quiz:
+        raise ValueError('expected a non-empty "quiz" list')
+
+    questions = []
+    for index, item in enumerate(quiz, start=1):
+        if not isinstance(item, dict):
+            raise ValueError(f'question {index} is not an object')
+        question = str(item.get('question', '')).strip()
+        options = item.get('options')
+        answer = str(item.get('answer', '')).strip()
+        if not question or not isinstance(options, list) or len(options) < 2 or not answer:
+            raise ValueError(f'question {index} needs a question, at least two options and an answer')
+        options = [str(option).strip() for option in options]
+        # Trainees submit the option text, so an answer like "B" beside full-sentence options never matches
+        if answer not in options:
+            raise ValueError(f'question {index} answer must be one of its options')
+        questions.append({
+            'question': question,
+            'options': options,
+            'answer': answer
+        })
+    return questions
+
+def compile_quiz_fields(raw_quiz):
+    # Normalized quiz text for the client plus the answer key used for grading
+    if not raw_quiz:
+        return {'mcq_assignment': '', 'answer_key': []}
+    questions = parse_quiz(raw_quiz)
+    return {
+        'mcq_assignment': json.dumps({'quiz': questions}),
+        'answer_key': [question['answer'] for question in questions]
+    }
+
+def get_answer_key(module_id):
+    # One small read per submit, so an edit made through any server process is seen at once
+    module = modules_store().find_one({'_id': ObjectId(module_id)}, {'version': 1})
+    if not module:
+        return None
+    answer_key = answer_key_cache.get((module_id, module.get('version', 0)))
+    if answer_key is not None:
+        return answer_key
+
+    module = modules_store().find_one({'_id': ObjectId(module_id)}, {'answer_key': 1, 'version': 1})
+    if not module:
+        return None
+
+    answer_key = module.get('answer_key')
+    if answer_key is None:
+        # Modules created before answer keys existed are compiled once and backfilled
+        legacy = modules_store().find_one({'_id': ObjectId(module_id)}, {'mcq_assignment': 1})
+        try:
+            answer_key = compile_quiz_fields(legacy.get('mcq_assignment', ''))['answer_key']
+        except ValueError:
+            answer_key = []
+        modules_store().update_one({'_id': ObjectId(module_id)}, {'$set': {'answer_key': answer_key}})
+
+    answer_key_cache.set((module_id, module.get('version', 0)), answer_key)
+    return answer_key
+
+def grade_answers(answer_key, user_answers):
+    # Returns the score, whether it passes, and the indexes of the missed questions
+    missed = [
+        i for i, answer in enumerate(answer_key)
+        if i >= len(user_answers) or str(user_answers[i]).strip() != answer
+    ]
+    score_percentage = ((len(answer_key) - len(missed)) / len(answer_key)) * 100 if answer_key else 0
+    return score_percentage, score_percentage >= PASS_PERCENTAGE, missed
+
+def build_module_document(data):
+    quiz_fields = compile_quiz_fields(data.get('mcq_assignment', ''))
+    now = datetime.utcnow()
+    return {
+        'title': data.get('title'),
+        'reading_document': data.get('reading_document', ''),
+        'videos': data.get('videos', []),
+        'mcq_assignment': quiz_fields['mcq_assignment'],
+        'answer_key': quiz_fields['answer_key'],
+        'reading_time': data.get('reading_time', 5),
+        'videos_time': data.get('videos_time', 5),
+        'assignment_time': data.get('assignment_time', 10),
+        'version': 1,
+        'created_at': now,
+        'updated_at': now
+    }
+
+def prepare_module_row(row):
+    # CSV cells are strings: videos are '|'-separated and the quiz is JSON text
+    data = {'title': str(row.get('title') or '').strip()}
+    if not data['title']:
+        raise ValueError('Missing title')
+    data['reading_document'] = row.get('reading_document') or ''
+    videos = row.get('videos') or []
+    data['videos'] = [video.strip() for video in videos.split('|') if video.strip()] if isinstance(videos, str) else videos
+    quiz = row.get('mcq_assignment') or ''
+    data['mcq_assignment'] = quiz if isinstance(quiz, str) else json.dumps(quiz)
+    for field, default in (('reading_time', 5), ('videos_time', 5), ('assignment_time', 10)):
+        value = row.get(field)
+        try:
+            data[field] = int(value) if value not in (None, '') else default
+        except (TypeError, ValueError):
+            raise ValueError(f'{field} must be a whole number')
+    try:
+        return build_module_document(data)
+    except ValueError as e:
+        raise ValueError(f'Invalid MCQ assignment: {e}')
+
+@app.route('/api/modules/bulk', methods=['POST'])
+@jwt_required()
+def bulk_import_modules():
+    try:
+        if current_user_role() != 'Admin':
+            return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+
+        rows = read_upload_rows()
+        # skip_existing makes re-running the same import idempotent by title
+        skip_existing = parse_bool_arg('skip_existing')
+        seen_titles = set()
+
+        def insert_batch(batch):
+            results = []
+            if skip_existing:
+                existing = seen_titles | {module['title'] for module in modules_store().find(
+                    {'title': {'$in': [module['title'] for _, module in batch]}}, {'title': 1}
+                )}
+                fresh = []
+                for row_number, module in batch:
+                    if module['title'] in existing:
+                        results.append({'row': row_number, 'title': module['title'], 'status': 'duplicate'})
+                    else:
+                        existing.add(module['title'])
+                        fresh.append((row_number, module))
+                seen_titles.update(existing)
+                batch = fresh
+            results += insert_documents(modules_store(), batch, [module for _, module in batch], 'title')
+            created = {result['id'] for result in results if result['status'] == 'created'}
+            reindex_modules(module for _, module in batch if module.get('_id') in created)
+            return results
+
+        return run_bulk_import(rows, prepare_module_row, insert_batch)
+
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Bulk module import failed: {str(e)}'
+        }), 500
+
 @app.route('/api/modules', methods=['POST'])
 @jwt_required()
 def create_module():
     try:
+        if current_user_role() != 'Admin':
+            return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+
         data = request.get_json()
-        new_module = {
-            'title': data.get('title'),
-            'reading_document': data.get('reading_document', ''),
-            'videos': data.get('videos', []),
-            'mcq_assignment': data.get('mcq_assignment', ''),
-            'reading_time': data.get('reading_time', 5),
-            'videos_time': data.get('videos_time', 5),
-            'assignment_time': data.get('assignment_time', 10),
-            'created_at': datetime.utcnow(),
-            'trainees_progress': []
-        }
+
+        try:
+            new_module = build_module_document(data)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': f'Invalid MCQ assignment: {str(e)}'}), 400
         
-        result = mongo.db.modules.insert_one(new_module)
+        result = modules_store().insert_one(new_module)
+        reindex_modules([new_module])
         
         return jsonify({
             'status': 'success',
             'message': 'Module created successfully',
-            'module_id': str(result.inserted_id)
+            'module_id': result.inserted_id
         }), 201
 
     except Exception as e:
@@ -272,15 +1927,14 @@ def create_module():
 def get_modules():
     try:
         user_id = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(user_id)})
         
-        if user['role'] == 'Admin':
+        if current_user_role() == 'Admin':
             # For admin, return all modules
-            modules = list(mongo.db.modules.find())
+            modules = list(modules_store().find({}, MODULE_SUMMARY_FIELDS))
             formatted_modules = []
             for module in modules:
                 formatted_module = {
-                    'id': str(module['_id']),
+                    'id': module['_id'],
                     'title': module['title'],
                     'reading_time': module.get('reading_time', 5),
                     'videos_time': module.get('videos_time', 5),
@@ -289,14 +1943,18 @@ def get_modules():
                 formatted_modules.append(formatted_module)
         else:
             # For trainee, return modules with progress
-            modules = list(mongo.db.modules.find())
+            modules = list(modules_store().find({}, {'title': 1}))
+            progress_by_module = {
+                prog['module_id']: prog
+                for prog in progress_store().find(
+                    {'user_id': user_id},
+                    {'module_id': 1, 'reading_completed': 1, 'videos_completed': 1, 'assignment_completed': 1}
+                )
+            }
             formatted_modules = []
             for module in modules:
                 module_id = str(module['_id'])
-                user_progress = next((
-                    prog for prog in module.get('trainees_progress', []) 
-                    if prog['user_id'] == user_id
-                ), None)
+                user_progress = progress_by_module.get(module_id)
                 
                 # Calculate progress
                 progress = 0
@@ -318,10 +1976,11 @@ def get_modules():
                 }
                 formatted_modules.append(formatted_module)
         
-        return jsonify({
+        # The listing depends on per-user progress, so the ETag is a digest of the body
+        return conditional_json({
             'status': 'success',
             'modules': formatted_modules
-        }), 200
+        })
 
     except Exception as e:
         return jsonify({
@@ -333,24 +1992,34 @@ def get_modules():
 @jwt_required()
 def get_module_details(module_id):
     try:
-        module = mongo.db.modules.find_one({'_id': ObjectId(module_id)})
+        # Revalidation only needs the version, not the document body
+        if request.if_none_match:
+            module = modules_store().find_one({'_id': ObjectId(module_id)}, {'version': 1})
+            if not module:
+                return jsonify({'status': 'error', 'message': 'Module not found'}), 404
+            etag = module_etag(module_id, module.get('version', 0))
+            if request.if_none_match.contains_weak(etag):
+                return conditional_json({}, etag)
+
+        module = modules_store().find_one({'_id': ObjectId(module_id)}, MODULE_DETAIL_FIELDS)
         
         if not module:
             return jsonify({'status': 'error', 'message': 'Module not found'}), 404
         
-        return jsonify({
+        return conditional_json({
             'status': 'success',
             'module': {
-                'id': str(module['_id']),
+                'id': module['_id'],
                 'title': module['title'],
                 'reading_document': module['reading_document'],
                 'videos': module['videos'],
                 'mcq_assignment': module['mcq_assignment'],
                 'reading_time': module.get('reading_time', 5),
                 'videos_time': module.get('videos_time', 5),
-                'assignment_time': module.get('assignment_time', 10)
+                'assignment_time': module.get('assignment_time', 10),
+                'version': module.get('version', 0)
             }
-        }), 200
+        }, module_etag(module_id, module.get('version', 0)))
 
     except Exception as e:
         return jsonify({
@@ -358,20 +2027,64 @@ def get_module_details(module_id):
             'message': f'Module details retrieval failed: {str(e)}'
         }), 500
 
+@app.route('/api/modules/<module_id>', methods=['PUT'])
+@jwt_required()
+def update_module(module_id):
+    try:
+        if current_user_role() != 'Admin':
+            return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+
+        data = request.get_json()
+        updates = {
+            field: data[field]
+            for field in ('title', 'reading_document', 'videos', 'reading_time', 'videos_time', 'assignment_time')
+            if field in data
+        }
+
+        if 'mcq_assignment' in data:
+            try:
+                updates.update(compile_quiz_fields(data['mcq_assignment']))
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': f'Invalid MCQ assignment: {str(e)}'}), 400
+
+        if not updates:
+            return jsonify({'status': 'error', 'message': 'No fields to update'}), 400
+
+        updates['updated_at'] = datetime.utcnow()
+        result = modules_store().update_one(
+            {'_id': ObjectId(module_id)},
+            {'$set': updates, '$inc': {'version': 1}}
+        )
+        if result.matched_count == 0:
+            return jsonify({'status': 'error', 'message': 'Module not found'}), 404
+
+        if module_index is not None and ('title' in updates or 'reading_document' in updates):
+            reindex_modules([modules_store().find_one(
+                {'_id': ObjectId(module_id)}, {'title': 1, 'reading_document': 1, 'updated_at': 1}
+            )])
+
+        return jsonify({
+            'status': 'success',
+            'message': 'Module updated successfully'
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Module update failed: {str(e)}'
+        }), 500
+
 @app.route('/api/modules/<module_id>/progress', methods=['GET'])
 @jwt_required()
 def get_module_progress(module_id):
     try:
         user_id = get_jwt_identity()
-        module = mongo.db.modules.find_one({'_id': ObjectId(module_id)})
+        module = modules_store().find_one({'_id': ObjectId(module_id)}, {'_id': 1})
         
         if not module:
             return jsonify({'status': 'error', 'message': 'Module not found'}), 404
         
-        user_progress = next((
-            prog for prog in module.get('trainees_progress', []) 
-            if prog['user_id'] == user_id
-        ), None)
+        user_progress = find_progress(module_id, user_id)
         
         progress = {
             'reading': user_progress.get('reading_completed', False) if user_progress else False,
@@ -402,37 +2115,13 @@ def complete_section(module_id):
             return jsonify({'status': 'error', 'message': 'Invalid section'}), 400
         
         # Check if module exists
-        module = mongo.db.modules.find_one({'_id': ObjectId(module_id)})
+        module = modules_store().find_one({'_id': ObjectId(module_id)}, {'_id': 1})
         if not module:
             return jsonify({'status': 'error', 'message': 'Module not found'}), 404
         
-        # Find or create user progress
-        user_progress = next((
-            prog for prog in module.get('trainees_progress', []) 
-            if prog['user_id'] == user_id
-        ), None)
-        
+        # Create or update the user's progress record in one atomic upsert
         update_field = f"{section}_completed"
-        
-        if user_progress:
-            # Update existing progress
-            mongo.db.modules.update_one(
-                {'_id': ObjectId(module_id), 'trainees_progress.user_id': user_id},
-                {'$set': {f'trainees_progress.$.{update_field}': True}}
-            )
-        else:
-            # Create new progress entry
-            new_progress = {
-                'user_id': user_id,
-                'reading_completed': section == 'reading',
-                'videos_completed': section == 'videos',
-                'assignment_completed': section == 'assignment',
-                'attempts': []
-            }
-            mongo.db.modules.update_one(
-                {'_id': ObjectId(module_id)},
-                {'$push': {'trainees_progress': new_progress}}
-            )
+        upsert_progress(module_id, user_id, {'$set': {update_field: True}})
         
         return jsonify({
             'status': 'success',
@@ -453,63 +2142,58 @@ def submit_assignment(module_id):
         data = request.get_json()
         user_answers = data.get('answers', [])
 
-        # Retrieve module details
-        module = mongo.db.modules.find_one({'_id': ObjectId(module_id)})
-        if not module:
+        # Grade against the compiled answer key
+        answer_key = get_answer_key(module_id)
+        if answer_key is None:
             return jsonify({'status': 'error', 'message': 'Module not found'}), 404
-
-        # Parse MCQ assignment JSON
-        mcq_assignment = json.loads(module.get('mcq_assignment', '{}'))
-        if not mcq_assignment or 'quiz' not in mcq_assignment:
+        if not answer_key:
             return jsonify({'status': 'error', 'message': 'MCQ assignment not available'}), 400
 
-        questions = mcq_assignment['quiz']
-        correct_count = sum(1 for i, q in enumerate(questions) 
-                          if i < len(user_answers) and user_answers[i] == q['answer'])
-        total_questions = len(questions)
-        score_percentage = (correct_count / total_questions) * 100 if total_questions > 0 else 0
-        passed = score_percentage >= 70
-
-        # Find user progress
-        user_progress = next((
-            prog for prog in module.get('trainees_progress', []) 
-            if prog['user_id'] == user_id
-        ), None)
-        
+        score_percentage, passed, missed = grade_answers(answer_key, user_answers)
+
         attempt = {
             'timestamp': datetime.utcnow(),
             'score': score_percentage,
             'passed': passed
         }
         
-        if user_progress:
-            # Update existing progress with new attempt
-            mongo.db.modules.update_one(
-                {'_id': ObjectId(module_id), 'trainees_progress.user_id': user_id},
-                {
-                    '$push': {'trainees_progress.$.attempts': attempt},
-                    '$set': {
-                        'trainees_progress.$.assignment_completed': True,
-                        'trainees_progress.$.last_score': score_percentage,
-                        'trainees_progress.$.passed': passed
-                    }
+        # Record the attempt atomically, keeping only the newest few on the progress
+        # record; the previous state drives the leaderboard and analytics deltas
+        previous_progress = upsert_progress(
+            module_id,
+            user_id,
+            {
+                '$push': {'attempts': {'$each': [attempt], '$slice': -RECENT_ATTEMPTS}},
+                '$inc': {'attempt_count': 1},
+                '$max': {'best_score': score_percentage},
+                '$set': {
+                    'assignment_completed': True,
+                    'last_score': score_percentage,
+                    'passed': passed,
+                    'last_attempt_at': attempt['timestamp']
                 }
-            )
+            },
+            return_document=ReturnDocument.BEFORE
+        ) or {}
+
+        update_leaderboard(user_id, previous_progress, {'passed': passed, 'last_score': score_percentage})
+
+        if previous_progress.get('attempts') and 'attempt_count' not in previous_progress:
+            # First submission since bucketing on a record rebuild-analytics has not migrated
+            attempt_number = bucket_legacy_progress(previous_progress) + 1
         else:
-            # Create new progress entry
-            new_progress = {
-                'user_id': user_id,
-                'reading_completed': False,
-                'videos_completed': False,
-                'assignment_completed': True,
-                'last_score': score_percentage,
-                'passed': passed,
-                'attempts': [attempt]
-            }
-            mongo.db.modules.update_one(
-                {'_id': ObjectId(module_id)},
-                {'$push': {'trainees_progress': new_progress}}
-            )
+            attempt_number = previous_progress.get('attempt_count', 0) + 1
+        first_pass = False
+        if passed and not previous_progress.get('first_pass_attempt'):
+            # Conditional so concurrent submissions count the first pass only once
+            first_pass = progress_store().update_one(
+                {'module_id': module_id, 'user_id': user_id, 'first_pass_attempt': {'$exists': False}},
+                {'$set': {'first_pass_attempt': attempt_number}}
+            ).modified_count == 1
+
+        attempt['missed'] = missed
+        record_attempt(module_id, user_id, attempt)
+        update_module_analytics(module_id, attempt, attempt_number, first_pass, len(answer_key))
         
         return jsonify({
             'status': 'success',
@@ -520,60 +2204,136 @@ def submit_assignment(module_id):
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def parse_bool_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+def parse_float_arg(name):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a number')
+
+def parse_int_arg(name, default):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a whole number')
+
+def parse_object_id_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    if not ObjectId.is_valid(value):
+        raise ValueError(f'{name} must be an id')
+    return ObjectId(value)
+
+def format_trainee_modules(trainee_id, modules, progress_by_key, completed=None, min_score=None, max_score=None):
+    formatted_modules = []
+    for module in modules:
+        module_progress = progress_by_key.get((trainee_id, str(module['_id'])), {})
+        entry = {
+            'module_id': module['_id'],
+            'module_title': module['title'],
+            'attempts': module_progress.get('attempts', []),
+            'attempt_count': module_progress.get('attempt_count', len(module_progress.get('attempts', []))),
+            # Until rebuild-analytics backfills it, the best of the recent attempts
+            'best_score': module_progress.get('best_score', max(
+                (attempt['score'] for attempt in module_progress.get('attempts', [])), default=None
+            )),
+            'completed': module_progress.get('assignment_completed', False),
+            'last_score': module_progress.get('last_score', 0)
+        }
+        if completed is not None and entry['completed'] != completed:
+            continue
+        if min_score is not None and entry['last_score'] < min_score:
+            continue
+        if max_score is not None and entry['last_score'] > max_score:
+            continue
+        formatted_modules.append(entry)
+    return formatted_modules
+
 @app.route('/api/trainees', methods=['GET'])
 @jwt_required()
 def get_trainees():
     try:
         # Verify user is admin
-        current_user = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user)})
-        if user['role'] != 'Admin':
+        if current_user_role() != 'Admin':
             return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
-        
-        # Get all modules with trainee progress
-        modules = list(mongo.db.modules.find())
-        
-        # Get all trainees
-        trainees = list(mongo.db.users.find({'role': 'Trainee'}))
-        
-        # Format trainee data with module progress
+
+        # Keyset pagination and server-side filters
+        try:
+            after = parse_object_id_arg('after')
+            limit = min(max(parse_int_arg('limit', TRAINEES_PAGE_SIZE), 1), TRAINEES_MAX_PAGE_SIZE)
+            module_object_id = parse_object_id_arg('module_id')
+            min_score = parse_float_arg('min_score')
+            max_score = parse_float_arg('max_score')
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        module_filter = str(module_object_id) if module_object_id else None
+        completed = parse_bool_arg('completed')
+        filtering = completed is not None or min_score is not None or max_score is not None
+
+        module_query = {'_id': module_object_id} if module_object_id else {}
+        modules = list(modules_store().find(module_query, {'title': 1}).sort('_id', 1))
+
+        trainee_query = {'role': 'Trainee'}
+        if after:
+            trainee_query['_id'] = {'$gt': after}
+
+        # Scan trainees in _id order, one batch at a time, until the page is full.
+        # Each batch is joined against its progress records in a single hash pass.
         formatted_trainees = []
-        for trainee in trainees:
-            trainee_data = {
-                '_id': str(trainee['_id']),
-                'name': trainee['name'],
-                'email': trainee['email'],
-                'modules': []
-            }
-            
-            for module in modules:
-                module_progress = next((
-                    prog for prog in module.get('trainees_progress', []) 
-                    if prog['user_id'] == str(trainee['_id'])
-                ), None)
-                
-                if module_progress:
-                    trainee_data['modules'].append({
-                        'module_id': str(module['_id']),
-                        'module_title': module['title'],
-                        'attempts': module_progress.get('attempts', []),
-                        'completed': module_progress.get('assignment_completed', False),
-                        'last_score': module_progress.get('last_score', 0)
-                    })
-                else:
-                    trainee_data['modules'].append({
-                        'module_id': str(module['_id']),
-                        'module_title': module['title'],
-                        'attempts': [],
-                        'completed': False,
-                        'last_score': 0
-                    })
-            
-            formatted_trainees.append(trainee_data)
-        
+        last_scanned = None
+        has_more = False
+        while len(formatted_trainees) < limit:
+            batch = list(users_store().find(
+                trainee_query, {'name': 1, 'email': 1}
+            ).sort('_id', 1).limit(limit))
+
+            batch_ids = [str(trainee['_id']) for trainee in batch]
+            progress_query = {'user_id': {'$in': batch_ids}}
+            if module_filter:
+                progress_query['module_id'] = module_filter
+            progress_by_key = {
+                (prog['user_id'], prog['module_id']): prog
+                for prog in progress_store().find(progress_query)
+            } if batch else {}
+
+            for position, trainee in enumerate(batch):
+                last_scanned = trainee['_id']
+                trainee_id = str(trainee['_id'])
+                trainee_modules = format_trainee_modules(
+                    trainee_id, modules, progress_by_key, completed, min_score, max_score
+                )
+                if filtering and not trainee_modules:
+                    continue
+                formatted_trainees.append({
+                    '_id': trainee_id,
+                    'name': trainee['name'],
+                    'email': trainee['email'],
+                    'modules': trainee_modules
+                })
+                if len(formatted_trainees) == limit:
+                    has_more = position < len(batch) - 1 or len(batch) == limit
+                    break
+
+            if len(batch) < limit:
+                break
+            trainee_query['_id'] = {'$gt': last_scanned}
+
         return jsonify({
             'status': 'success',
-            'trainees': formatted_trainees
+            'trainees': formatted_trainees,
+            'next_after': str(last_scanned) if has_more else None
         }), 200
 
     except Exception as e:
@@ -587,38 +2347,36 @@ def get_trainees():
 def get_leaderboard():
     try:
         # Verify user is admin
-        current_user = get_jwt_identity()
-        user = mongo.db.users.find_one({'_id': ObjectId(current_user)})
-        if user['role'] != 'Admin':
+        if current_user_role() != 'Admin':
             return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
         
-        # Aggregate progress across all modules
-        leaderboard_pipeline = [
-            {'$unwind': '$trainees_progress'},
-            {'$match': {'trainees_progress.passed': True}},
-            {'$group': {
-                '_id': '$trainees_progress.user_id',
-                'total_score': {'$avg': '$trainees_progress.last_score'},
-                'modules_completed': {'$sum': 1}
-            }},
-            {'$sort': {'total_score': -1, 'modules_completed': -1}},
-            {'$limit': 10},
-            {'$lookup': {
-                'from': 'users',
-                'localField': '_id',
-                'foreignField': '_id',
-                'as': 'user'
-            }},
-            {'$unwind': '$user'},
-            {'$project': {
-                '_id': 1,
-                'name': '$user.name',
-                'score': {'$round': ['$total_score', 2]},
+        limit = min(max(int(request.args.get('limit', 10)), 1), LEADERBOARD_MAX_LIMIT)
+        module_id = request.args.get('module_id')
+
+        if module_id:
+            # Per-module ranking straight off the (module_id, passed, last_score) index
+            top_progress = list(progress_store().find(
+                {'module_id': module_id, 'passed': True},
+                {'user_id': 1, 'last_score': 1}
+            ).sort('last_score', -1).limit(limit))
+            names = user_names([prog['user_id'] for prog in top_progress])
+            leaderboard = [{
+                '_id': prog['user_id'],
+                'name': names.get(prog['user_id'], ''),
+                'score': round(prog['last_score'], 2),
                 'modules_completed': 1
-            }}
-        ]
-        
-        leaderboard = list(mongo.db.modules.aggregate(leaderboard_pipeline))
+            } for prog in top_progress]
+        else:
+            top_entries = leaderboard_store().find(
+                {'modules_completed': {'$gt': 0}},
+                {'name': 1, 'score': 1, 'modules_completed': 1}
+            ).sort([('score', -1), ('modules_completed', -1)]).limit(limit)
+            leaderboard = [{
+                '_id': entry['_id'],
+                'name': entry.get('name', ''),
+                'score': round(entry['score'], 2),
+                'modules_completed': entry['modules_completed']
+            } for entry in top_entries]
         
         return jsonify({
             'status': 'success',
@@ -631,6 +2389,410 @@ def get_leaderboard():
             'message': f'Leaderboard retrieval failed: {str(e)}'
         }), 500
 
+@app.route('/api/analytics/modules', methods=['GET'])
+@jwt_required()
+def get_module_analytics():
+    try:
+        if current_user_role() != 'Admin':
+            return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+
+        # Precomputed rollups: one read per module, independent of attempt volume
+        module_id = request.args.get('module_id')
+        module_query = {'_id': ObjectId(module_id)} if module_id else {}
+        modules = list(modules_store().find(module_query, {'title': 1}).sort('_id', 1))
+        if module_id and not modules:
+            return jsonify({'status': 'error', 'message': 'Module not found'}), 404
+
+        module_ids = [str(module['_id']) for module in modules]
+        rollups = {rollup['_id']: rollup for rollup in analytics_store().find({'_id': {'$in': module_ids}})}
+        analytics = [
+            format_module_analytics(rollups.get(str(module['_id']), {'_id': str(module['_id'])}), module['title'])
+            for module in modules
+        ]
+        overall = format_module_analytics(merge_analytics(rollups.values()))
+        del overall['module_id'], overall['module_title']
+
+        return jsonify({
+            'status': 'success',
+            'overall': overall,
+            'modules': analytics
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Analytics retrieval failed: {str(e)}'
+        }), 500
+
+def encode_export_cursor(document_id, index=None):
+    raw = json.dumps([str(document_id), index]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_export_cursor(token):
+    try:
+        document_id, index = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return ObjectId(document_id), index
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO 8601 date')
+
+def iter_with_users(cursor):
+    # Batches the cursor so each batch's users are fetched with a single query
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield from pair_with_users(batch)
+            batch = []
+    yield from pair_with_users(batch)
+
+def pair_with_users(batch):
+    if not batch:
+        return
+    user_ids = {document['user_id'] for document in batch if ObjectId.is_valid(document['user_id'])}
+    users = {str(user['_id']): user for user in users_store().find(
+        {'_id': {'$in': [ObjectId(user_id) for user_id in user_ids]}}, {'name': 1, 'email': 1}
+    )}
+    for document in batch:
+        yield document, users.get(document['user_id'], {})
+
+def export_progress_rows(filters, after, module_titles):
+    query = dict(filters['base'])
+    if filters['passed'] is not None:
+        query['passed'] = filters['passed']
+    if filters['range']:
+        query['last_attempt_at'] = filters['range']
+    if after:
+        query['_id'] = {'$gt': after[0]}
+
+    cursor = progress_store().find(query).sort('_id', 1).batch_size(EXPORT_BATCH_SIZE)
+    for prog, user in iter_with_users(cursor):
+        yield {
+            'cursor': encode_export_cursor(prog['_id']),
+            'user_id': prog['user_id'],
+            'name': user.get('name'),
+            'email': user.get('email'),
+            'module_id': prog['module_id'],
+            'module_title': module_titles.get(prog['module_id']),
+            'reading_completed': prog.get('reading_completed', False),
+            'videos_completed': prog.get('videos_completed', False),
+            'assignment_completed': prog.get('assignment_completed', False),
+            'attempt_count': prog.get('attempt_count', len(prog.get('attempts', []))),
+            'last_score': prog.get('last_score'),
+            'best_score': prog.get('best_score'),
+            'passed': prog.get('passed', False),
+            'first_pass_attempt': prog.get('first_pass_attempt'),
+            'last_attempt_at': prog.get('last_attempt_at')
+        }
+
+def export_attempt_rows(filters, after, module_titles):
+    query = dict(filters['base'])
+    date_range = filters['range']
+    if date_range:
+        # Buckets overlapping the range; attempts are filtered individually below
+        if '$gte' in date_range:
+            query['last_at'] = {'$gte': date_range['$gte']}
+        if '$lt' in date_range:
+            query['first_at'] = {'$lt': date_range['$lt']}
+    if after:
+        query['_id'] = {'$gte': after[0]}
+
+    cursor = attempt_store().find(query).sort('_id', 1).batch_size(EXPORT_BATCH_SIZE)
+    for bucket, user in iter_with_users(cursor):
+        for index, attempt in enumerate(bucket['attempts']):
+            if after and bucket['_id'] == after[0] and index <= (after[1] or 0):
+                continue
+            if filters['passed'] is not None and attempt['passed'] != filters['passed']:
+                continue
+            timestamp = attempt['timestamp']
+            if ('$gte' in date_range and timestamp < date_range['$gte']) or \
+                    ('$lt' in date_range and timestamp >= date_range['$lt']):
+                continue
+            yield {
+                'cursor': encode_export_cursor(bucket['_id'], index),
+                'user_id': bucket['user_id'],
+                'name': user.get('name'),
+                'email': user.get('email'),
+                'module_id': bucket['module_id'],
+                'module_title': module_titles.get(bucket['module_id']),
+                'timestamp': attempt['timestamp'],
+                'score': attempt['score'],
+                'passed': attempt['passed'],
+                'missed_questions': attempt.get('missed', [])
+            }
+
+@app.route('/api/export/<kind>', methods=['GET'])
+@jwt_required()
+def export_records(kind):
+    try:
+        if current_user_role() != 'Admin':
+            return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+        if kind not in EXPORT_COLUMNS:
+            return jsonify({'status': 'error', 'message': 'Export must be progress or attempts'}), 404
+
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in ('ndjson', 'csv'):
+            return jsonify({'status': 'error', 'message': 'Format must be ndjson or csv'}), 400
+
+        module_id = request.args.get('module_id')
+        date_range = {}
+        start, end = parse_date_arg('from'), parse_date_arg('to')
+        if start:
+            date_range['$gte'] = start
+        if end:
+            date_range['$lt'] = end
+        filters = {
+            'base': {'module_id': module_id} if module_id else {},
+            'passed': parse_bool_arg('passed'),
+            'range': date_range
+        }
+        after = decode_export_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        module_titles = {str(module['_id']): module['title'] for module in modules_store().find({}, {'title': 1})}
+
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Export failed: {str(e)}'
+        }), 500
+
+    export_rows = export_progress_rows if kind == 'progress' else export_attempt_rows
+    columns = EXPORT_COLUMNS[kind]
+
+    def generate():
+        if fmt == 'csv':
+            yield encode_csv_row(columns)
+        for row in export_rows(filters, after, module_titles):
+            if fmt == 'csv':
+                yield encode_csv_row([row[column] for column in columns])
+            else:
+                yield app.json.dumps(row) + '\n'
+
+    filename = f'{kind}-{datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")}.{fmt}'
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.cli.command('migrate-progress')
+@click.option('--batch-size', default=500, show_default=True, help='Progress records per bulk write.')
+@click.option('--cleanup', is_flag=True, help='Remove the embedded trainees_progress arrays once copied.')
+def migrate_progress(batch_size, cleanup):
+    """Copy embedded module.trainees_progress entries into the progress collection.
+
+    Safe to run while the API is serving and safe to re-run: completion flags are
+    merged with $max, attempts with $addToSet, and newer scores written by the
+    API since the switch are never overwritten.
+    """
+    collection = progress_store()
+    migrated_modules = 0
+    migrated_entries = 0
+    for module in modules_store().find({'trainees_progress.0': {'$exists': True}}, {'trainees_progress': 1}):
+        module_id = str(module['_id'])
+        operations = []
+        for prog in module['trainees_progress']:
+            operations.append(UpdateOne(
+                {'module_id': module_id, 'user_id': prog['user_id']},
+                {
+                    '$max': {
+                        'reading_completed': prog.get('reading_completed', False),
+                        'videos_completed': prog.get('videos_completed', False),
+                        'assignment_completed': prog.get('assignment_completed', False)
+                    },
+                    '$addToSet': {'attempts': {'$each': prog.get('attempts', [])}},
+                    '$setOnInsert': {
+                        'last_score': prog.get('last_score', 0),
+                        'passed': prog.get('passed', False)
+                    }
+                },
+                upsert=True
+            ))
+        for start in range(0, len(operations), batch_size):
+            collection.bulk_write(operations[start:start + batch_size], ordered=False)
+
+        if cleanup:
+            modules_store().update_one({'_id': module['_id']}, {'$unset': {'trainees_progress': ''}})
+        migrated_modules += 1
+        migrated_entries += len(operations)
+
+    click.echo(f'Migrated {migrated_entries} progress entries from {migrated_modules} modules')
+
+@app.cli.command('rebuild-leaderboard')
+@click.option('--check', is_flag=True, help='Only report drift between the materialized and recomputed leaderboard.')
+def rebuild_leaderboard(check):
+    """Recompute the materialized leaderboard from the progress collection."""
+    expected = compute_leaderboard()
+    collection = leaderboard_store()
+
+    if check:
+        current = {entry['_id']: entry for entry in collection.find({'modules_completed': {'$gt': 0}})}
+        drift = []
+        for user_id in set(expected) | set(current):
+            want = expected.get(user_id, {'total_score': 0, 'modules_completed': 0})
+            have = current.get(user_id, {'total_score': 0, 'modules_completed': 0})
+            if (want['modules_completed'] != have['modules_completed']
+                    or abs(want['total_score'] - have['total_score']) > 1e-6):
+                drift.append(user_id)
+                click.echo(f'{user_id}: expected {want["total_score"]}/{want["modules_completed"]}, '
+                           f'found {have["total_score"]}/{have["modules_completed"]}')
+        click.echo(f'{len(drift)} leaderboard entries out of sync')
+        if drift:
+            raise SystemExit(1)
+        return
+
+    names = user_names(list(expected))
+    operations = [
+        UpdateOne(
+            {'_id': user_id},
+            {'$set': {
+                'name': names.get(user_id, ''),
+                'total_score': row['total_score'],
+                'modules_completed': row['modules_completed'],
+                'score': row['total_score'] / row['modules_completed'],
+                'updated_at': datetime.utcnow()
+            }},
+            upsert=True
+        )
+        for user_id, row in expected.items()
+    ]
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    removed = collection.delete_many({'_id': {'$nin': list(expected)}}).deleted_count
+    click.echo(f'Rebuilt {len(operations)} leaderboard entries, removed {removed} stale entries')
+
+@app.cli.command('rebuild-analytics')
+@click.option('--batch-size', default=500, show_default=True, help='Progress records per bulk write.')
+def rebuild_analytics(batch_size):
+    """Move unbounded progress attempt arrays into buckets and recompute the analytics rollups.
+
+    Progress records without an attempt_count predate bucketing: their attempts
+    are copied into deterministic buckets (so re-running is safe), trimmed to
+    the most recent RECENT_ATTEMPTS, and given attempt_count/first_pass_attempt.
+    A submission on such a record before this runs buckets it the same way.
+    Records missing best_score get it from their buckets.
+    """
+    buckets = attempt_store()
+    collection = progress_store()
+    bucket_ops, progress_ops, migrated = [], [], 0
+
+    def flush():
+        if bucket_ops:
+            buckets.bulk_write(bucket_ops, ordered=False)
+        if progress_ops:
+            collection.bulk_write(progress_ops, ordered=False)
+        bucket_ops.clear()
+        progress_ops.clear()
+
+    for prog in collection.find({'attempt_count': {'$exists': False}}, {'module_id': 1, 'user_id': 1, 'attempts': 1}):
+        attempts = sorted(prog.get('attempts', []), key=lambda attempt: attempt['timestamp'])
+        bucket_ops += legacy_bucket_operations(prog, attempts)
+
+        update = {'attempt_count': len(attempts), 'attempts': attempts[-RECENT_ATTEMPTS:]}
+        if attempts:
+            update['last_attempt_at'] = attempts[-1]['timestamp']
+            update['best_score'] = max(attempt['score'] for attempt in attempts)
+        first_pass = legacy_first_pass(attempts)
+        if first_pass:
+            update['first_pass_attempt'] = first_pass
+        # A submission since the read has already bucketed this record on first touch
+        progress_ops.append(UpdateOne({'_id': prog['_id'], 'attempt_count': {'$exists': False}}, {'$set': update}))
+        migrated += 1
+        if len(progress_ops) >= batch_size:
+            flush()
+    flush()
+
+    # Records bucketed before best_score was kept get it from their buckets
+    backfilled = 0
+    for prog in collection.find({'attempt_count': {'$gt': 0}, 'best_score': {'$exists': False}},
+                                {'module_id': 1, 'user_id': 1}):
+        scores = [
+            attempt['score']
+            for bucket in buckets.find({'user_id': prog['user_id'], 'module_id': prog['module_id']}, {'attempts.score': 1})
+            for attempt in bucket['attempts']
+        ]
+        if scores:
+            progress_ops.append(UpdateOne({'_id': prog['_id']}, {'$max': {'best_score': max(scores)}}))
+            backfilled += 1
+        if len(progress_ops) >= batch_size:
+            flush()
+    flush()
+
+    rollups = compute_module_analytics()
+    if rollups:
+        analytics_store().bulk_write(
+            [ReplaceOne({'_id': rollup['_id']}, rollup, upsert=True) for rollup in rollups],
+            ordered=False
+        )
+    removed = analytics_store().delete_many({'_id': {'$nin': [rollup['_id'] for rollup in rollups]}}).deleted_count
+    click.echo(f'Bucketed attempts for {migrated} progress records, backfilled {backfilled} best scores, '
+               f'rebuilt {len(rollups)} module rollups, removed {removed} stale rollups')
+
+@app.cli.command('ensure-indexes')
+def ensure_indexes_command():
+    """Create every index in INDEXES; safe to run on each deploy."""
+    failed = False
+    for collection, (created, error) in ensure_indexes(mongo.db, INDEXES).items():
+        if error:
+            failed = True
+            click.echo(f'{collection}: FAILED ({error})')
+        else:
+            click.echo(f'{collection}: {", ".join(created)}')
+    if failed:
+        raise SystemExit(1)
+
+def hot_queries():
+    # Representative shapes of the queries on request paths, with placeholder values
+    some_id = str(ObjectId())
+    return [
+        ('login', 'users', {'email': 'trainee@example.com'}, None),
+        ('trainees page', 'users', {'role': 'Trainee', '_id': {'$gt': ObjectId()}}, [('_id', 1)]),
+        ('progress lookup', 'progress', {'module_id': some_id, 'user_id': some_id}, None),
+        ('trainee progress batch', 'progress', {'user_id': {'$in': [some_id]}}, None),
+        ('module leaderboard', 'progress', {'module_id': some_id, 'passed': True}, [('last_score', -1)]),
+        ('leaderboard', 'leaderboard', {'modules_completed': {'$gt': 0}}, [('score', -1), ('modules_completed', -1)]),
+        ('open attempt bucket', 'attempt_buckets',
+         {'user_id': some_id, 'module_id': some_id, 'period': '2025-01', 'count': {'$lt': ATTEMPT_BUCKET_SIZE}}, None),
+        ('job claim', 'jobs', job_runner.due_query(datetime.utcnow()), job_runner.claim_sort),
+        ('module import dedupe', 'modules', {'title': {'$in': ['Fire Safety Basics']}}, None),
+        ('retrieval refresh', 'modules', {'updated_at': {'$gte': datetime.utcnow()}}, None),
+        ('chat sessions', 'chat_sessions', {'user_id': some_id}, [('updated_at', -1)])
+    ]
+
+@app.cli.command('check-indexes')
+def check_indexes():
+    """Explain the hot queries and fail if any of them falls back to a collection scan."""
+    scans = []
+    for name, collection, query, sort in hot_queries():
+        stages = explain_query(mongo.db[collection], query, sort)
+        if 'COLLSCAN' in stages:
+            scans.append(name)
+        click.echo(f'{name:<24} {collection:<16} {" <- ".join(stages)}')
+    if scans:
+        click.echo(f'Collection scans: {", ".join(scans)}')
+        raise SystemExit(1)
+
+@app.cli.command('run-jobs')
+@click.option('--workers', default=2, show_default=True, help='Concurrent jobs to run.')
+@click.option('--once', is_flag=True, help='Process the jobs that are due now and exit.')
+def run_jobs(workers, once):
+    """Run a local worker for queued background jobs."""
+    if once:
+        click.echo(f'Processed {job_runner.run_pending()} jobs')
+        return
+    click.echo(f'Processing jobs with {workers} workers, press Ctrl+C to stop')
+    job_runner.serve(workers)
+
 if __name__ == '__main__':
+    job_runner.start()
     port = int(os.getenv("PORT", 5000))  # Render assigns a dynamic port
     app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_DEBUG', False))
\ No newline at end of file
@@ -0,0 +1,176 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import bson
+from pymongo import monitoring
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_local = threading.local()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """In-process counters and histograms rendered in the Prometheus text exposition format."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def describe(self, name, kind, help_text):
+        self._meta[name] = (kind, help_text)
+
+    def inc(self, name, labels=None, amount=1):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def add_collector(self, collector):
+        # Collectors return (name, labels, value) gauge samples computed at scrape time
+        self._collectors.append(collector)
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: dict(value, buckets=list(value['buckets'])) for key, value in self._histograms.items()}
+
+        samples = {}
+        for (name, labels), value in counters.items():
+            samples.setdefault(name, []).append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for (name, labels), histogram in histograms.items():
+            lines = samples.setdefault(name, [])
+            for bound, count in zip(self.buckets, histogram['buckets']):
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", _format_value(bound)),))} {count}')
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {histogram["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(histogram["sum"])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                samples.setdefault(name, []).append(
+                    f'{name}{_format_labels(tuple(sorted(labels.items())))} {_format_value(value)}'
+                )
+
+        output = []
+        for name in sorted(samples):
+            kind, help_text = self._meta.get(name, ('untyped', ''))
+            if help_text:
+                output.append(f'# HELP {name} {help_text}')
+            output.append(f'# TYPE {name} {kind}')
+            output.extend(samples[name])
+        return '\n'.join(output) + '\n'
+
+
+def begin_request():
+    _local.breakdown = {'db': 0.0, 'db_ops': 0, 'llm': 0.0, 'serialization': 0.0}
+    return _local.breakdown
+
+
+def end_request():
+    breakdown = getattr(_local, 'breakdown', None)
+    _local.breakdown = None
+    return breakdown
+
+
+def record(component, seconds):
+    breakdown = getattr(_local, 'breakdown', None)
+    if breakdown is not None:
+        breakdown[component] = breakdown.get(component, 0.0) + seconds
+
+
+@contextmanager
+def timed(component):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(component, time.perf_counter() - started)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Feeds per-collection Mongo op counts and durations into a registry.
+
+    With `measure_sizes` reply sizes are counted too. That re-encodes every
+    reply to BSON on the request thread, so it is off unless asked for.
+    """
+
+    def __init__(self, registry, measure_sizes=False):
+        self.registry = registry
+        self.measure_sizes = measure_sizes
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = 'admin' if event.command_name != 'getMore' else event.command.get('collection', 'unknown')
+        with self._lock:
+            self._collections[(event.request_id, event.connection_id)] = collection
+
+    def _finish(self, event, outcome):
+        with self._lock:
+            collection = self._collections.pop((event.request_id, event.connection_id), 'unknown')
+        seconds = event.duration_micros / 1e6
+        labels = {'collection': collection, 'command': event.command_name}
+        self.registry.inc('mongo_commands_total', dict(labels, outcome=outcome))
+        self.registry.observe('mongo_command_duration_seconds', seconds, labels)
+        breakdown = getattr(_local, 'breakdown', None)
+        if breakdown is not None:
+            breakdown['db'] += seconds
+            breakdown['db_ops'] += 1
+        return labels
+
+    def succeeded(self, event):
+        labels = self._finish(event, 'success')
+        if self.measure_sizes:
+            self.registry.inc('mongo_reply_bytes_total', labels, len(bson.encode(event.reply)))
+
+    def failed(self, event):
+        self._finish(event, 'failure')
+
+
+def describe_defaults(registry):
+    registry.describe('http_requests_total', 'counter', 'HTTP requests by route and status.')
+    registry.describe('http_request_duration_seconds', 'histogram', 'Time spent in the request handler.')
+    registry.describe('http_request_component_seconds_total', 'counter', 'Request time split into db, llm and serialization.')
+    registry.describe('mongo_commands_total', 'counter', 'Mongo commands by collection, command and outcome.')
+    registry.describe('mongo_command_duration_seconds', 'histogram', 'Mongo command round-trip time.')
+    registry.describe('mongo_reply_bytes_total', 'counter', 'BSON bytes returned by Mongo commands (METRICS_MONGO_SIZES=1).')
+    registry.describe('llm_calls_total', 'counter', 'Gemini calls by kind and outcome.')
+    registry.describe('llm_call_duration_seconds', 'histogram', 'Gemini call latency.')
+    registry.describe('llm_tokens_total', 'counter', 'Gemini tokens by kind and direction.')
+    registry.describe('chat_answers_total', 'counter', 'Chat answers by source (cache, modules or llm).')
+    registry.describe('chat_session_prompt_tokens_total', 'counter', 'Estimated prompt tokens sent for chat session messages.')
+    registry.describe('chat_session_compactions_total', 'counter', 'Chat session histories folded into a summary, by method.')
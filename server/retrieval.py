@@ -0,0 +1,220 @@
+import math
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+HEADING_PATTERN = re.compile(r'^\s*(?:#{1,6}\s+(.+?)\s*#*|\*\*(.+?)\*\*:?)\s*$')
+
+STOPWORDS = frozenset('''
+a about above after all also an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers
+him his how i if in into is it its itself just me more most my no nor not now of off on once only or other
+our out over own same she should so some such than that the their them then there these they this those
+through to too under until up very was we were what when where which while who whom why will with would
+you your
+'''.split())
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords, with plural 's' folded so 'exits' matches 'exit'."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def split_sections(text, max_words=120):
+    """Split a reading document into (heading, text) sections.
+
+    Markdown headings (or **bold** lines) start a new section and blank lines
+    end a paragraph; paragraphs longer than `max_words` are cut into windows
+    so one long block cannot crowd the rest of the prompt out.
+    """
+    sections = []
+    heading, paragraph = None, []
+
+    def flush():
+        words = ' '.join(paragraph).split()
+        for start in range(0, len(words), max_words):
+            sections.append((heading, ' '.join(words[start:start + max_words])))
+        paragraph.clear()
+
+    for line in (text or '').splitlines():
+        match = HEADING_PATTERN.match(line)
+        if match:
+            flush()
+            heading = (match.group(1) or match.group(2)).strip()
+        elif line.strip():
+            paragraph.append(line.strip())
+        else:
+            flush()
+    flush()
+    return sections
+
+
+class ModuleIndex:
+    """In-memory BM25 index over module reading sections with incremental updates.
+
+    Each section occupies a slot; postings map a term to {slot: term frequency}.
+    Adding a module replaces its previous sections, and freed slots are reused.
+    Per-term weight arrays (idf and length normalisation folded in) are built
+    lazily with NumPy and dropped on any change, so a query is one vectorised
+    add per term into a score array plus k argmax passes. Terms in more than
+    1/DENSE_FRACTION of the sections keep a dense weight vector, because a
+    contiguous add is far cheaper than scattering into most of the array.
+    """
+
+    DENSE_FRACTION = 8
+
+    def __init__(self, k1=1.2, b=0.75, max_words=120):
+        self.k1 = k1
+        self.b = b
+        self.max_words = max_words
+        self.version = 0
+        self._lock = threading.Lock()
+        self._sections = []
+        self._terms = []
+        self._lengths = []
+        self._free = []
+        self._by_module = {}
+        self._postings = {}
+        self._weights = {}
+        self._norm = None
+        self._total_length = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add_module(self, module_id, title, text):
+        """Index (or re-index) a module's reading document; returns the number of sections."""
+        title = title or ''
+        prepared = []
+        for heading, body in split_sections(text, self.max_words):
+            # The title and heading are indexed with the body so 'evacuation' finds the Evacuation module
+            counts = Counter(tokenize(f'{title} {heading or ""} {body}'))
+            if counts:
+                prepared.append(({'module_id': module_id, 'module_title': title, 'heading': heading, 'text': body}, counts))
+
+        with self._lock:
+            self._remove(module_id)
+            slots = []
+            for section, counts in prepared:
+                slot = self._free.pop() if self._free else len(self._sections)
+                if slot == len(self._sections):
+                    self._sections.append(None)
+                    self._terms.append(None)
+                    self._lengths.append(0)
+                length = sum(counts.values())
+                self._sections[slot] = section
+                self._terms[slot] = counts
+                self._lengths[slot] = length
+                self._total_length += length
+                for term, tf in counts.items():
+                    self._postings.setdefault(term, {})[slot] = tf
+                slots.append(slot)
+            self._count += len(slots)
+            if slots:
+                self._by_module[module_id] = slots
+            self._changed()
+        return len(prepared)
+
+    def remove_module(self, module_id):
+        with self._lock:
+            self._remove(module_id)
+            self._changed()
+
+    def _remove(self, module_id):
+        for slot in self._by_module.pop(module_id, []):
+            for term in self._terms[slot]:
+                postings = self._postings[term]
+                del postings[slot]
+                if not postings:
+                    del self._postings[term]
+            self._total_length -= self._lengths[slot]
+            self._sections[slot] = self._terms[slot] = None
+            self._lengths[slot] = 0
+            self._free.append(slot)
+            self._count -= 1
+
+    def _changed(self):
+        # idf and the average length both move with any change, so every cached weight is stale
+        self._weights.clear()
+        self._norm = None
+        self.version += 1
+
+    def _term_weights(self, term, postings):
+        weights = self._weights.get(term)
+        if weights is None:
+            if self._norm is None:
+                lengths = np.asarray(self._lengths, dtype=np.float32)
+                average = self._total_length / self._count
+                self._norm = self.k1 * (1 - self.b + self.b * lengths / average)
+            slots = np.fromiter(postings.keys(), dtype=np.intp, count=len(postings))
+            tf = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            scores = self.idf(len(postings)) * tf * (self.k1 + 1) / (tf + self._norm[slots])
+            if len(postings) * self.DENSE_FRACTION >= self._count:
+                dense = np.zeros(len(self._lengths), dtype=np.float32)
+                dense[slots] = scores
+                weights = (None, dense)
+            else:
+                weights = (slots, scores)
+            self._weights[term] = weights
+        return weights
+
+    def idf(self, document_frequency):
+        return math.log(1 + (self._count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def search(self, query, k=3):
+        """Return up to k sections as dicts with `score` and `confidence` added, best first.
+
+        `confidence` is the score relative to a section of average length that
+        contains each indexed query term once, capped at 1, so it is comparable
+        across queries. `terms` is how many distinct query terms the index knows;
+        a single matched word is weak evidence however high its confidence.
+        """
+        with self._lock:
+            if not self._count:
+                return []
+            scores = np.zeros(len(self._lengths), dtype=np.float32)
+            ceiling, terms = 0.0, 0
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if postings:
+                    slots, weights = self._term_weights(term, postings)
+                    if slots is None:
+                        scores += weights
+                    else:
+                        scores[slots] += weights
+                    ceiling += self.idf(len(postings))
+                    terms += 1
+            if not terms:
+                return []
+
+            # k is a handful of sections, so repeated argmax beats sorting or partitioning
+            hits = []
+            for _ in range(min(k, len(scores))):
+                slot = int(scores.argmax())
+                score = float(scores[slot])
+                if score <= 0:
+                    break
+                hits.append(dict(self._sections[slot], score=score, confidence=min(1.0, score / ceiling), terms=terms))
+                scores[slot] = 0
+            return hits
+
+    def info(self):
+        with self._lock:
+            return {
+                'modules': len(self._by_module),
+                'sections': self._count,
+                'terms': len(self._postings),
+                'version': self.version
+            }
@@ -0,0 +1,138 @@
+"""Benchmark the chat retrieval index (retrieval.py) and check query latency against a budget.
+
+Builds a ModuleIndex over synthetic modules shaped like the stored reading
+documents (headed sections of a few hundred words drawn from a Zipf-weighted
+vocabulary), then times queries taken from the indexed text and incremental
+re-indexing of single modules:
+
+    python retrieval_bench.py --modules 5000 --queries 5000 --budget-ms 1
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+
+from retrieval import ModuleIndex
+
+
+TOPIC_WORDS = (
+    'fire extinguisher evacuation alarm smoke exit stairway assembly warden sprinkler hydrant hose '
+    'blanket kitchen grease electrical circuit overload flammable liquid storage cabinet ventilation '
+    'oxygen fuel heat triangle class foam powder carbon dioxide nozzle pin handle sweep squeeze aim '
+    'drill inspection permit hazard risk assessment signage lighting emergency door corridor burn '
+    'first aid casualty muster roll call refuge disabled lift elevator detector battery test'
+).split()
+
+
+def vocabulary(size, rng):
+    # Topic words are the head of the distribution; the tail is synthetic but stable per seed
+    words = list(TOPIC_WORDS)
+    while len(words) < size:
+        words.append(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 10))))
+    return words
+
+
+def make_document(rng, words, weights, sections, words_per_section):
+    parts = []
+    for number in range(sections):
+        body = ' '.join(rng.choices(words, weights, k=words_per_section))
+        parts.append(f'# Section {number} {rng.choice(TOPIC_WORDS)}\n{body}\n')
+    return '\n'.join(parts)
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        'mean_us': statistics.fmean(ordered) * 1e6,
+        'p50_us': pick(0.50) * 1e6,
+        'p95_us': pick(0.95) * 1e6,
+        'p99_us': pick(0.99) * 1e6,
+        'max_us': ordered[-1] * 1e6
+    }
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--modules', type=int, default=5000)
+    parser.add_argument('--sections', type=int, default=6, help='Sections per module.')
+    parser.add_argument('--section-words', type=int, default=80)
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--query-words', type=int, default=6, help='Words per query, taken from indexed text.')
+    parser.add_argument('--updates', type=int, default=200, help='Single-module re-index operations to time.')
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--budget-ms', type=float, default=1.0, help='Maximum p99 query latency.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write results as JSON to this path.')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    words = vocabulary(args.vocabulary, rng)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    documents = {
+        f'module-{number}': make_document(rng, words, weights, args.sections, args.section_words)
+        for number in range(args.modules)
+    }
+
+    index = ModuleIndex()
+    started = time.perf_counter()
+    for module_id, document in documents.items():
+        index.add_module(module_id, f'Training {module_id}', document)
+    build_seconds = time.perf_counter() - started
+
+    # The first query after a change rebuilds the weights of its terms; time that separately
+    queries = []
+    for _ in range(args.queries):
+        document = documents[rng.choice(list(documents))].split()
+        start = rng.randrange(max(1, len(document) - args.query_words))
+        queries.append(' '.join(document[start:start + args.query_words]))
+    started = time.perf_counter()
+    for query in queries:
+        index.search(query, args.k)
+    warmup_seconds = time.perf_counter() - started
+
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, args.k)
+        timings.append(time.perf_counter() - started)
+
+    update_timings = []
+    for module_id in rng.sample(list(documents), min(args.updates, len(documents))):
+        started = time.perf_counter()
+        index.add_module(module_id, f'Training {module_id}', documents[module_id])
+        update_timings.append(time.perf_counter() - started)
+
+    query_stats = percentiles(timings)
+    update_stats = percentiles(update_timings) if update_timings else None
+    info = index.info()
+    print(f'index:   {info["modules"]} modules, {info["sections"]} sections, {info["terms"]} terms, '
+          f'built in {build_seconds:.2f}s')
+    print(f'warm-up: {args.queries} queries in {warmup_seconds * 1000:.0f}ms (cold term weights)')
+    print(f'query:   p50 {query_stats["p50_us"]:.0f}us  p95 {query_stats["p95_us"]:.0f}us  '
+          f'p99 {query_stats["p99_us"]:.0f}us  max {query_stats["max_us"]:.0f}us (budget p99 {args.budget_ms:g}ms)')
+    if update_stats:
+        print(f'update:  p50 {update_stats["p50_us"]:.0f}us  p99 {update_stats["p99_us"]:.0f}us per module re-index')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'config': vars(args),
+                'index': info,
+                'build_seconds': build_seconds,
+                'warmup_seconds': warmup_seconds,
+                'query': query_stats,
+                'update': update_stats
+            }, f, indent=2)
+
+    if query_stats['p99_us'] > args.budget_ms * 1000:
+        print(f'FAIL: p99 query latency {query_stats["p99_us"] / 1000:.2f}ms exceeds the {args.budget_ms:g}ms budget')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,121 @@
+import csv
+import gzip
+import io
+from datetime import date, datetime, timezone
+
+from bson.objectid import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+from metrics import timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/csv', 'text/html'}
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        # Stored datetimes are naive UTC; emit ISO 8601 with a Z suffix like orjson does
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+    if isinstance(value, date):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes ObjectId and datetime natively, using orjson when installed."""
+
+    def _fast_dumps(self, obj):
+        return orjson.dumps(
+            obj,
+            default=_default,
+            option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+        )
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self._fast_dumps(obj).decode('utf-8')
+        kwargs.setdefault('default', _default)
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        with timed('serialization'):
+            # Pretty-printed debug output still goes through the stdlib encoder
+            if orjson is None or (self.compact is None and self._app.debug) or self.compact is False:
+                return super().response(*args, **kwargs)
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(self._fast_dumps(obj) + b'\n', mimetype=self.mimetype)
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, tuple)):
+        return '|'.join(str(csv_value(item)) for item in value)
+    if isinstance(value, (ObjectId, datetime, date)):
+        return _default(value)
+    return value
+
+
+def encode_csv_row(values):
+    # One line at a time so exports never hold more than the current row
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([csv_value(value) for value in values])
+    return buffer.getvalue()
+
+
+def choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings.quality('br') > 0:
+        return 'br'
+    if accept_encodings.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def compress_response(response, accept_encodings, min_size=1024, level=6):
+    """Compress a buffered response body in place when the client accepts it and it is worth it."""
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    encoding = choose_encoding(accept_encodings)
+    if len(body) < min_size or encoding is None:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=min(level, 11))
+    else:
+        compressed = gzip.compress(body, compresslevel=level)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # A compressed body is a different representation, so a strong ETag becomes weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,139 @@
+"""Benchmark response serialization and compression (serialization.py) on API-shaped payloads.
+
+Builds synthetic bodies shaped like the heaviest responses (the module list,
+a page of trainees with their progress, the analytics rollups), then times
+the stdlib encoder against orjson and reports bytes on the wire and encode
+cost for gzip and brotli at the levels compress_response can be set to:
+
+    python serialization_bench.py --trainees 100 --modules 30 --repeat 200 --levels 1 4 6 9
+"""
+import argparse
+import gzip
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+from serialization import _default, brotli, orjson
+
+
+def module_list(rng, modules, reading_kb):
+    now = datetime.utcnow()
+    reading = ' '.join(['Keep exits clear and know your evacuation route.'] * max(1, reading_kb * 20))
+    return {'status': 'success', 'modules': [{
+        '_id': ObjectId(),
+        'title': f'Fire Safety Module {index + 1}',
+        'reading_document': reading,
+        'videos': [f'https://videos.example.com/{index}/{part}' for part in range(3)],
+        'reading_time': 5,
+        'videos_time': 5,
+        'assignment_time': 10,
+        'updated_at': now - timedelta(days=rng.randint(0, 90))
+    } for index in range(modules)]}
+
+
+def trainee_page(rng, trainees, modules):
+    now = datetime.utcnow()
+    module_ids = [ObjectId() for _ in range(modules)]
+    return {'status': 'success', 'next_after': str(ObjectId()), 'trainees': [{
+        '_id': str(ObjectId()),
+        'name': f'Trainee {index}',
+        'email': f'trainee{index}@example.com',
+        'modules': [{
+            'module_id': module_id,
+            'module_title': f'Fire Safety Module {number + 1}',
+            'attempts': [{
+                'timestamp': now - timedelta(minutes=rng.randint(1, 100000)),
+                'score': rng.choice([40.0, 60.0, 80.0, 100.0]),
+                'passed': rng.random() < 0.7
+            } for _ in range(rng.randint(0, 5))],
+            'attempt_count': rng.randint(0, 12),
+            'completed': rng.random() < 0.6,
+            'last_score': rng.choice([0, 40.0, 60.0, 80.0, 100.0])
+        } for number, module_id in enumerate(module_ids)]
+    } for index in range(trainees)]}
+
+
+def analytics(rng, modules):
+    return {'status': 'success', 'modules': [{
+        'module_id': str(ObjectId()),
+        'title': f'Fire Safety Module {index + 1}',
+        'attempts': rng.randint(100, 10000),
+        'pass_rate': round(rng.random(), 4),
+        'average_score': round(rng.uniform(40, 100), 2),
+        'average_attempts_to_pass': round(rng.uniform(1, 3), 2),
+        'question_miss_rates': [round(rng.random(), 4) for _ in range(10)]
+    } for index in range(modules)]}
+
+
+def stdlib_dumps(payload):
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def orjson_dumps(payload):
+    return orjson.dumps(payload, default=_default,
+                        option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+def time_call(function, argument, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(argument)
+        timings.append(time.perf_counter() - started)
+    return result, statistics.median(timings) * 1000
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--trainees', type=int, default=100, help='Trainees on the trainee page.')
+    parser.add_argument('--modules', type=int, default=30)
+    parser.add_argument('--reading-kb', type=int, default=8, help='Approximate size of each reading document.')
+    parser.add_argument('--repeat', type=int, default=100, help='Timed runs per measurement; the median is reported.')
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 4, 6, 9], help='Compression levels to try.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write results as JSON to this path.')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    payloads = {
+        'modules': module_list(rng, args.modules, args.reading_kb),
+        'trainees': trainee_page(rng, args.trainees, args.modules),
+        'analytics': analytics(rng, args.modules)
+    }
+    encoders = {'gzip': lambda level: lambda body: gzip.compress(body, compresslevel=level)}
+    if brotli is not None:
+        encoders['br'] = lambda level: lambda body: brotli.compress(body, quality=min(level, 11))
+    else:
+        print('brotli is not installed; only gzip is measured')
+
+    results = {}
+    for name, payload in payloads.items():
+        body, stdlib_ms = time_call(stdlib_dumps, payload, args.repeat)
+        result = {'json_bytes': len(body), 'stdlib_ms': stdlib_ms, 'orjson_ms': None, 'compression': {}}
+        if orjson is not None:
+            body, result['orjson_ms'] = time_call(orjson_dumps, payload, args.repeat)
+        for encoding, make in encoders.items():
+            for level in args.levels:
+                compressed, ms = time_call(make(level), body, args.repeat)
+                result['compression'][f'{encoding}-{level}'] = {'bytes': len(compressed), 'ms': ms}
+        results[name] = result
+
+        orjson_text = '-' if result['orjson_ms'] is None else f'{result["orjson_ms"]:.2f}ms'
+        print(f'\n{name}: {len(body) / 1024:.1f} KiB JSON, stdlib {stdlib_ms:.2f}ms, orjson {orjson_text}')
+        print(f'{"encoding":<10}{"KiB":>10}{"ratio":>8}{"ms":>9}')
+        for label, stats in result['compression'].items():
+            print(f'{label:<10}{stats["bytes"] / 1024:>10.1f}{len(body) / stats["bytes"]:>8.1f}{stats["ms"]:>9.2f}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'payloads': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,51 @@
+import csv
+import io
+import json
+
+
+UPLOAD_FORMATS = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson'
+}
+
+
+def detect_format(mimetype, filename=None, requested=None):
+    """Pick csv or ndjson from an explicit request, the file extension or the content type."""
+    if requested:
+        fmt = requested.lower()
+    elif filename and '.' in filename:
+        fmt = {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}.get(filename.rsplit('.', 1)[1].lower())
+    else:
+        fmt = UPLOAD_FORMATS.get(mimetype)
+    if fmt not in ('csv', 'ndjson'):
+        raise ValueError('Upload must be CSV or NDJSON')
+    return fmt
+
+
+def iter_rows(stream, fmt):
+    """Yield (row_number, row, error) from a binary upload stream without buffering it.
+
+    Rows are numbered from 1 excluding the CSV header. Malformed rows are
+    reported through `error` instead of aborting the upload.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        rows = ((row, None) for row in csv.DictReader(text))
+    else:
+        rows = (_parse_ndjson_line(line) for line in text if line.strip())
+
+    for row_number, (row, error) in enumerate(rows, start=1):
+        yield row_number, row, error
+
+
+def _parse_ndjson_line(line):
+    try:
+        row = json.loads(line)
+    except json.JSONDecodeError as e:
+        return None, f'invalid JSON ({e.msg})'
+    if not isinstance(row, dict):
+        return None, 'expected a JSON object'
+    return row, None
@@ -0,0 +1,181 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server'))
+
+# Set before main is imported: placeholders only, the tests swap in mongomock and a fake model
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017/firesafe_test')
+os.environ.setdefault('JWT_SECRET_KEY', 'test-only-jwt-secret-key-0123456789')
+os.environ.setdefault('GEMINI_API_KEY', 'test')
+os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+os.environ.setdefault('JOB_WORKERS', '0')
+
+TEST_PASSWORD = 'test-password'
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeStream:
+    """Streamed response whose chunks arrive `delay` seconds apart and can be cancelled like the SDK's."""
+
+    def __init__(self, chunks, delay=0.0, error=None):
+        self.chunks = chunks
+        self.delay = delay
+        self.error = error
+        self.cancelled = threading.Event()
+        # cancel_stream() reaches for the SDK's underlying call through `_iterator`
+        self._iterator = self
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            if self.cancelled.wait(self.delay):
+                return
+            yield FakeResponse(chunk)
+        if self.error is not None:
+            raise self.error
+
+
+class FakeModel:
+    """Stand-in for genai.GenerativeModel.
+
+    `reply(prompt)` returns the text (or raises), `delay(prompt)` the seconds
+    to sleep first. Every prompt is recorded, along with its length, so tests
+    can assert on what was sent.
+    """
+
+    def __init__(self, reply=None, delay=None, chunk_delay=0.0, stream_error=None):
+        self.reply = reply or (lambda prompt: 'Fire safety answer.')
+        self.delay = delay or (lambda prompt: 0.0)
+        self.chunk_delay = chunk_delay
+        self.stream_error = stream_error
+        self.prompts = []
+        self.streams = []
+        self._lock = threading.Lock()
+
+    @property
+    def prompt_lengths(self):
+        return [len(prompt) for prompt in self.prompts]
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        with self._lock:
+            self.prompts.append(prompt)
+        time.sleep(self.delay(prompt))
+        text = self.reply(prompt)
+        if stream:
+            response = FakeStream([word + ' ' for word in text.split()], self.chunk_delay, self.stream_error)
+            self.streams.append(response)
+            return response
+        return FakeResponse(text)
+
+
+@pytest.fixture(scope='session')
+def main():
+    import main
+    return main
+
+
+@pytest.fixture(scope='session', autouse=True)
+def mongomock_bulk_sort():
+    """Let mongomock's bulk builder take the `sort` argument newer PyMongo passes for bulk_write."""
+    mongomock = pytest.importorskip('mongomock')
+    builder = mongomock.collection.BulkOperationBuilder
+
+    def drop_unset_sort(method):
+        def wrapper(self, *args, sort=None, **kwargs):
+            if sort is not None:
+                raise NotImplementedError('mongomock does not support sorted bulk updates')
+            return method(self, *args, **kwargs)
+        return wrapper
+
+    originals = builder.add_replace, builder.add_update
+    builder.add_replace, builder.add_update = map(drop_unset_sort, originals)
+    yield
+    builder.add_replace, builder.add_update = originals
+
+
+@pytest.fixture(autouse=True)
+def db(main):
+    """A fresh mongomock database, with the app's in-process caches and indexes reset."""
+    mongomock = pytest.importorskip('mongomock')
+    client = mongomock.MongoClient()
+    main.mongo.cx = client
+    main.mongo.db = client['firesafe_test']
+    main._indexed_collections.clear()
+    for cache in (main.content_cache, main.chat_cache, main.answer_key_cache, main.user_cache):
+        cache.clear()
+    main.module_index = None
+    main._module_index_state.update(refreshed=None, watermark=None, indexed={})
+    main.llm.breaker.record_success()
+    yield main.mongo.db
+
+
+@pytest.fixture
+def model(main):
+    fake = FakeModel()
+    previous, main.model = main.model, fake
+    yield fake
+    main.model = previous
+
+
+@pytest.fixture
+def client(main):
+    return main.app.test_client()
+
+
+@pytest.fixture
+def make_user(main, db):
+    """Insert a user and return (user_id, auth headers)."""
+    password = main.password_hasher.hash(TEST_PASSWORD)
+    counter = iter(range(1_000_000))
+
+    def make(role='Trainee', name=None):
+        index = next(counter)
+        name = name or f'{role} {index}'
+        result = db.users.insert_one({
+            'name': name,
+            'email': f'{role.lower()}{index}@test.local',
+            'mobile': f'555{index:07d}',
+            'password': password,
+            'role': role
+        })
+        user_id = str(result.inserted_id)
+        with main.app.app_context():
+            token = main.create_user_token(user_id, role)
+        return user_id, {'Authorization': f'Bearer {token}'}
+
+    return make
+
+
+@pytest.fixture
+def make_module(client, make_user):
+    """Create a module through the API and return its id."""
+    _, admin = make_user('Admin')
+
+    def make(title='Fire Safety Basics', reading_document='', questions=3):
+        quiz = json.dumps({'quiz': [
+            {'question': f'Question {index + 1}?', 'options': ['A', 'B', 'C', 'D'], 'answer': 'ABCD'[index % 4]}
+            for index in range(questions)
+        ]})
+        response = client.post('/api/modules', json={
+            'title': title,
+            'reading_document': reading_document,
+            'mcq_assignment': quiz
+        }, headers=admin)
+        assert response.status_code == 201, response.get_json()
+        return str(response.get_json()['module_id'])
+
+    return make
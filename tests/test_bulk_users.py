@@ -0,0 +1,73 @@
+def test_bulk_accounts_are_hashed_at_the_login_cost(main, db, client, make_user):
+    _, admin = make_user('Admin')
+    body = 'name,email,mobile,password,role\n' + ''.join(
+        f'Trainee {index},bulk{index}@test.local,555000{index:04d},Bulk-password-{index},Trainee\n'
+        for index in range(40)
+    )
+
+    response = client.post('/api/users/bulk', data=body, content_type='text/csv', headers=admin)
+
+    assert response.status_code == 200, response.get_json()
+    users = list(db.users.find({'email': {'$regex': '^bulk'}}))
+    assert len(users) == 40
+    assert {int(user['password'].split('$')[2]) for user in users} == {main.password_hasher.rounds}
+    assert not any(main.password_hasher.needs_rehash(user['password']) for user in users)
+
+    response = client.post('/api/login', json={'email': 'bulk7@test.local', 'password': 'Bulk-password-7'})
+    assert response.status_code == 200
+
+
+def test_overlong_password_rejects_only_its_row(db, client, make_user):
+    _, admin = make_user('Admin')
+    body = ('name,email,mobile,password,role\n'
+            'Short,short@test.local,5550001,Short-password,Trainee\n'
+            f'Long,long@test.local,5550002,{"x" * 73},Trainee\n'
+            'Also short,also@test.local,5550003,Also-short,Trainee\n')
+
+    response = client.post('/api/users/bulk', data=body, content_type='text/csv', headers=admin)
+
+    assert response.status_code == 200, response.get_json()
+    results = {result['row']: result for result in response.get_json()['results']}
+    assert [results[row]['status'] for row in sorted(results)] == ['created', 'invalid', 'created']
+    invalid = next(result for result in results.values() if result['status'] == 'invalid')
+    assert 'at most 72 bytes' in invalid['message']
+    assert db.users.count_documents({'email': 'long@test.local'}) == 0
+
+
+def test_overlong_password_is_a_bad_request(client):
+    # 25 three-byte characters: 75 bytes
+    password = '€' * 25
+    response = client.post('/api/register', json={
+        'name': 'Long', 'email': 'long@test.local', 'mobile': '5550002', 'password': password
+    })
+    assert response.status_code == 400
+    assert 'at most 72 bytes' in response.get_json()['message']
+
+    response = client.post('/api/login', json={'email': 'long@test.local', 'password': password})
+    assert response.status_code == 401
+
+
+def test_large_upload_runs_as_a_job(main, db, client, make_user):
+    _, admin = make_user('Admin')
+    rows = main.BULK_USERS_ASYNC_ROWS + 10
+    body = 'name,email,mobile,password,role\n' + ''.join(
+        f'Trainee {index},job{index}@test.local,555000{index:04d},Job-password-{index},Trainee\n'
+        for index in range(rows)
+    ) + 'Broken,not-an-email,5550000,Job-password,Trainee\n'
+
+    response = client.post('/api/users/bulk', data=body, content_type='text/csv', headers=admin)
+
+    assert response.status_code == 202, response.get_json()
+    job_id = response.get_json()['job_id']
+    assert response.get_json()['rows'] == rows
+    assert db.users.count_documents({'email': {'$regex': '^job'}}) == 0
+    # Queued rows hold plaintext passwords, which the job endpoint never shows
+    assert 'payload' not in client.get(f'/api/jobs/{job_id}', headers=admin).get_json()['job']
+
+    assert main.job_runner.run_pending() == 1
+
+    job = client.get(f'/api/jobs/{job_id}', headers=admin).get_json()['job']
+    assert job['state'] == 'succeeded'
+    assert job['result']['summary'] == {'created': rows, 'invalid': 1}
+    assert db.users.count_documents({'email': {'$regex': '^job'}}) == rows
+    assert 'payload' not in db.jobs.find_one()
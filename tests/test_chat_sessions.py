@@ -0,0 +1,75 @@
+import pytest
+
+
+TURNS = 60
+SUMMARY_PROMPT = 'Summarize this fire safety training conversation'
+
+
+def reply(prompt):
+    if prompt.startswith(SUMMARY_PROMPT):
+        # Longer than CHAT_SESSION_SUMMARY_TOKENS, so the stored summary must be clipped
+        return 'The trainee asked about extinguishers and evacuation. ' * 200
+    return 'Check the pressure gauge, the pin and the hose, and record the inspection on the tag. ' * 8
+
+
+@pytest.fixture
+def session(client, make_user, model):
+    model.reply = reply
+    _, headers = make_user()
+    response = client.post('/api/chat/sessions', headers=headers)
+    assert response.status_code == 201
+    return response.get_json()['session_id'], headers
+
+
+def hold_session(client, session_id, headers, turns=TURNS):
+    results = []
+    for turn in range(turns):
+        response = client.post('/api/chat', json={
+            'message': f'Follow-up {turn}: what should I check on extinguisher type {turn % 7} next week?',
+            'session_id': session_id
+        }, headers=headers)
+        assert response.status_code == 200, response.get_json()
+        results.append(response.get_json())
+    return results
+
+
+def prompt_ceiling(main, message):
+    # The bare prompt plus a full history, allowing a few tokens per turn for the role prefixes
+    return main.estimate_tokens(main.build_chat_prompt(message)) + main.CHAT_SESSION_TOKEN_BUDGET * 11 // 10
+
+
+@pytest.mark.parametrize('summarize', [True, False], ids=['summarize', 'truncate'])
+def test_long_session_stays_within_the_token_budget(main, client, model, session, monkeypatch, summarize):
+    monkeypatch.setattr(main, 'CHAT_SESSION_SUMMARIZE', summarize)
+    session_id, headers = session
+
+    results = hold_session(client, session_id, headers)
+
+    budget = main.CHAT_SESSION_TOKEN_BUDGET
+    ceiling = prompt_ceiling(main, 'Follow-up 10: what should I check on extinguisher type 3 next week?')
+    assert max(result['history_tokens'] for result in results) <= budget
+    assert max(result['prompt_tokens'] for result in results) <= ceiling
+    chat_prompts = [length for prompt, length in zip(model.prompts, model.prompt_lengths)
+                    if not prompt.startswith(SUMMARY_PROMPT)]
+    assert len(chat_prompts) == TURNS
+    assert max(chat_prompts) <= ceiling * 4
+    # The prompt size plateaus instead of growing with the conversation
+    assert max(result['prompt_tokens'] for result in results[-20:]) <= max(result['prompt_tokens'] for result in results[:40])
+
+    stored = client.get(f'/api/chat/sessions/{session_id}', headers=headers).get_json()['session']
+    assert stored['messages'] == TURNS
+    assert stored['compactions'] > 0
+    assert stored['history_tokens'] <= budget
+    assert stored['prompt_tokens']['max'] <= ceiling
+    assert main.estimate_tokens(stored['summary']) <= main.CHAT_SESSION_SUMMARY_TOKENS + 1
+
+    summaries = [prompt for prompt in model.prompts if prompt.startswith(SUMMARY_PROMPT)]
+    if summarize:
+        assert len(summaries) == stored['compactions']
+        assert stored['summary'].startswith('The trainee asked about extinguishers')
+    else:
+        assert summaries == []
+        # The newest folded question ends the summary; the ones after it are still recent turns
+        first_kept = next(turn['text'] for turn in stored['turns'] if turn['role'] == 'user')
+        number = int(first_kept.split(':')[0].split()[-1])
+        assert stored['summary'].split('\n')[-1].startswith(f'User asked: Follow-up {number - 1}:')
@@ -0,0 +1,120 @@
+import json
+import time
+
+from llm import LLMClient, cancel_stream
+from conftest import FakeModel, FakeStream
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((fields.get('event'), json.loads(fields['data'])))
+    return events
+
+
+def test_stream_relays_chunks_then_done(client, model, make_user):
+    model.reply = lambda prompt: 'Use a class K extinguisher'
+    _, headers = make_user()
+
+    response = client.post('/api/chat/stream', json={'message': 'Kitchen fire?'}, headers=headers)
+
+    assert response.mimetype == 'text/event-stream'
+    events = parse_events(response.get_data(as_text=True))
+    assert [name for name, _ in events] == ['chunk'] * 5 + ['done']
+    assert ''.join(data['text'] for name, data in events if name == 'chunk') == 'Use a class K extinguisher '
+    assert events[-1][1] == {'status': 'done', 'cached': False}
+
+
+def test_stream_answer_is_cached_for_the_json_endpoint(client, model, make_user):
+    _, headers = make_user()
+    client.post('/api/chat/stream', json={'message': 'Kitchen fire?'}, headers=headers).get_data()
+
+    response = client.post('/api/chat', json={'message': 'kitchen fire'}, headers=headers)
+
+    assert response.get_json()['response'] == 'Fire safety answer. '
+    assert len(model.prompts) == 1
+
+
+def test_stream_error_mid_generation_sends_error_event(client, model, make_user, main):
+    model.stream_error = RuntimeError('upstream reset')
+    _, headers = make_user()
+
+    events = parse_events(client.post('/api/chat/stream', json={'message': 'Alarm?'}, headers=headers).get_data(as_text=True))
+
+    assert [name for name, _ in events][-1] == 'error'
+    assert events[-1][1]['status'] == 'error'
+    assert 'upstream reset' in events[-1][1]['message']
+    # A failed stream is not cached
+    assert len(main.chat_cache) == 0
+
+
+def test_first_chunk_arrives_before_generation_finishes(client, model, make_user):
+    model.reply = lambda prompt: 'one two three four five'
+    model.chunk_delay = 0.1
+    _, headers = make_user()
+
+    started = time.perf_counter()
+    response = client.post('/api/chat/stream', json={'message': 'Evacuate?'}, headers=headers, buffered=False)
+    chunks = iter(response.response)
+    first = next(chunks)
+    first_at = time.perf_counter() - started
+    rest = b''.join(chunks)
+    total = time.perf_counter() - started
+    response.close()
+
+    assert b'"one "' in first
+    assert b'"status": "done"' in rest
+    assert first_at < 0.2 < total
+
+
+def test_client_disconnect_cancels_upstream_and_frees_slot(client, model, make_user, main):
+    model.reply = lambda prompt: ' '.join(['word'] * 50)
+    model.chunk_delay = 0.05
+    _, headers = make_user()
+    free_slots = main.llm._slots._value
+
+    response = client.post('/api/chat/stream', json={'message': 'Exits?'}, headers=headers, buffered=False)
+    next(iter(response.response))
+    assert main.llm._slots._value == free_slots - 1
+    response.close()
+
+    stream = model.streams[0]
+    assert stream.cancelled.is_set()
+    assert main.llm._slots._value == free_slots
+    # Cancellation is not a failure and the partial answer is not cached
+    assert main.llm.breaker.state == 'closed'
+    assert len(main.chat_cache) == 0
+
+
+def test_cancel_stream_uses_the_sdk_iterator():
+    stream = FakeStream(['a', 'b'])
+    cancel_stream(stream)
+    assert stream.cancelled.is_set()
+
+    class RestIterator:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    class RestResponse:
+        _iterator = RestIterator()
+
+    response = RestResponse()
+    cancel_stream(response)
+    assert response._iterator.closed
+    # Responses without the private attribute are left alone
+    cancel_stream(object())
+
+
+def test_closing_llm_stream_releases_its_slot():
+    model = FakeModel(reply=lambda prompt: 'a b c', chunk_delay=0.01)
+    llm = LLMClient(lambda: model, timeout=5, max_in_flight=1, queue_timeout=0.01)
+
+    chunks = llm.stream('prompt')
+    assert next(chunks) == 'a '
+    chunks.close()
+
+    assert model.streams[0].cancelled.is_set()
+    assert list(llm.stream('again')) == ['a ', 'b ', 'c ']
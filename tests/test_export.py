@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytest
+from bson.objectid import ObjectId
+
+
+class SyntheticCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __iter__(self):
+        return self.documents
+
+
+class SyntheticCollection:
+    """Generates `count` documents on demand, in _id order.
+
+    mongomock copies a whole result set before returning it, which would hide
+    whether the export itself buffers; this yields one document at a time.
+    """
+
+    def __init__(self, count, make):
+        self.count = count
+        self.make = make
+
+    def find(self, query, projection=None):
+        return SyntheticCursor(self.make(number) for number in range(self.count))
+
+
+def synthetic_progress(user_ids, module_id):
+    started = datetime(2025, 1, 1)
+
+    def make(number):
+        return {
+            '_id': ObjectId(f'{number + 1:024x}'),
+            'user_id': user_ids[number % len(user_ids)],
+            'module_id': module_id,
+            'reading_completed': True,
+            'videos_completed': number % 3 == 0,
+            'assignment_completed': True,
+            'attempt_count': number % 7 + 1,
+            'last_score': float(number % 101),
+            'passed': number % 101 >= 70,
+            'last_attempt_at': started + timedelta(minutes=number)
+        }
+    return make
+
+
+def export_peak(main, client, admin, monkeypatch, rows, fmt, user_ids, module_id):
+    """Stream an export of `rows` synthetic records; returns (lines, peak traced bytes)."""
+    monkeypatch.setattr(main, 'progress_store', lambda: SyntheticCollection(rows, synthetic_progress(user_ids, module_id)))
+    tracemalloc.start()
+    try:
+        response = client.get(f'/api/export/progress?format={fmt}', headers=admin, buffered=False)
+        assert response.status_code == 200
+        lines = sum(chunk.count(b'\n') for chunk in response.response)
+        response.close()
+        return lines, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize('fmt', ['ndjson', 'csv'])
+def test_export_memory_stays_flat_as_rows_grow(main, client, make_user, make_module, monkeypatch, fmt):
+    module_id = make_module()
+    user_ids = [make_user()[0] for _ in range(20)]
+    _, admin = make_user('Admin')
+    header = 1 if fmt == 'csv' else 0
+
+    small_lines, small_peak = export_peak(main, client, admin, monkeypatch, 2_000, fmt, user_ids, module_id)
+    large_lines, large_peak = export_peak(main, client, admin, monkeypatch, 20_000, fmt, user_ids, module_id)
+
+    assert small_lines == 2_000 + header and large_lines == 20_000 + header
+    # Ten times the rows for about the same peak; buffering the cursor fails this by ~10x
+    assert large_peak < small_peak * 1.5 + 256 * 1024, (small_peak, large_peak)
+
+
+@pytest.fixture
+def exported_data(db, make_user, make_module, client):
+    """Real progress records and attempt buckets written through the API."""
+    module_ids = [make_module(f'Module {index}', questions=4) for index in range(2)]
+    trainees = [make_user() for _ in range(6)]
+    for number, (_, headers) in enumerate(trainees):
+        for module_id in module_ids:
+            for attempt in range(number % 3 + 1):
+                response = client.post(f'/api/modules/{module_id}/submit-assignment',
+                                       json={'answers': ['A', 'B', 'X', 'X'] if attempt else ['X'] * 4},
+                                       headers=headers)
+                assert response.status_code == 200
+    return make_user('Admin')[1]
+
+
+def read_ndjson(client, admin, kind, cursor=None):
+    query = f'/api/export/{kind}' + (f'?cursor={cursor}' if cursor else '')
+    response = client.get(query, headers=admin)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize('kind', ['progress', 'attempts'])
+def test_export_resumes_after_a_cursor(client, exported_data, kind):
+    rows = read_ndjson(client, exported_data, kind)
+    # 6 trainees on 2 modules, each trainee submitting 1 to 3 times per module
+    assert len(rows) == {'progress': 12, 'attempts': 24}[kind]
+
+    for stop in (0, 5, len(rows) - 2, len(rows) - 1):
+        resumed = read_ndjson(client, exported_data, kind, rows[stop]['cursor'])
+        assert resumed == rows[stop + 1:]
+
+
+def test_csv_export_matches_ndjson_columns(main, client, exported_data):
+    response = client.get('/api/export/attempts?format=csv', headers=exported_data)
+    assert response.status_code == 200
+    records = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert tuple(records[0]) == main.EXPORT_COLUMNS['attempts']
+    assert len(records) == 1 + len(read_ndjson(client, exported_data, 'attempts'))
+
+
+def test_bad_cursor_is_rejected(client, exported_data):
+    response = client.get('/api/export/progress?cursor=not-a-cursor', headers=exported_data)
+    assert response.status_code == 400
@@ -0,0 +1,44 @@
+import statistics
+import threading
+import time
+
+import pytest
+
+from hashing import PasswordHasher
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=8, workers=2, max_pending=16, timeout=10)
+    yield hasher
+    if hasher._executor is not None:
+        hasher._executor.shutdown()
+
+
+def timed_check(hasher, hashed):
+    started = time.perf_counter()
+    assert hasher.check(hashed, 'login-password')
+    return time.perf_counter() - started
+
+
+def test_logins_are_not_queued_behind_a_bulk_import(hasher):
+    hashed = hasher.hash('login-password')
+    idle = statistics.median(timed_check(hasher, hashed) for _ in range(3))
+
+    bulk = threading.Thread(target=hasher.hash_many, args=([f'bulk-{number}' for number in range(96)],))
+    bulk.start()
+    time.sleep(0.2)
+    busy = [timed_check(hasher, hashed) for _ in range(4)]
+    still_importing = bulk.is_alive()
+    bulk.join()
+
+    assert still_importing
+    # A spare process answers at once; behind a chunk of bulk hashes a login waits for the whole chunk
+    assert max(busy) < idle * 4 + 0.05, (idle, busy)
+
+
+def test_hash_many_matches_hash(hasher):
+    passwords = [f'bulk-{number}' for number in range(10)]
+    hashes = hasher.hash_many(passwords)
+    assert len(hashes) == len(passwords)
+    assert all(hasher.check(hashed, password) for hashed, password in zip(hashes, passwords))
@@ -0,0 +1,62 @@
+import os
+import uuid
+
+import pytest
+
+from indexes import plan_stages
+
+
+@pytest.fixture
+def real_db(main):
+    """A scratch database on the MongoDB at TEST_MONGO_URI; skipped when there is none."""
+    uri = os.getenv('TEST_MONGO_URI')
+    if not uri:
+        pytest.skip('set TEST_MONGO_URI to explain queries against a real MongoDB')
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    client = MongoClient(uri, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command('ping')
+    except PyMongoError as e:
+        client.close()
+        pytest.skip(f'MongoDB at TEST_MONGO_URI is not reachable: {str(e).split(",")[0]}')
+
+    database = client[f'firesafe_indexes_{uuid.uuid4().hex[:8]}']
+    previous = main.mongo.cx, main.mongo.db
+    main.mongo.cx, main.mongo.db = client, database
+    main._indexed_collections.clear()
+    yield database
+    main.mongo.cx, main.mongo.db = previous
+    client.drop_database(database.name)
+    client.close()
+
+
+def test_hot_queries_use_an_index(main, real_db):
+    report = main.ensure_indexes(real_db, main.INDEXES)
+    assert not [error for _, error in report.values() if error]
+
+    plans = {
+        name: main.explain_query(real_db[collection], query, sort)
+        for name, collection, query, sort in main.hot_queries()
+    }
+
+    assert not {name: stages for name, stages in plans.items() if 'COLLSCAN' in stages}
+
+
+def test_check_indexes_command_passes(main, real_db):
+    main.ensure_indexes(real_db, main.INDEXES)
+    result = main.app.test_cli_runner().invoke(args=['check-indexes'])
+    assert result.exit_code == 0, result.output
+
+
+def test_plan_stages_flattens_nested_plans():
+    plan = {
+        'stage': 'SORT',
+        'inputStage': {'stage': 'OR', 'inputStages': [
+            {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}},
+            {'stage': 'COLLSCAN'}
+        ]}
+    }
+    assert plan_stages(plan) == ['SORT', 'OR', 'FETCH', 'IXSCAN', 'COLLSCAN']
+    assert plan_stages({'queryPlan': {'stage': 'EOF'}}) == ['EOF']
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+from bson.objectid import ObjectId
+
+from jobs import JobRunner
+
+
+def test_trainee_cannot_queue_generation_jobs(client, db, make_user, model):
+    _, trainee = make_user()
+
+    single = client.post('/api/generate-module-content',
+                         json={'moduleTitle': 'Fire Wardens', 'async': True}, headers=trainee)
+    batch = client.post('/api/generate-module-content/batch',
+                        json={'titles': ['Fire Wardens', 'Evacuation']}, headers=trainee)
+
+    assert single.status_code == 403
+    assert batch.status_code == 403
+    assert db.jobs.count_documents({}) == 0
+    assert model.prompts == []
+
+
+def test_only_admins_read_jobs(client, make_user, model):
+    _, admin = make_user('Admin')
+    _, trainee = make_user()
+
+    response = client.post('/api/generate-module-content/batch',
+                           json={'titles': ['Fire Wardens', 'Evacuation']}, headers=admin)
+    assert response.status_code == 202
+    job_id = response.get_json()['jobs'][0]['job_id']
+
+    assert client.get(f'/api/jobs/{job_id}', headers=trainee).status_code == 403
+    response = client.get(f'/api/jobs/{job_id}', headers=admin)
+    assert response.status_code == 200
+    assert response.get_json()['job']['payload']['moduleTitle'] == 'Fire Wardens'
+
+
+class FlakyJobs:
+    """The jobs collection, failing the first `failures` update_one calls."""
+
+    def __init__(self, collection, failures=1):
+        self.collection = collection
+        self.failures = failures
+
+    def update_one(self, *args, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('connection reset')
+        return self.collection.update_one(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+@pytest.fixture
+def flaky_runner(db):
+    jobs = FlakyJobs(db.jobs)
+    runner = JobRunner(lambda: jobs, workers=1, poll_interval=0.05, lease=0.2)
+    finished = threading.Semaphore(0)
+
+    @runner.handler('echo')
+    def echo(payload):
+        finished.release()
+        return payload
+
+    yield runner, finished
+    runner.stop()
+
+
+def wait_for_state(db, job_id, state, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = db.jobs.find_one({'_id': ObjectId(job_id)})
+        if job['state'] == state:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'job {job_id} is {job["state"]}, not {state}')
+
+
+def test_worker_survives_a_failed_status_write(db, flaky_runner):
+    runner, finished = flaky_runner
+    first = runner.enqueue('echo', {'n': 1})
+    assert finished.acquire(timeout=5)
+
+    second = runner.enqueue('echo', {'n': 2})
+
+    assert wait_for_state(db, second, 'succeeded')['result'] == {'n': 2}
+    assert all(thread.is_alive() for thread in runner._threads)
+    # The first job's outcome was lost with the write; its lease runs out and it runs again
+    assert wait_for_state(db, first, 'succeeded')['attempts'] == 2
+
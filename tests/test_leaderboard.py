@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+
+QUESTIONS = 4
+CORRECT = ['ABCD'[index % 4] for index in range(QUESTIONS)]
+
+
+def answers_scoring(correct_count):
+    return CORRECT[:correct_count] + ['X'] * (QUESTIONS - correct_count)
+
+
+@pytest.fixture
+def submissions(client, make_user, make_module):
+    """Random pass/fail submissions from several trainees over several modules."""
+    rng = random.Random(7)
+    module_ids = [make_module(f'Module {index}', questions=QUESTIONS) for index in range(3)]
+    trainees = [make_user() for _ in range(4)]
+    for _ in range(40):
+        _, headers = rng.choice(trainees)
+        response = client.post(
+            f'/api/modules/{rng.choice(module_ids)}/submit-assignment',
+            json={'answers': answers_scoring(rng.randint(0, QUESTIONS))},
+            headers=headers
+        )
+        assert response.status_code == 200, response.get_json()
+    return trainees
+
+
+def test_materialized_leaderboard_matches_recomputed(main, db, submissions):
+    expected = main.compute_leaderboard()
+    assert expected, 'the seed should produce at least one passed module'
+
+    stored = {entry['_id']: entry for entry in db.leaderboard.find({'modules_completed': {'$gt': 0}})}
+    assert set(stored) == set(expected)
+    for user_id, row in expected.items():
+        entry = stored[user_id]
+        assert entry['modules_completed'] == row['modules_completed']
+        assert entry['total_score'] == pytest.approx(row['total_score'])
+        assert entry['score'] == pytest.approx(row['total_score'] / row['modules_completed'])
+
+
+def test_rebuild_check_reports_no_drift(main, submissions):
+    result = main.app.test_cli_runner().invoke(args=['rebuild-leaderboard', '--check'])
+    assert result.exit_code == 0, result.output
+    assert '0 leaderboard entries out of sync' in result.output
+
+
+def test_leaderboard_endpoint_ranks_by_average(client, make_user, submissions, main):
+    _, admin = make_user('Admin')
+    response = client.get('/api/leaderboard', headers=admin)
+    assert response.status_code == 200
+    scores = [entry['score'] for entry in response.get_json()['leaderboard']]
+    assert scores == sorted(scores, reverse=True)
+    assert len(scores) == len(main.compute_leaderboard())
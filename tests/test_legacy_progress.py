@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+
+LEGACY_ATTEMPTS = 12
+FIRST_LEGACY_PASS = 4
+
+
+@pytest.fixture
+def legacy_record(db, make_user, make_module):
+    """A progress record from before bucketing: every attempt embedded, no attempt_count."""
+    module_id = make_module(questions=4)
+    user_id, headers = make_user()
+    started = datetime(2024, 1, 1)
+    db.progress.insert_one({
+        'module_id': module_id,
+        'user_id': user_id,
+        'reading_completed': True,
+        'videos_completed': True,
+        'assignment_completed': True,
+        'attempts': [{
+            'timestamp': started + timedelta(days=5 * number),
+            'score': 100.0 if number + 1 >= FIRST_LEGACY_PASS else 25.0,
+            'passed': number + 1 >= FIRST_LEGACY_PASS
+        } for number in range(LEGACY_ATTEMPTS)]
+    })
+    return module_id, user_id, headers
+
+
+def submit(client, module_id, headers, answers=('A', 'B', 'C', 'D')):
+    response = client.post(f'/api/modules/{module_id}/submit-assignment', json={'answers': list(answers)}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+
+
+def bucketed(db, module_id, user_id):
+    return sum(len(bucket['attempts']) for bucket in db.attempt_buckets.find({'module_id': module_id, 'user_id': user_id}))
+
+
+@pytest.fixture
+def attempt_numbers(main, monkeypatch):
+    numbers = []
+    update = main.update_module_analytics
+
+    def record(module_id, attempt, attempt_number, first_pass, question_count):
+        numbers.append((attempt_number, first_pass))
+        return update(module_id, attempt, attempt_number, first_pass, question_count)
+
+    monkeypatch.setattr(main, 'update_module_analytics', record)
+    return numbers
+
+
+def test_first_submission_buckets_the_legacy_history(main, db, client, legacy_record, attempt_numbers):
+    module_id, user_id, headers = legacy_record
+
+    submit(client, module_id, headers)
+    submit(client, module_id, headers, answers=('X', 'X', 'X', 'X'))
+
+    record = db.progress.find_one({'module_id': module_id, 'user_id': user_id})
+    assert record['attempt_count'] == LEGACY_ATTEMPTS + 2
+    assert len(record['attempts']) == main.RECENT_ATTEMPTS
+    assert record['first_pass_attempt'] == FIRST_LEGACY_PASS
+    assert bucketed(db, module_id, user_id) == LEGACY_ATTEMPTS + 2
+    assert attempt_numbers == [(LEGACY_ATTEMPTS + 1, False), (LEGACY_ATTEMPTS + 2, False)]
+
+
+@pytest.mark.parametrize('rebuild_first', [True, False])
+def test_rebuild_and_first_touch_bucket_each_attempt_once(main, db, client, legacy_record, rebuild_first):
+    module_id, user_id, headers = legacy_record
+    runner = main.app.test_cli_runner()
+
+    if rebuild_first:
+        assert runner.invoke(args=['rebuild-analytics']).exit_code == 0
+    submit(client, module_id, headers)
+    result = runner.invoke(args=['rebuild-analytics'])
+    assert result.exit_code == 0, result.output
+
+    record = db.progress.find_one({'module_id': module_id, 'user_id': user_id})
+    assert record['attempt_count'] == LEGACY_ATTEMPTS + 1
+    assert bucketed(db, module_id, user_id) == LEGACY_ATTEMPTS + 1
+    rollup = db.module_analytics.find_one({'_id': module_id})
+    assert rollup['attempts'] == LEGACY_ATTEMPTS + 1
+
+
+def test_section_only_record_needs_no_migration(main, db, client, make_user, make_module, attempt_numbers):
+    module_id = make_module(questions=4)
+    user_id, headers = make_user()
+    client.post(f'/api/modules/{module_id}/complete-section', json={'section': 'reading'}, headers=headers)
+
+    submit(client, module_id, headers)
+
+    record = db.progress.find_one({'module_id': module_id, 'user_id': user_id})
+    assert record['attempt_count'] == 1
+    assert record['first_pass_attempt'] == 1
+    assert attempt_numbers == [(1, True)]
+
+
+def test_best_score_includes_legacy_attempts(db, client, legacy_record):
+    module_id, user_id, headers = legacy_record
+
+    submit(client, module_id, headers, answers=('X', 'X', 'X', 'X'))
+
+    assert db.progress.find_one({'module_id': module_id, 'user_id': user_id})['best_score'] == 100.0
+
+
+def test_rebuild_backfills_best_score_from_buckets(main, db, client, make_user, make_module):
+    module_id = make_module(questions=4)
+    user_id, headers = make_user()
+    for answers in (('A', 'B', 'C', 'D'), ('A', 'X', 'X', 'X')):
+        submit(client, module_id, headers, answers=answers)
+    # As bucketed before best_score was kept
+    db.progress.update_one({'module_id': module_id, 'user_id': user_id}, {'$unset': {'best_score': ''}})
+
+    result = main.app.test_cli_runner().invoke(args=['rebuild-analytics'])
+
+    assert result.exit_code == 0, result.output
+    assert 'backfilled 1 best scores' in result.output
+    assert db.progress.find_one({'module_id': module_id, 'user_id': user_id})['best_score'] == 100.0
@@ -0,0 +1,134 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+from conftest import FakeModel
+from llm import LLMClient, LLMUnavailable
+
+
+def upstream_error(prompt):
+    raise RuntimeError('upstream 500')
+
+
+def make_client(model, **options):
+    return LLMClient(lambda: model, **dict({'timeout': 2.0, 'queue_timeout': 0.05}, **options))
+
+
+def in_background(call):
+    """Run `call` on a thread, ignoring the LLMUnavailable it may raise."""
+    def run():
+        try:
+            call()
+        except LLMUnavailable:
+            pass
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_call_past_its_deadline_times_out():
+    client = make_client(FakeModel(delay=lambda prompt: 0.5), timeout=0.1)
+
+    started = time.perf_counter()
+    with pytest.raises(LLMUnavailable, match='timed out'):
+        client.generate('Slow prompt')
+
+    assert time.perf_counter() - started < 0.4
+    assert client.info()['timeouts'] == 1
+
+
+def test_full_semaphore_rejects_instead_of_queueing():
+    client = make_client(FakeModel(delay=lambda prompt: 0.3), max_in_flight=1)
+    slow = in_background(lambda: client.generate('Holds the only slot'))
+    time.sleep(0.05)
+
+    with pytest.raises(LLMUnavailable, match='busy'):
+        client.generate('Rejected')
+
+    slow.join()
+    assert client.info()['rejected_busy'] == 1
+    assert client.generate('Slot is free again') == 'Fire safety answer.'
+
+
+def test_breaker_opens_after_consecutive_failures():
+    model = FakeModel(reply=upstream_error)
+    client = make_client(model, failure_threshold=3, reset_timeout=60)
+
+    for _ in range(3):
+        with pytest.raises(LLMUnavailable, match='upstream 500'):
+            client.generate('Failing prompt')
+    assert client.breaker.state == 'open'
+
+    with pytest.raises(LLMUnavailable, match='temporarily unavailable') as rejected:
+        client.generate('Not sent upstream')
+    assert len(model.prompts) == 3
+    assert rejected.value.retry_after > 1
+    assert client.info()['rejected_open'] == 1
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success():
+    outcomes = iter([upstream_error, upstream_error])
+    model = FakeModel(reply=lambda prompt: next(outcomes, lambda prompt: 'Recovered.')(prompt),
+                      delay=lambda prompt: 0.2 if 'probe' in prompt else 0.0)
+    client = make_client(model, failure_threshold=2, reset_timeout=0.1)
+    for _ in range(2):
+        with pytest.raises(LLMUnavailable):
+            client.generate('Failing prompt')
+    time.sleep(0.15)
+
+    probe = in_background(lambda: client.generate('The probe'))
+    time.sleep(0.05)
+    assert client.breaker.state == 'half_open'
+    with pytest.raises(LLMUnavailable, match='temporarily unavailable'):
+        client.generate('Second caller while probing')
+    probe.join()
+
+    assert client.breaker.state == 'closed'
+    assert model.prompts.count('Second caller while probing') == 0
+    assert client.generate('Back to normal') == 'Recovered.'
+
+
+def test_failed_probe_reopens_the_breaker():
+    model = FakeModel(reply=upstream_error)
+    client = make_client(model, failure_threshold=1, reset_timeout=0.1)
+    with pytest.raises(LLMUnavailable):
+        client.generate('Failing prompt')
+    time.sleep(0.15)
+
+    with pytest.raises(LLMUnavailable, match='upstream 500'):
+        client.generate('Failed probe')
+
+    assert client.breaker.state == 'open'
+    with pytest.raises(LLMUnavailable, match='temporarily unavailable'):
+        client.generate('Rejected again')
+
+
+def test_hedge_wins_when_the_first_attempt_stalls():
+    delays = itertools.chain([1.0], itertools.repeat(0.0))
+    client = make_client(FakeModel(delay=lambda prompt: next(delays)), hedge_delay=0.05)
+
+    started = time.perf_counter()
+    assert client.generate('Chat question', hedge=True) == 'Fire safety answer.'
+
+    assert time.perf_counter() - started < 0.5
+    info = client.info()
+    assert info['hedges'] == 1 and info['hedge_wins'] == 1
+
+
+def test_no_hedge_when_the_first_attempt_answers_in_time():
+    model = FakeModel()
+    client = make_client(model, hedge_delay=0.2)
+
+    client.generate('Chat question', hedge=True)
+
+    assert len(model.prompts) == 1
+    assert client.info().get('hedges', 0) == 0
+
+
+def test_hedge_is_skipped_when_no_slot_is_free():
+    client = make_client(FakeModel(delay=lambda prompt: 0.3), max_in_flight=1, hedge_delay=0.05)
+
+    assert client.generate('Chat question', hedge=True) == 'Fire safety answer.'
+    assert client.info().get('hedges', 0) == 0
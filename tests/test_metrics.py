@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+import metrics
+
+
+def command_events(request_id=1):
+    started = SimpleNamespace(command={'find': 'modules'}, command_name='find',
+                              request_id=request_id, connection_id=('localhost', 27017))
+    succeeded = SimpleNamespace(command_name='find', request_id=request_id, connection_id=('localhost', 27017),
+                                duration_micros=1500, reply={'cursor': {'firstBatch': [{'title': 'x' * 100}]}})
+    return started, succeeded
+
+
+def test_reply_sizes_are_off_by_default(monkeypatch):
+    def encode(document):
+        raise AssertionError('reply was re-encoded')
+
+    registry = metrics.MetricsRegistry()
+    listener = metrics.MongoCommandListener(registry)
+    monkeypatch.setattr(metrics.bson, 'encode', encode)
+
+    started, succeeded = command_events()
+    listener.started(started)
+    listener.succeeded(succeeded)
+
+    assert 'mongo_reply_bytes_total' not in registry.render()
+    assert 'mongo_commands_total{collection="modules",command="find",outcome="success"} 1' in registry.render()
+
+
+def test_reply_sizes_when_enabled():
+    registry = metrics.MetricsRegistry()
+    listener = metrics.MongoCommandListener(registry, measure_sizes=True)
+
+    started, succeeded = command_events()
+    listener.started(started)
+    listener.succeeded(succeeded)
+
+    assert 'mongo_reply_bytes_total{collection="modules",command="find"}' in registry.render()
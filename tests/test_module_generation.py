@@ -0,0 +1,70 @@
+import json
+import time
+
+
+READING_DELAY = 0.4
+QUIZ_DELAY = 0.3
+QUIZ = json.dumps({'quiz': [{'question': 'Q?', 'options': ['A', 'B'], 'answer': 'A'}]})
+
+
+def is_quiz_prompt(prompt):
+    return 'multiple-choice quiz' in prompt
+
+
+def slow_model(model):
+    model.delay = lambda prompt: QUIZ_DELAY if is_quiz_prompt(prompt) else READING_DELAY
+    model.reply = lambda prompt: QUIZ if is_quiz_prompt(prompt) else 'Reading document.'
+    return model
+
+
+def test_buffered_generation_runs_both_calls_concurrently(client, model, make_user):
+    slow_model(model)
+    _, headers = make_user('Admin')
+
+    started = time.perf_counter()
+    response = client.post('/api/generate-module-content', json={'moduleTitle': 'Kitchen Fires'}, headers=headers)
+    elapsed = time.perf_counter() - started
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['reading_document'] == 'Reading document.'
+    assert body['mcq_assignment'] == QUIZ
+    assert len(model.prompts) == 2
+    # max(a, b) plus overhead, well short of a + b
+    assert READING_DELAY <= elapsed < READING_DELAY + QUIZ_DELAY * 0.6
+
+
+def test_ndjson_stream_sends_each_section_as_it_finishes(client, model, make_user):
+    slow_model(model)
+    _, headers = make_user('Admin')
+
+    started = time.perf_counter()
+    response = client.post('/api/generate-module-content', json={'moduleTitle': 'Grease Fires', 'stream': True},
+                           headers=headers, buffered=False)
+    assert response.mimetype == 'application/x-ndjson'
+    chunks = iter(response.response)
+    first = json.loads(next(chunks))
+    first_at = time.perf_counter() - started
+    second = json.loads(next(chunks))
+    second_at = time.perf_counter() - started
+    done = json.loads(next(chunks))
+    response.close()
+
+    # The quiz is sent when it is ready instead of waiting for the slower reading document
+    assert first['section'] == 'mcq_assignment'
+    assert QUIZ_DELAY <= first_at < READING_DELAY
+    assert second['section'] == 'reading_document'
+    assert READING_DELAY <= second_at < READING_DELAY + QUIZ_DELAY * 0.6
+    assert (first['content'], second['content']) == (QUIZ, 'Reading document.')
+    assert done == {'status': 'done', 'cached': False}
+
+
+def test_cached_content_skips_the_model(client, model, make_user):
+    slow_model(model)
+    _, headers = make_user('Admin')
+    client.post('/api/generate-module-content', json={'moduleTitle': 'Exit Routes'}, headers=headers)
+
+    response = client.post('/api/generate-module-content', json={'moduleTitle': 'Exit Routes'}, headers=headers)
+
+    assert response.get_json()['cached'] is True
+    assert len(model.prompts) == 2
@@ -0,0 +1,75 @@
+import json
+
+
+QUIZ = json.dumps({'quiz': [{'question': 'Which class is for oil fires?', 'options': ['A', 'B'], 'answer': 'B'}]})
+
+
+def test_trainee_cannot_update_module(client, db, make_user, make_module):
+    module_id = make_module()
+    _, trainee = make_user()
+    before = db.modules.find_one()
+
+    response = client.put(f'/api/modules/{module_id}', json={
+        'reading_document': 'Everything on the quiz is answer A.',
+        'mcq_assignment': QUIZ
+    }, headers=trainee)
+
+    assert response.status_code == 403
+    after = db.modules.find_one()
+    assert after['reading_document'] == before['reading_document']
+    assert after['answer_key'] == before['answer_key']
+
+
+def test_trainee_cannot_create_module(client, db, make_user):
+    _, trainee = make_user()
+    response = client.post('/api/modules', json={'title': 'Mine', 'mcq_assignment': QUIZ}, headers=trainee)
+    assert response.status_code == 403
+    assert db.modules.count_documents({}) == 0
+
+
+def test_admin_updates_module(client, db, make_user, make_module):
+    module_id = make_module()
+    _, admin = make_user('Admin')
+
+    response = client.put(f'/api/modules/{module_id}', json={
+        'reading_document': 'Class B covers flammable liquids.',
+        'mcq_assignment': QUIZ
+    }, headers=admin)
+
+    assert response.status_code == 200, response.get_json()
+    module = db.modules.find_one()
+    assert module['reading_document'] == 'Class B covers flammable liquids.'
+    assert module['answer_key'] == ['B']
+
+
+def test_edit_reaches_an_answer_key_cached_elsewhere(main, client, db, make_user, make_module):
+    module_id = make_module(questions=1)
+    _, admin = make_user('Admin')
+    _, trainee = make_user()
+    submit = lambda: client.post(f'/api/modules/{module_id}/submit-assignment',
+                                 json={'answers': ['B']}, headers=trainee).get_json()
+    assert submit()['score'] == 0
+
+    # As if another server process handled the edit: change the module without touching this cache
+    db.modules.update_one({'_id': db.modules.find_one()['_id']},
+                          {'$set': {'answer_key': ['B']}, '$inc': {'version': 1}})
+
+    assert submit()['score'] == 100
+
+
+def test_quiz_answer_must_be_an_option(client, db, make_user, make_module):
+    module_id = make_module()
+    _, admin = make_user('Admin')
+    lettered = json.dumps({'quiz': [{
+        'question': 'Which class is for oil fires?',
+        'options': ['Class A: wood and paper', 'Class B: flammable liquids'],
+        'answer': 'B'
+    }]})
+
+    created = client.post('/api/modules', json={'title': 'Lettered', 'mcq_assignment': lettered}, headers=admin)
+    updated = client.put(f'/api/modules/{module_id}', json={'mcq_assignment': lettered}, headers=admin)
+
+    for response in (created, updated):
+        assert response.status_code == 400
+        assert 'answer must be one of its options' in response.get_json()['message']
+    assert db.modules.count_documents({}) == 1
@@ -0,0 +1,147 @@
+import functools
+import threading
+from datetime import datetime
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+
+SUBMISSIONS = 8
+
+
+class LosingFirstUpsert:
+    """Progress collection whose first upsert loses the insert race.
+
+    Before that upsert runs, `competitor()` writes the record the way a
+    concurrent request would, then DuplicateKeyError is raised as Mongo does
+    when two upserts both miss and both insert.
+    """
+
+    def __init__(self, collection, competitor):
+        self.collection = collection
+        self.competitor = competitor
+        self.collisions = 0
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def find_one_and_update(self, *args, **kwargs):
+        if kwargs.get('upsert') and not self.collisions:
+            self.collisions += 1
+            self.competitor()
+            raise DuplicateKeyError('E11000 duplicate key error collection: progress')
+        return self.collection.find_one_and_update(*args, **kwargs)
+
+
+@pytest.fixture
+def atomic_mongomock(monkeypatch):
+    """Make each mongomock collection call atomic, as single operations are on a real server.
+
+    mongomock is not thread-safe; requests still interleave between operations.
+    """
+    from mongomock.collection import Collection
+    lock = threading.RLock()
+
+    def locked(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with lock:
+                return method(*args, **kwargs)
+        return wrapper
+
+    for name in ('find', 'find_one', 'insert_one', 'update_one', 'find_one_and_update', 'aggregate',
+                 'count_documents', 'create_index', 'create_indexes', 'index_information'):
+        monkeypatch.setattr(Collection, name, locked(getattr(Collection, name)))
+
+
+def progress_record(db, module_id, user_id):
+    records = list(db.progress.find({'module_id': module_id, 'user_id': user_id}))
+    assert len(records) == 1
+    return records[0]
+
+
+def test_parallel_sections_and_submissions_share_one_record(main, db, make_user, make_module, atomic_mongomock):
+    module_id = make_module(questions=4)
+    user_id, headers = make_user()
+    requests = (
+        [('complete-section', {'section': 'reading'}), ('complete-section', {'section': 'videos'})]
+        + [('submit-assignment', {'answers': ['A', 'B', 'C', 'D']})] * SUBMISSIONS
+    )
+    barrier = threading.Barrier(len(requests))
+    statuses = []
+
+    def fire(path, body):
+        test_client = main.app.test_client()
+        barrier.wait()
+        response = test_client.post(f'/api/modules/{module_id}/{path}', json=body, headers=headers)
+        statuses.append((response.status_code, response.get_json().get('message')))
+
+    threads = [threading.Thread(target=fire, args=request) for request in requests]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [status for status, _ in statuses] == [200] * len(requests), statuses
+    record = progress_record(db, module_id, user_id)
+    assert record['reading_completed'] and record['videos_completed'] and record['assignment_completed']
+    assert record['attempt_count'] == SUBMISSIONS
+    assert len(record['attempts']) == min(SUBMISSIONS, main.RECENT_ATTEMPTS)
+    assert record['first_pass_attempt'] >= 1
+    bucketed = sum(bucket['count'] for bucket in db.attempt_buckets.find({'module_id': module_id, 'user_id': user_id}))
+    assert bucketed == SUBMISSIONS
+
+
+def test_upsert_retries_after_losing_the_insert_race(main, db, make_user, make_module, monkeypatch):
+    module_id = make_module()
+    user_id, _ = make_user()
+    real_store = main.progress_store
+
+    def competing_request():
+        # The other request marked the reading complete and inserted the record first
+        real_store().find_one_and_update(
+            {'module_id': module_id, 'user_id': user_id},
+            {'$set': {'reading_completed': True},
+             '$setOnInsert': {'videos_completed': False, 'assignment_completed': False, 'attempts': []}},
+            upsert=True
+        )
+
+    racing = LosingFirstUpsert(real_store(), competing_request)
+    monkeypatch.setattr(main, 'progress_store', lambda: racing)
+
+    main.upsert_progress(module_id, user_id, {'$set': {'videos_completed': True}})
+
+    assert racing.collisions == 1
+    record = progress_record(db, module_id, user_id)
+    assert record['reading_completed'] and record['videos_completed']
+    assert not record['assignment_completed']
+
+
+def test_submission_retry_keeps_the_competitors_attempt(main, client, db, make_user, make_module, monkeypatch):
+    module_id = make_module(questions=4)
+    user_id, headers = make_user()
+    real_store = main.progress_store
+
+    def competing_submission():
+        # The other submission scored 100 and inserted the record first
+        real_store().find_one_and_update(
+            {'module_id': module_id, 'user_id': user_id},
+            {'$push': {'attempts': {'timestamp': datetime.utcnow(), 'score': 100.0, 'passed': True}},
+             '$inc': {'attempt_count': 1},
+             '$set': {'assignment_completed': True, 'last_score': 100.0, 'passed': True},
+             '$setOnInsert': {'reading_completed': False, 'videos_completed': False}},
+            upsert=True
+        )
+
+    racing = LosingFirstUpsert(real_store(), competing_submission)
+    monkeypatch.setattr(main, 'progress_store', lambda: racing)
+
+    response = client.post(f'/api/modules/{module_id}/submit-assignment',
+                           json={'answers': ['A', 'X', 'X', 'X']}, headers=headers)
+
+    assert response.status_code == 200, response.get_json()
+    assert racing.collisions == 1
+    record = progress_record(db, module_id, user_id)
+    assert record['attempt_count'] == 2
+    assert [attempt['score'] for attempt in record['attempts']] == [100.0, 25.0]
+    assert record['last_score'] == 25.0 and not record['passed']
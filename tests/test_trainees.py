@@ -0,0 +1,57 @@
+import pytest
+
+
+def test_pages_follow_next_after(client, make_user, make_module):
+    make_module()
+    trainee_ids = {make_user()[0] for _ in range(5)}
+    _, admin = make_user('Admin')
+
+    seen, after, pages = [], None, 0
+    while True:
+        query = '/api/trainees?limit=2' + (f'&after={after}' if after else '')
+        response = client.get(query, headers=admin)
+        assert response.status_code == 200
+        body = response.get_json()
+        seen += [trainee['_id'] for trainee in body['trainees']]
+        pages += 1
+        after = body['next_after']
+        if not after:
+            break
+
+    assert pages == 3
+    assert seen == sorted(trainee_ids)
+
+
+@pytest.mark.parametrize('query', [
+    'limit=abc',
+    'after=zzz',
+    'module_id=not-an-id',
+    'min_score=high'
+])
+def test_bad_query_arguments_are_rejected(client, make_user, query):
+    _, admin = make_user('Admin')
+    response = client.get(f'/api/trainees?{query}', headers=admin)
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
+
+
+def test_trainees_need_admin(client, make_user):
+    _, trainee = make_user()
+    assert client.get('/api/trainees', headers=trainee).status_code == 403
+
+
+def test_attempt_count_and_best_score_cover_trimmed_attempts(main, client, make_user, make_module):
+    module_id = make_module(questions=4)
+    _, trainee = make_user()
+    _, admin = make_user('Admin')
+    # The perfect score is older than the RECENT_ATTEMPTS kept on the record
+    answers = [['A', 'B', 'C', 'D']] + [['A', 'X', 'X', 'X']] * (main.RECENT_ATTEMPTS + 1)
+    for attempt in answers:
+        response = client.post(f'/api/modules/{module_id}/submit-assignment', json={'answers': attempt}, headers=trainee)
+        assert response.status_code == 200
+
+    module = client.get('/api/trainees', headers=admin).get_json()['trainees'][0]['modules'][0]
+
+    assert len(module['attempts']) == main.RECENT_ATTEMPTS
+    assert module['attempt_count'] == len(answers)
+    assert module['best_score'] == 100.0